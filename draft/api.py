@@ -1,5 +1,6 @@
 ﻿from .models import Champion, DraftAction, DraftSession
 from matches.models import Team, Game
+from django.db import connections
 from django.db.models import Q, Count
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -11,13 +12,36 @@ import torch.nn.functional as F
 import numpy as np
 import os
 import json
+import threading
+import time
+from contextlib import nullcontext
 
 from .machine_learning.analyzer import DeltaAnalyzer as DraftDeltaAnalyzer
 from .machine_learning.model import DraftTransformerModel
+from .machine_learning.inference import QUANTIZED_FILE, MicroBatcher, load_backend, load_variant
+from .machine_learning import registry
+from .machine_learning.registry import ARTIFACTS_DIR, MAPPINGS_FILE, MODEL_FILE, ROLES_FILE
 from django.conf import settings
 from .machine_learning.dataset import DRAFT_PHASES
+from .draft_index import get_draft_index
+from .recommendation_cache import artifact_signature, recommendation_cache, recommendation_key
+from .opening_book import EMPTY_BOOK, OPENING_BOOK_FILE, OpeningBook
 
 ROLES_LOWER = ["top", "jungle", "mid", "bot", "support"]
+# Files whose changes make DraftRecommendationView reload the model while ml_artifacts has no published versions
+MODEL_ARTIFACTS = tuple(os.path.join(ARTIFACTS_DIR, name) for name in (MODEL_FILE, MAPPINGS_FILE, QUANTIZED_FILE))
+
+
+def current_artifacts():
+    """
+    Version and directory of the artifacts to serve: the current registry version, or a
+    signature of the model files for the flat ml_artifacts layout.
+    """
+    version = registry.current_version()
+    if version is None:
+        return artifact_signature(*MODEL_ARTIFACTS), ARTIFACTS_DIR
+    return version, registry.version_dir(version)
+
 
 class ChampionListView(APIView):
     """
@@ -35,13 +59,14 @@ class TeamListView(APIView):
     """
     Returns unique teams that have data in DraftAction, sorted by action count.
     """
+    @staticmethod
+    def drafter_counts():
+        """(drafter_id, number of draft actions) rows."""
+        return DraftAction.objects.values('drafter_id').annotate(count=Count('id')).values_list('drafter_id', 'count')
+
     def get(self, request):
         # 1. Get counts of draft actions per drafter_id
-        drafter_counts = dict(
-            DraftAction.objects.values('drafter_id')
-            .annotate(count=Count('id'))
-            .values_list('drafter_id', 'count')
-        )
+        drafter_counts = dict(self.drafter_counts())
         
         # 2. Get teams that have at least one draft action
         drafter_ids = [d for d in drafter_counts.keys() if d]
@@ -65,9 +90,19 @@ class TeamListView(APIView):
 class DraftSimilarMatchesView(APIView):
     """
     Returns matches where the same 10 champions were picked.
+    Each list is ranked by DraftIndex.score_games and paginated with limit/offset.
     """
+    DEFAULT_LIMIT = 20
+    MAX_LIMIT = 100
+
+    @staticmethod
+    def game_picks():
+        """Picks prefetched for the listed games, as Game.game_picks."""
+        return DraftAction.objects.filter(action_type='pick').select_related('champion')
+
     def post(self, request):
         picks = request.data.get("picks", {})
+        bans = request.data.get("bans") or {}
         blue_team = request.data.get("blue_team")
         red_team = request.data.get("red_team")
         
@@ -86,75 +121,58 @@ class DraftSimilarMatchesView(APIView):
         if len(all_picks) < 10:
             return Response({"matches": []})
 
-        # 1. Games where 7 or more in all picks are counted (standard similarity)
-        match_counts = dict(DraftAction.objects.filter(
-            action_type='pick',
-            champion_id__in=all_picks
-        ).values('game').annotate(
-            count=Count('champion', distinct=True)
-        ).filter(count__gte=7).values_list('game', 'count'))
+        try:
+            limit = min(max(int(request.data.get("limit", self.DEFAULT_LIMIT)), 1), self.MAX_LIMIT)
+            offset = max(int(request.data.get("offset", 0)), 0)
+        except (TypeError, ValueError):
+            return Response({"error": "limit and offset must be integers"}, status=400)
 
-        game_ids = set(match_counts.keys())
+        # Overlap counts for every indexed game come from the champion -> game bitset index
+        index = get_draft_index()
+        overlap = index.overlap_counts(all_picks)
+        num_games = len(overlap)
+
+        # 1. Games where 7 or more in all picks are counted (standard similarity)
+        similar_mask = overlap >= 7
 
         # 2. Games with team-specific composition matches
         blue_team_obj = Team.objects.filter(Q(external_id=blue_team) | Q(name=blue_team)).first()
         red_team_obj = Team.objects.filter(Q(external_id=red_team) | Q(name=red_team)).first()
         
-        team_history_game_ids = set()
+        team_mask = np.zeros(num_games, dtype=bool)
+
+        # Games where a team played (either side) and had 4+ matches with a set of picks
+        for team_obj, pick_ids in ((blue_team_obj, blue_picks), (red_team_obj, red_picks)):
+            if team_obj and pick_ids:
+                team_mask |= index.team_overlap_counts(team_obj.external_id, pick_ids)[:num_games] >= 4
+
+        exact_mask = overlap == 10
+        buckets = {
+            "exact_matches": np.flatnonzero(exact_mask),
+            "team_history": np.flatnonzero(team_mask & ~exact_mask),
+            "similar_drafts": np.flatnonzero(similar_mask & ~team_mask & ~exact_mask),
+        }
+
+        # Rank each list and keep only the requested page
+        draft_picks = (blue_picks, red_picks)
+        draft_bans = (extract_ids(bans.get("blue", [])), extract_ids(bans.get("red", [])))
+        drafters = (
+            blue_team_obj.external_id if blue_team_obj else blue_team,
+            red_team_obj.external_id if red_team_obj else red_team,
+        )
+        pages = {}
+        for key, positions in buckets.items():
+            scores = index.score_games(positions, draft_picks, draft_bans, drafters)
+            top_positions, top_scores = index.top_k(positions, scores, offset + limit)
+            pages[key] = list(zip(top_positions[offset:], top_scores[offset:]))
 
-        # Helper to find games where a team played (either side) and had 4+ matches with a set of picks
-        def get_team_composition_matches(team_obj, pick_ids):
-            if not team_obj or not pick_ids:
-                return set()
-            
-            # Find all games where this team played
-            games_played = Game.objects.filter(
-                Q(team_1=team_obj) | Q(team_2=team_obj)
-            ).values_list('id', flat=True)
-            
-            # For those games, count how many of the pick_ids were picked by THIS team
-            # We need to know which side the team was on in each game
-            # This is slightly complex in a single query, so we can do it via DraftAction filtering by team
-            matches = DraftAction.objects.filter(
-                game_id__in=games_played,
-                action_type='pick',
-                drafter_id=team_obj.external_id,
-                champion_id__in=pick_ids
-            ).values('game').annotate(count=Count('id')).filter(count__gte=4).values_list('game', flat=True)
-            
-            return set(matches)
-
-        if blue_team_obj and blue_picks:
-            blue_team_matches = get_team_composition_matches(blue_team_obj, blue_picks)
-            team_history_game_ids.update(blue_team_matches)
-
-        if red_team_obj and red_picks:
-            red_team_matches = get_team_composition_matches(red_team_obj, red_picks)
-            team_history_game_ids.update(red_team_matches)
-
-        game_ids.update(team_history_game_ids)
-
-        # Make sure match_counts has entries for games in team_history_game_ids
-        # so the match_count is correctly shown in the UI even if < 7
-        missing_game_ids = team_history_game_ids - set(match_counts.keys())
-        if missing_game_ids:
-            missing_counts = DraftAction.objects.filter(
-                action_type='pick',
-                game_id__in=missing_game_ids,
-                champion_id__in=all_picks
-            ).values('game').annotate(
-                count=Count('champion', distinct=True)
-            ).values_list('game', 'count')
-            match_counts.update(dict(missing_counts))
+        page_game_ids = [int(index.game_ids[pos]) for page in pages.values() for pos, _ in page]
 
         from django.db.models import Prefetch
-        games = Game.objects.filter(id__in=list(game_ids)).select_related('team_1', 'team_2', 'winning_team', 'match').prefetch_related(
-            Prefetch('draft_actions', queryset=DraftAction.objects.filter(action_type='pick').select_related('champion'), to_attr='game_picks')
+        games = Game.objects.filter(id__in=page_game_ids).select_related('team_1', 'team_2', 'winning_team', 'match').prefetch_related(
+            Prefetch('draft_actions', queryset=self.game_picks(), to_attr='game_picks')
         )
-        
-        exact_matches = []
-        similar_drafts = []
-        team_history = []
+        games_by_id = {g.id: g for g in games}
         
         # Normalize draft team names/IDs for comparison
         draft_teams = set()
@@ -164,137 +182,133 @@ class DraftSimilarMatchesView(APIView):
         # Keep a set of all_picks IDs for quick matching
         all_picks_set = set(all_picks)
 
-        for g in games:
-            count = match_counts.get(g.id, 0)
-            is_highlighted = False
-            g_teams = []
-            if g.team_1:
-                g_teams.append((g.team_1.name or "").lower())
-                if g.team_1.external_id:
-                    g_teams.append(g.team_1.external_id.lower())
-            if g.team_2:
-                g_teams.append((g.team_2.name or "").lower())
-                if g.team_2.external_id:
-                    g_teams.append(g.team_2.external_id.lower())
-            
-            if draft_teams and any(t in draft_teams for t in g_teams if t):
-                is_highlighted = True
-
-            g_blue_picks = [
-                {"name": p.champion.name, "is_match": p.champion_id in all_picks_set} 
-                for p in g.game_picks if p.team_side == 'blue'
+        results = {}
+        for key, page in pages.items():
+            results[key] = [
+                self.serialize_game(games_by_id[int(index.game_ids[pos])], int(overlap[pos]), score, draft_teams, all_picks_set)
+                for pos, score in page
+                if int(index.game_ids[pos]) in games_by_id
             ]
-            g_red_picks = [
-                {"name": p.champion.name, "is_match": p.champion_id in all_picks_set} 
-                for p in g.game_picks if p.team_side == 'red'
-            ]
-
-            match_data = {
-                "game_id": g.game_id,
-                "match_external_id": g.match.external_id if g.match else "Unknown",
-                "tournament": g.match.tournament if g.match else "Unknown",
-                "start_time": g.match.start_time.isoformat() if g.match and g.match.start_time else None,
-                "team_1": (g.team_1.name or g.team_1.external_id) if g.team_1 else "Unknown",
-                "team_1_logo": g.team_1.logo_url if g.team_1 else None,
-                "team_2": (g.team_2.name or g.team_2.external_id) if g.team_2 else "Unknown",
-                "team_2_logo": g.team_2.logo_url if g.team_2 else None,
-                "winning_team": (g.winning_team.name or g.winning_team.external_id) if g.winning_team else "Unknown",
-                "team_1_side": g.team_1_side,
-                "blue_picks": g_blue_picks,
-                "red_picks": g_red_picks,
-                "is_highlighted": is_highlighted,
-                "match_count": count
-            }
-
-            if count == 10:
-                exact_matches.append(match_data)
-            elif g.id in team_history_game_ids:
-                team_history.append(match_data)
-            else:
-                similar_drafts.append(match_data)
-
-        # Sort by match count descending, then by date descending
-        similar_drafts.sort(key=lambda x: (x["match_count"], x["start_time"] or ""), reverse=True)
-        exact_matches.sort(key=lambda x: (x["start_time"] or ""), reverse=True)
-        team_history.sort(key=lambda x: (x["start_time"] or ""), reverse=True)
 
         return Response({
-            "matches": exact_matches, # Keep for backward compatibility
-            "exact_matches": exact_matches,
-            "similar_drafts": similar_drafts,
-            "team_history": team_history
+            "matches": results["exact_matches"], # Keep for backward compatibility
+            "exact_matches": results["exact_matches"],
+            "similar_drafts": results["similar_drafts"],
+            "team_history": results["team_history"],
+            "totals": {key: len(positions) for key, positions in buckets.items()},
+            "limit": limit,
+            "offset": offset
         })
 
-class DraftRecommendationView(APIView):
+    def serialize_game(self, g, count, score, draft_teams, all_picks_set):
+        is_highlighted = False
+        g_teams = []
+        if g.team_1:
+            g_teams.append((g.team_1.name or "").lower())
+            if g.team_1.external_id:
+                g_teams.append(g.team_1.external_id.lower())
+        if g.team_2:
+            g_teams.append((g.team_2.name or "").lower())
+            if g.team_2.external_id:
+                g_teams.append(g.team_2.external_id.lower())
+        
+        if draft_teams and any(t in draft_teams for t in g_teams if t):
+            is_highlighted = True
+
+        g_blue_picks = [
+            {"name": p.champion.name, "is_match": p.champion_id in all_picks_set} 
+            for p in g.game_picks if p.team_side == 'blue'
+        ]
+        g_red_picks = [
+            {"name": p.champion.name, "is_match": p.champion_id in all_picks_set} 
+            for p in g.game_picks if p.team_side == 'red'
+        ]
+
+        return {
+            "game_id": g.game_id,
+            "match_external_id": g.match.external_id if g.match else "Unknown",
+            "tournament": g.match.tournament if g.match else "Unknown",
+            "start_time": g.match.start_time.isoformat() if g.match and g.match.start_time else None,
+            "team_1": (g.team_1.name or g.team_1.external_id) if g.team_1 else "Unknown",
+            "team_1_logo": g.team_1.logo_url if g.team_1 else None,
+            "team_2": (g.team_2.name or g.team_2.external_id) if g.team_2 else "Unknown",
+            "team_2_logo": g.team_2.logo_url if g.team_2 else None,
+            "winning_team": (g.winning_team.name or g.winning_team.external_id) if g.winning_team else "Unknown",
+            "team_1_side": g.team_1_side,
+            "blue_picks": g_blue_picks,
+            "red_picks": g_red_picks,
+            "is_highlighted": is_highlighted,
+            "match_count": count,
+            "score": round(float(score), 3)
+        }
+
+class DraftRecommender:
     """
-    Provides champion recommendations based on the current draft state and selected teams.
+    One loaded artifact version: the model, its mappings and analyzer, its opening book, and
+    the encoding and ranking of draft states with them. A request works with a single instance
+    from start to end, so swapping in a new version never mixes two models in one response.
     """
-    _model = None
-    _mappings = None
 
-    @classmethod
-    def load_model(cls):
-        if cls._model is None:
-            model_path = os.path.join("draft", "ml_artifacts", "draft_model.pth")
-            mapping_path = os.path.join("draft", "ml_artifacts", "draft_mappings.json")
-            
-            if not os.path.exists(model_path) or not os.path.exists(mapping_path):
-                return None
-
-            with open(mapping_path, 'r') as f:
-                cls._mappings = json.load(f)
-            
-            cls._model = DraftTransformerModel(
-                num_champions=cls._mappings["num_champions"],
-                num_teams=cls._mappings["num_teams"]
-            )
-            cls._model.load_state_dict(torch.load(model_path, map_location="cpu"))
-            cls._model.eval()
-        return cls._model
-
-    def post(self, request):
-        return self.get_recommendations(request)
-
-    def get(self, request):
-        return self.get_recommendations(request)
+    def __init__(self, version, model, mappings, analyzer, opening_book=EMPTY_BOOK):
+        self.version = version
+        self.model = model
+        self.mappings = mappings
+        self.analyzer = analyzer
+        self.opening_book = opening_book
 
-    def get_recommendations(self, request):
-        model = self.load_model()
-        if not model:
-            return Response({"error": "Model not found"}, status=500)
-
-        mappings = self._mappings
-        champ_to_idx = mappings["champ_to_idx"]
-        idx_to_name = mappings["idx_to_name"]
-        num_champions = mappings["num_champions"]
-        team_to_idx = mappings["team_to_idx"]
-
-        data = request.data if request.method == "POST" else {}
-        draft_id = data.get("draft_id") or request.query_params.get("draft_id")
-        blue_team = data.get("blue_team")
-        red_team = data.get("red_team")
-        picks = data.get("picks", {})
-        bans = data.get("bans", {})
-
-        if not blue_team or not red_team or not picks or not bans:
-            if draft_id:
-                try:
-                    draft = DraftSession.objects.get(id=draft_id)
-                    blue_team = blue_team or draft.blue_team
-                    red_team = red_team or draft.red_team
-                    picks = picks or draft.picks
-                    bans = bans or draft.bans
-                except DraftSession.DoesNotExist:
-                    return Response({"error": "Draft not found"}, status=404)
-            else:
-                return Response({"error": "Missing draft state"}, status=400)
+    @classmethod
+    def load(cls, version, artifacts_dir):
+        """
+        Builds the recommender from the artifacts in artifacts_dir (see current_artifacts).
+        Returns None when there is no trained model. Raises ValueError when a file does not
+        match the checksum recorded when its version was published.
+        """
+        model_path = os.path.join(artifacts_dir, MODEL_FILE)
+        mapping_path = os.path.join(artifacts_dir, MAPPINGS_FILE)
+        if not os.path.exists(model_path) or not os.path.exists(mapping_path):
+            return None
+        corrupted = registry.verify(artifacts_dir)
+        if corrupted:
+            raise ValueError(f"Artifact version {version} has corrupted files: {', '.join(corrupted)}")
 
-        # Map teams to indices
-        blue_team_obj = Team.objects.filter(Q(name=blue_team) | Q(external_id=blue_team)).first()
-        red_team_obj = Team.objects.filter(Q(name=red_team) | Q(external_id=red_team)).first()
+        with open(mapping_path, 'r', encoding='utf-8-sig') as f:
+            mappings = json.load(f)
+        
+        model = DraftTransformerModel(
+            num_champions=mappings["num_champions"],
+            num_teams=mappings["num_teams"]
+        )
+        # Memory-mapped weights are backed by the page cache: processes loading the same file
+        # (or workers forked after warm_up) share one copy instead of each holding its own
+        model.load_state_dict(torch.load(model_path, map_location="cpu", mmap=True), assign=True)
+        model.eval()
+        # Optionally serve the int8 variant (see quantize_draft_model), or the TorchScript/ONNX
+        # export of the fp32 model (see export_draft_model), which takes precedence
+        model = load_variant(model, getattr(settings, "DRAFT_MODEL_VARIANT", "fp32"), model_path)
+        model = load_backend(model, getattr(settings, "DRAFT_INFERENCE_BACKEND", "eager"), model_path)
+        # With threaded workers, concurrent requests share forward passes
+        max_batch_size = getattr(settings, "DRAFT_MICROBATCH_MAX_SIZE", 0)
+        if max_batch_size > 1:
+            model = MicroBatcher(model, max_batch_size, getattr(settings, "DRAFT_MICROBATCH_MAX_WAIT_MS", 2) / 1000)
 
-        blue_team_idx = team_to_idx.get(blue_team_obj.external_id if blue_team_obj else None, 0)
-        red_team_idx = team_to_idx.get(red_team_obj.external_id if red_team_obj else None, 0)
+        analyzer = DraftDeltaAnalyzer(
+            model, mappings["champ_to_idx"], mappings["idx_to_champ"], mappings["idx_to_name"],
+            os.path.join(artifacts_dir, ROLES_FILE)
+        )
+        try:
+            opening_book = OpeningBook.load(os.path.join(artifacts_dir, OPENING_BOOK_FILE))
+        except (FileNotFoundError, ValueError):
+            opening_book = EMPTY_BOOK
+        return cls(version, model, mappings, analyzer, opening_book)
+
+    def encode_state(self, picks, bans):
+        """
+        Puts a draft ({"blue": [...], "red": [...]} of champion ids or {"id": ...} objects) in model
+        input form: the ids per side and action, the next side and action (None once complete)
+        and the (1, 20) champion/action/side/position tensors in DRAFT_PHASES order.
+        """
+        champ_to_idx = self.mappings["champ_to_idx"]
+        num_champions = self.mappings["num_champions"]
 
         # Extract IDs
         def extract_ids(items):
@@ -311,12 +325,6 @@ class DraftRecommendationView(APIView):
         red_bans = extract_ids(bans.get("red", []))
 
         total_actions = len(blue_picks) + len(red_picks) + len(blue_bans) + len(red_bans)
-        if total_actions >= 20:
-            return Response({"error": "Draft completed"}, status=400)
-
-        side, action_type = DRAFT_PHASES[total_actions]
-        curr_team_idx = blue_team_idx if side == 'blue' else red_team_idx
-        opp_team_idx = red_team_idx if side == 'blue' else blue_team_idx
 
         # Prepare state for Transformer
         champ_ids = torch.full((1, 20), num_champions, dtype=torch.long)
@@ -338,7 +346,7 @@ class DraftRecommendationView(APIView):
 
         phase_counts = {"blue_pick": 0, "red_pick": 0, "blue_ban": 0, "red_ban": 0}
         
-        for i in range(total_actions):
+        for i in range(min(total_actions, 20)):
             s, a = DRAFT_PHASES[i]
             key = f"{s}_{a}"
             c_id = get_champ_at_count(s, a, phase_counts[key])
@@ -349,9 +357,77 @@ class DraftRecommendationView(APIView):
                 action_types[0, i] = 1 if a == "ban" else 2
                 sides_tensor[0, i] = 1 if s == "blue" else 2
 
+        side, action_type = DRAFT_PHASES[total_actions] if total_actions < 20 else (None, None)
+        return {
+            "blue_picks": blue_picks,
+            "red_picks": red_picks,
+            "blue_bans": blue_bans,
+            "red_bans": red_bans,
+            "total_actions": total_actions,
+            "side": side,
+            "action_type": action_type,
+            "champ_ids": champ_ids,
+            "action_types": action_types,
+            "sides": sides_tensor,
+            "positions": positions,
+        }
+
+    def state_key(self, state, blue_team_idx, red_team_idx, model_version):
+        """
+        Canonical cache key of an encoded state: team indices, the champion index of every
+        filled slot and the ordered picks/bans per side.
+        """
+        champ_to_idx = self.mappings["champ_to_idx"]
+        filled = state["action_types"][0].tolist()
+        slots = [c if filled[i] else None for i, c in enumerate(state["champ_ids"][0].tolist())]
+        actions = [
+            [champ_to_idx.get(c, c) for c in state[name]]
+            for name in ("blue_picks", "red_picks", "blue_bans", "red_bans")
+        ]
+        return recommendation_key(model_version, blue_team_idx, red_team_idx, slots, actions)
+
+    def batch_probabilities(self, states, blue_team_idxs, red_team_idxs):
+        """
+        Runs the model once over several incomplete states. Returns one (1, num_champions)
+        distribution per state, to pass to recommend as p_now.
+        """
+        curr_team_idxs = [b if state["side"] == "blue" else r for state, b, r in zip(states, blue_team_idxs, red_team_idxs)]
+        opp_team_idxs = [r if state["side"] == "blue" else b for state, b, r in zip(states, blue_team_idxs, red_team_idxs)]
         with torch.no_grad():
-            logits = model(champ_ids, action_types, sides_tensor, positions, torch.tensor([curr_team_idx]), torch.tensor([opp_team_idx]))
-            probs = torch.softmax(logits, dim=-1)[0]
+            logits = self.model(
+                torch.cat([state["champ_ids"] for state in states]),
+                torch.cat([state["action_types"] for state in states]),
+                torch.cat([state["sides"] for state in states]),
+                torch.cat([state["positions"] for state in states]),
+                torch.tensor(curr_team_idxs),
+                torch.tensor(opp_team_idxs),
+            )
+            p_now = torch.softmax(logits, dim=-1)
+        return list(p_now.split(1))
+
+    def recommend(self, state, blue_team_idx, red_team_idx, p_now=None):
+        """
+        Builds the recommendation response for an encoded, incomplete draft state.
+        p_now: the model distribution for the state if it was already computed (batch_probabilities).
+        """
+        model = self.model
+        analyzer = self.analyzer
+        num_champions = self.mappings["num_champions"]
+
+        blue_picks, red_picks = state["blue_picks"], state["red_picks"]
+        blue_bans, red_bans = state["blue_bans"], state["red_bans"]
+        total_actions = state["total_actions"]
+        side, action_type = state["side"], state["action_type"]
+        champ_ids, action_types = state["champ_ids"], state["action_types"]
+        sides_tensor, positions = state["sides"], state["positions"]
+        curr_team_idx = blue_team_idx if side == 'blue' else red_team_idx
+        opp_team_idx = red_team_idx if side == 'blue' else blue_team_idx
+
+        if p_now is None:
+            with torch.no_grad():
+                logits = model(champ_ids, action_types, sides_tensor, positions, torch.tensor([curr_team_idx]), torch.tensor([opp_team_idx]))
+                p_now = torch.softmax(logits, dim=-1)
+        probs = p_now[0]
 
         # Mask used champions
         mask = torch.ones_like(probs)
@@ -360,34 +436,25 @@ class DraftRecommendationView(APIView):
             if val < num_champions:
                 mask[val] = 0
         probs = probs * mask
+        # Top raw candidate before role penalties, used for the general urgency insight
+        insight_top_idx = int(torch.argmax(probs).item())
 
         # Role viability penalty
-        analyzer = DraftDeltaAnalyzer(
-            model, champ_to_idx, mappings["idx_to_champ"], idx_to_name, 
-            os.path.join("draft", "ml_artifacts", "champ_roles.json")
-        )
-
         current_team_picks_uuids = blue_picks if side == 'blue' else red_picks
         opponent_team_picks_uuids = red_picks if side == 'blue' else blue_picks
         
-        current_team_picks_names = list(Champion.objects.filter(id__in=current_team_picks_uuids).values_list('name', flat=True))
-        opponent_team_picks_names = list(Champion.objects.filter(id__in=opponent_team_picks_uuids).values_list('name', flat=True))
+        current_team_picks_names = analyzer.names_for_ids(current_team_picks_uuids)
+        opponent_team_picks_names = analyzer.names_for_ids(opponent_team_picks_uuids)
 
         if action_type == "pick":
-            for i in range(num_champions):
-                if probs[i] > 0:
-                    c_name = idx_to_name[str(i)]
-                    if not analyzer.is_viable_pick(current_team_picks_names, c_name):
-                        probs[i] *= 0.01
+            viable = analyzer.viable_pick_mask(current_team_picks_names)
+            probs = torch.where(viable, probs, probs * 0.01)
 
         elif action_type == "ban":
-            for i in range(num_champions):
-                if probs[i] > 0:
-                    c_name = idx_to_name[str(i)]
-                    # If the opponent cannot pick this champion anyway because they already filled its roles,
-                    # then banning it is redundant.
-                    if not analyzer.is_viable_pick(opponent_team_picks_names, c_name):
-                        probs[i] *= 0.01
+            # If the opponent cannot pick this champion anyway because they already filled its roles,
+            # then banning it is redundant.
+            viable = analyzer.viable_pick_mask(opponent_team_picks_names)
+            probs = torch.where(viable, probs, probs * 0.01)
 
         # Final re-normalization and sorting
         probs_numpy = probs.numpy()
@@ -403,17 +470,26 @@ class DraftRecommendationView(APIView):
 
         own_picks_names = current_team_picks_names
         enemy_picks_names = opponent_team_picks_names
-        all_bans_names = list(Champion.objects.filter(id__in=all_bans_uuids).values_list('name', flat=True))
+        all_bans_names = analyzer.names_for_ids(all_bans_uuids)
 
-        baseline_name = idx_to_name[str(sorted_indices[1])] if len(sorted_indices) > 1 else None
+        baseline_name = analyzer.names[sorted_indices[1]] if len(sorted_indices) > 1 else None
         opp_side_val = 2 if side == 'blue' else 1
 
+        # Urgency deltas for every hinted candidate in one batched forward pass
+        delta_candidates = [int(idx) for idx in sorted_indices[:10] if probs_numpy[idx] > 0]
+        if insight_top_idx not in delta_candidates:
+            delta_candidates.append(insight_top_idx)
+        deltas = dict(zip(delta_candidates, analyzer.compute_deltas(
+            champ_ids, action_types, sides_tensor, positions,
+            curr_team_idx, opp_team_idx, delta_candidates, opp_side_val, p_now=p_now
+        )))
+
         recommendations = []
         for i, idx in enumerate(sorted_indices[:50]):
             if probs_numpy[idx] <= 0: break
             
-            uuid = mappings["idx_to_champ"][str(idx)]
-            name = idx_to_name[str(idx)]
+            uuid = analyzer.champ_uuids[idx]
+            name = analyzer.names[idx]
             score = float(probs_numpy[idx])
             
             hints = {}
@@ -438,7 +514,8 @@ class DraftRecommendationView(APIView):
                     side, curr_team_idx, opp_team_idx, total_actions, baseline_name,
                     champ_ids, action_types, sides_tensor, positions, opp_side_val,
                     candidate_idx=int(idx),
-                    is_ban=(action_type == "ban")
+                    is_ban=(action_type == "ban"),
+                    delta=deltas.get(int(idx))
                 )
 
             recommendations.append({
@@ -447,7 +524,7 @@ class DraftRecommendationView(APIView):
                 "hints": hints
             })
 
-        return Response({
+        return {
             "recommendations": recommendations,
             "side": side,
             "action_type": action_type,
@@ -456,6 +533,165 @@ class DraftRecommendationView(APIView):
                 champ_ids, action_types, sides_tensor, positions, 
                 curr_team_idx, opp_team_idx, 
                 own_picks_names, enemy_picks_names, all_bans_names, 
-                total_actions, side, action_type
+                total_actions, side, action_type,
+                deltas=deltas,
+                p_now=p_now
             )
-        })
+        }
+
+
+class DraftRecommendationView(APIView):
+    """
+    Provides champion recommendations based on the current draft state and selected teams.
+    """
+    _recommender = None
+    _version = None
+    _checked_at = 0.0
+    _load_lock = threading.Lock()
+
+    @classmethod
+    def get_recommender(cls):
+        """
+        The DraftRecommender of the current artifact version, loaded once per process and shared
+        by all requests. Whether another version was published (or activated) is checked at most
+        every DRAFT_MODEL_CHECK_SECONDS; it is then loaded and swapped in without a restart.
+        Only the first load is waited for: meanwhile other requests keep using the previous
+        version, which also stays in place if the new one fails to load.
+        """
+        check_seconds = getattr(settings, "DRAFT_MODEL_CHECK_SECONDS", 5)
+        if cls._recommender is not None and time.monotonic() - cls._checked_at < check_seconds:
+            return cls._recommender
+        if not cls._load_lock.acquire(blocking=cls._recommender is None):
+            return cls._recommender
+        try:
+            if cls._recommender is None or time.monotonic() - cls._checked_at >= check_seconds:
+                version, artifacts_dir = current_artifacts()
+                if cls._recommender is None or version != cls._version:
+                    try:
+                        cls._swap(version, artifacts_dir)
+                    except (OSError, ValueError):
+                        if cls._recommender is None:
+                            raise
+                cls._checked_at = time.monotonic()
+        finally:
+            cls._load_lock.release()
+        return cls._recommender
+
+    @classmethod
+    def _swap(cls, version, artifacts_dir):
+        recommender = DraftRecommender.load(version, artifacts_dir)
+        # Cached recommendations are keyed by the version; entries of the previous one go away
+        recommendation_cache.clear()
+        cls._version = version
+        cls._recommender = recommender
+
+    @classmethod
+    def load_model(cls):
+        """
+        Loads the model, mappings and analyzer once per process; they are shared by all requests.
+        """
+        recommender = cls.get_recommender()
+        return recommender.model if recommender else None
+
+    @classmethod
+    def reload_model(cls):
+        """
+        Rebuilds the model, mappings and analyzer from disk, e.g. after the artifacts were retrained.
+        """
+        with cls._load_lock:
+            cls._swap(*current_artifacts())
+            cls._checked_at = time.monotonic()
+        return cls.load_model()
+
+    @classmethod
+    def get_analyzer(cls):
+        recommender = cls.get_recommender()
+        return recommender.analyzer if recommender else None
+
+    @classmethod
+    def warm_up(cls):
+        """
+        Loads the model and runs one recommendation for an empty draft, so the lazily built
+        tables and buffers exist before the first request. The recommendation bypasses the
+        MicroBatcher, whose thread is then only ever started in the workers.
+        """
+        recommender = cls.get_recommender()
+        if recommender is None:
+            return
+        direct = recommender.model.direct() if isinstance(recommender.model, MicroBatcher) else nullcontext()
+        with direct:
+            recommender.recommend(recommender.encode_state({}, {}), 0, 0)
+
+    def post(self, request):
+        return self.get_recommendations(request)
+
+    def get(self, request):
+        return self.get_recommendations(request)
+
+    def get_recommendations(self, request):
+        recommender = self.get_recommender()
+        if not recommender:
+            return Response({"error": "Model not found"}, status=500)
+
+        model_version = recommender.version
+        team_to_idx = recommender.mappings["team_to_idx"]
+
+        data = request.data if request.method == "POST" else {}
+        draft_id = data.get("draft_id") or request.query_params.get("draft_id")
+        blue_team = data.get("blue_team")
+        red_team = data.get("red_team")
+        picks = data.get("picks", {})
+        bans = data.get("bans", {})
+
+        if not blue_team or not red_team or not picks or not bans:
+            if draft_id:
+                try:
+                    draft = DraftSession.objects.get(id=draft_id)
+                    blue_team = blue_team or draft.blue_team
+                    red_team = red_team or draft.red_team
+                    picks = picks or draft.picks
+                    bans = bans or draft.bans
+                except DraftSession.DoesNotExist:
+                    return Response({"error": "Draft not found"}, status=404)
+            else:
+                return Response({"error": "Missing draft state"}, status=400)
+
+        # Map teams to indices
+        blue_team_obj = Team.objects.filter(Q(name=blue_team) | Q(external_id=blue_team)).first()
+        red_team_obj = Team.objects.filter(Q(name=red_team) | Q(external_id=red_team)).first()
+
+        blue_team_idx = team_to_idx.get(blue_team_obj.external_id if blue_team_obj else None, 0)
+        red_team_idx = team_to_idx.get(red_team_obj.external_id if red_team_obj else None, 0)
+
+        state = recommender.encode_state(picks, bans)
+        if state["total_actions"] >= 20:
+            return Response({"error": "Draft completed"}, status=400)
+
+        # The response only depends on the teams, the ordered draft and the model, so opening
+        # states are served from the precomputed book and repeated ones (analysts stepping
+        # back and forth) from the cache
+        cache_key = recommender.state_key(state, blue_team_idx, red_team_idx, model_version)
+        cached = None
+        if state["total_actions"] <= recommender.opening_book.max_actions:
+            cached = recommender.opening_book.get(recommender.state_key(state, blue_team_idx, red_team_idx, None))
+        if cached is None:
+            cached = recommendation_cache.get(cache_key)
+        if cached is not None:
+            return Response(cached)
+
+        result = recommender.recommend(state, blue_team_idx, red_team_idx)
+        recommendation_cache.set(cache_key, result)
+        return Response(result)
+
+def warm_up():
+    """
+    Loads the recommendation model and the similar matches index ahead of the first request.
+    Meant for the gunicorn master (see gunicorn.conf.py): with preload_app the workers are
+    forked afterwards and share these copy-on-write. Database connections opened here are
+    closed so that no worker inherits them.
+    """
+    try:
+        DraftRecommendationView.warm_up()
+        get_draft_index()
+    finally:
+        connections.close_all()
@@ -0,0 +1,411 @@
+import heapq
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+from django.conf import settings
+
+from .models import GameDraftSummary
+
+DRAFT_INDEX_PATH = os.path.join("draft", "ml_artifacts", "draft_index.npz")
+DRAFT_INDEX_FORMAT_VERSION = 3
+PICKS_PER_SIDE = 5
+BANS_PER_SIDE = 5
+
+# Similarity weights, see DraftIndex.score_games
+SCORE_SAME_SIDE = 1.0
+SCORE_PICK_ORDER = 0.25
+SCORE_OTHER_SIDE = 0.5
+SCORE_BAN = 0.2
+SCORE_SAME_TEAM = 1.5
+SCORE_SAME_TEAM_OTHER_SIDE = 0.75
+
+ARRAY_FIELDS = ("game_ids", "pick_bits", "drafters", "picks", "bans", "start_times")
+
+
+class DraftIndex:
+    """
+    Inverted index from champion to the games it was picked in, built from GameDraftSummary.
+
+    For every champion and side there is a bitset over indexed games (packed uint8 rows,
+    one bit per game), plus the drafter (team external id) of each side per game. Overlap
+    counts for a set of champions over all games become a sum of a few unpacked rows.
+    Per-game composition arrays (picks and bans per side, in draft order) are kept for
+    ranking the matched games. Games whose summary was deleted keep their position with
+    nothing indexed and a game id of -1.
+
+    An index that get_draft_index has handed out is never modified: refreshing works on a
+    copy, so a request sees arrays and num_games that agree for as long as it holds on to it.
+    The copy shares the arrays until it changes an already indexed game; new games are written
+    past the num_games of the older index, which it never reads.
+    """
+
+    def __init__(self):
+        self.num_games = 0
+        self.game_ids = np.zeros(0, dtype=np.int64)       # position -> Game.id
+        self.game_pos = {}                                 # Game.id -> position
+        self.champion_ids = []                             # row -> Champion.id
+        self.champion_rows = {}                            # Champion.id -> row
+        self.drafter_ids = []                              # code -> drafter id
+        self.drafter_codes = {}                            # drafter id -> code
+        self.pick_bits = np.zeros((2, 0, 0), dtype=np.uint8)     # (side, champion row, game byte)
+        self.drafters = np.full((2, 0), -1, dtype=np.int32)      # (side, game position)
+        # Per-game composition vectors as champion rows, -1 for empty slots
+        self.picks = np.full((0, 2, PICKS_PER_SIDE), -1, dtype=np.int32)
+        self.bans = np.full((0, 2, BANS_PER_SIDE), -1, dtype=np.int32)
+        self.start_times = np.zeros(0, dtype=np.float64)        # match start timestamp or nan
+        self.synced_until = None                                # latest GameDraftSummary.updated_at seen
+        self.synced_game_ids = set()                            # games seen with updated_at == synced_until
+        self._shared = set()                                    # ARRAY_FIELDS shared with the index copied from
+
+    # Building
+
+    def copy(self):
+        """An index to refresh in place of this one, sharing its arrays (see _own)."""
+        index = DraftIndex()
+        index.num_games = self.num_games
+        for name in ARRAY_FIELDS:
+            setattr(index, name, getattr(self, name))
+        index._shared = set(ARRAY_FIELDS)
+        index.game_pos = dict(self.game_pos)
+        index.champion_ids = list(self.champion_ids)
+        index.champion_rows = dict(self.champion_rows)
+        index.drafter_ids = list(self.drafter_ids)
+        index.drafter_codes = dict(self.drafter_codes)
+        index.synced_until = self.synced_until
+        index.synced_game_ids = set(self.synced_game_ids)
+        return index
+
+    def _own(self, *names):
+        """Copies the named arrays if they are still shared, before indexed games are changed in them."""
+        for name in self._shared.intersection(names):
+            setattr(self, name, getattr(self, name).copy())
+            self._shared.discard(name)
+
+    def _ensure_capacity(self, num_games, num_champions):
+        _, rows, game_bytes = self.pick_bits.shape
+        needed_bytes = (num_games + 7) // 8
+        if needed_bytes > game_bytes or num_champions > rows:
+            new_bytes = max(needed_bytes, game_bytes * 2, 128) if needed_bytes > game_bytes else game_bytes
+            new_rows = max(num_champions, rows * 2, 64) if num_champions > rows else rows
+            bits = np.zeros((2, new_rows, new_bytes), dtype=np.uint8)
+            bits[:, :rows, :game_bytes] = self.pick_bits
+            self.pick_bits = bits
+            self._shared.discard("pick_bits")
+        if num_games > self.drafters.shape[1]:
+            capacity = max(num_games, self.drafters.shape[1] * 2, 1024)
+            drafters = np.full((2, capacity), -1, dtype=np.int32)
+            drafters[:, :self.drafters.shape[1]] = self.drafters
+            self.drafters = drafters
+            self.game_ids = self._grow(self.game_ids, capacity, 0)
+            self.picks = self._grow(self.picks, capacity, -1)
+            self.bans = self._grow(self.bans, capacity, -1)
+            self.start_times = self._grow(self.start_times, capacity, np.nan)
+            self._shared.difference_update(("drafters", "game_ids", "picks", "bans", "start_times"))
+
+    @staticmethod
+    def _grow(array, capacity, fill):
+        grown = np.full((capacity,) + array.shape[1:], fill, dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def _code(self, value, ids, codes):
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(ids)
+            ids.append(value)
+        return code
+
+    def _position(self, game_id):
+        """Position of a game, clearing whatever was indexed for it before."""
+        pos = self.game_pos.get(game_id)
+        if pos is None:
+            pos = self.game_pos[game_id] = self.num_games
+            self.num_games += 1
+            self._ensure_capacity(self.num_games, len(self.champion_ids))
+            self.game_ids[pos] = game_id
+        else:
+            self._clear(pos)
+        return pos
+
+    def _clear(self, pos):
+        self._own("pick_bits", "drafters", "picks", "bans", "start_times")
+        self.pick_bits[:, :, pos >> 3] &= np.uint8(~(0x80 >> (pos & 7)) & 0xFF)
+        self.drafters[:, pos] = -1
+        self.picks[pos] = -1
+        self.bans[pos] = -1
+        self.start_times[pos] = np.nan
+
+    def remove_games(self, game_ids):
+        """Unindexes games, e.g. whose summary was deleted. Returns the number removed."""
+        removed = 0
+        for game_id in game_ids:
+            pos = self.game_pos.pop(game_id, None)
+            if pos is not None:
+                self._clear(pos)
+                self._own("game_ids")
+                self.game_ids[pos] = -1
+                removed += 1
+        return removed
+
+    def add_summaries(self, rows):
+        """
+        rows: iterable of (game_id, blue_picks, red_picks, blue_bans, red_bans,
+        blue_drafter_id, red_drafter_id, start_time) tuples, as in GameDraftSummary.
+        A game that is already indexed is replaced.
+        """
+        bit_sides, bit_rows, bit_pos = [], [], []
+        for game_id, blue_picks, red_picks, blue_bans, red_bans, blue_drafter, red_drafter, start_time in rows:
+            pos = self._position(game_id)
+            for side, (picks, bans, drafter) in enumerate((
+                (blue_picks, blue_bans, blue_drafter),
+                (red_picks, red_bans, red_drafter),
+            )):
+                pick_rows = [self._code(c, self.champion_ids, self.champion_rows) for c in picks or []]
+                ban_rows = [self._code(c, self.champion_ids, self.champion_rows) for c in bans or []]
+                self.picks[pos, side, :len(pick_rows[:PICKS_PER_SIDE])] = pick_rows[:PICKS_PER_SIDE]
+                self.bans[pos, side, :len(ban_rows[:BANS_PER_SIDE])] = ban_rows[:BANS_PER_SIDE]
+                bit_sides += [side] * len(pick_rows)
+                bit_rows += pick_rows
+                bit_pos += [pos] * len(pick_rows)
+                if drafter:
+                    self.drafters[side, pos] = self._code(drafter, self.drafter_ids, self.drafter_codes)
+            self.start_times[pos] = start_time.timestamp() if start_time is not None else np.nan
+
+        if bit_pos:
+            self._ensure_capacity(self.num_games, len(self.champion_ids))
+            pos = np.array(bit_pos, dtype=np.int64)
+            np.bitwise_or.at(
+                self.pick_bits,
+                (np.array(bit_sides, dtype=np.int64), np.array(bit_rows, dtype=np.int64), pos >> 3),
+                (0x80 >> (pos & 7)).astype(np.uint8),
+            )
+
+    def _new_summaries(self):
+        summaries = GameDraftSummary.objects.all()
+        if self.synced_until is not None:
+            # >= rather than >: rows sharing the last timestamp may not all have been seen
+            summaries = summaries.filter(updated_at__gte=self.synced_until).exclude(
+                game_id__in=self.synced_game_ids, updated_at=self.synced_until
+            )
+        return summaries
+
+    def new_summary_rows(self):
+        """Rows of the summaries written since the last update, in the order they were written."""
+        return self._new_summaries().order_by("updated_at").values_list(
+            "game_id", "blue_picks", "red_picks", "blue_bans", "red_bans",
+            "blue_drafter_id", "red_drafter_id", "start_time", "updated_at",
+        )
+
+    def has_changes(self):
+        """Whether summaries were written or deleted since the last update, in two cheap queries."""
+        return self._new_summaries().exists() or GameDraftSummary.objects.count() != len(self.game_pos)
+
+    def update_from_db(self, chunk_size=2000):
+        """
+        Indexes game summaries written since the last update and drops the games whose summary
+        was deleted. Returns the number of games added, replaced or removed.
+        """
+        rows = self.new_summary_rows().iterator(chunk_size=chunk_size)
+
+        added = 0
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= chunk_size:
+                added += self._add_summary_batch(batch)
+                batch = []
+        added += self._add_summary_batch(batch)
+
+        # Deleted summaries leave no trace in updated_at, so the indexed games are reconciled
+        # whenever their number differs from the rows'. A deletion hidden by a summary written
+        # after the query above shows up on the next update, once that one is indexed.
+        removed = 0
+        if GameDraftSummary.objects.count() != len(self.game_pos):
+            existing = set(GameDraftSummary.objects.values_list("game_id", flat=True).iterator(chunk_size=chunk_size))
+            removed = self.remove_games([game_id for game_id in self.game_pos if game_id not in existing])
+        return added + removed
+
+    def _add_summary_batch(self, batch):
+        if not batch:
+            return 0
+        self.add_summaries(row[:-1] for row in batch)
+        last = batch[-1][-1]
+        if last != self.synced_until:
+            self.synced_game_ids = set()
+        self.synced_until = last
+        self.synced_game_ids.update(row[0] for row in batch if row[-1] == last)
+        return len(batch)
+
+    # Queries
+
+    def _champion_bits(self, champion_ids, side=None):
+        """(len(champion rows), num_games) bool matrix of picks, for one side or either side."""
+        rows = sorted({self.champion_rows[c] for c in champion_ids if c in self.champion_rows})
+        n = self.num_games
+        if not rows or n == 0:
+            return np.zeros((0, n), dtype=bool)
+        packed = self.pick_bits[:, rows, :(n + 7) // 8]
+        if side is None:
+            packed = packed[0] | packed[1]
+        else:
+            packed = packed[side]
+        return np.unpackbits(packed, axis=1, count=n).astype(bool)
+
+    def overlap_counts(self, champion_ids):
+        """Per indexed game, how many of champion_ids were picked (by either side)."""
+        return self._champion_bits(champion_ids).sum(axis=0, dtype=np.int32)
+
+    def team_overlap_counts(self, drafter_id, champion_ids):
+        """Per indexed game, how many of champion_ids were picked by the given drafter."""
+        n = self.num_games
+        code = self.drafter_codes.get(drafter_id)
+        counts = np.zeros(n, dtype=np.int32)
+        if code is None:
+            return counts
+        for side in range(2):
+            drafted = self.drafters[side, :n] == code
+            if drafted.any():
+                counts += (self._champion_bits(champion_ids, side) & drafted).sum(axis=0, dtype=np.int32)
+        return counts
+
+    def games_where(self, mask):
+        """Game ids for a boolean mask over indexed games."""
+        return self.game_ids[:self.num_games][mask]
+
+    def score_games(self, positions, picks, bans=((), ()), drafters=(None, None)):
+        """
+        Weighted similarity of the given game positions to a draft.
+
+        picks / bans: (blue, red) lists of champion ids in draft order.
+        drafters: (blue, red) team external ids.
+
+        A queried pick found on the same side scores SCORE_SAME_SIDE plus up to
+        SCORE_PICK_ORDER the closer its pick order is, one found on the other side scores
+        SCORE_OTHER_SIDE. Same-side bans and the same teams drafting add smaller bonuses.
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        scores = np.zeros(len(positions), dtype=np.float64)
+        if len(positions) == 0:
+            return scores
+
+        game_picks = self.picks[positions]
+        game_bans = self.bans[positions]
+
+        for side in range(2):
+            for order, champion_id in enumerate(picks[side]):
+                row = self.champion_rows.get(champion_id)
+                if row is None:
+                    continue
+                same_side = game_picks[:, side, :] == row
+                distance = np.abs(same_side.argmax(axis=1) - order)
+                scores += same_side.any(axis=1) * (
+                    SCORE_SAME_SIDE + SCORE_PICK_ORDER * (1 - np.minimum(distance, 4) / 4)
+                )
+                scores += (game_picks[:, 1 - side, :] == row).any(axis=1) * SCORE_OTHER_SIDE
+
+            ban_rows = [self.champion_rows[c] for c in bans[side] if c in self.champion_rows]
+            if ban_rows:
+                scores += np.isin(game_bans[:, side, :], ban_rows).sum(axis=1) * SCORE_BAN
+
+            code = self.drafter_codes.get(drafters[side])
+            if code is not None:
+                scores += (self.drafters[side, positions] == code) * SCORE_SAME_TEAM
+                scores += (self.drafters[1 - side, positions] == code) * SCORE_SAME_TEAM_OTHER_SIDE
+        return scores
+
+    def top_k(self, positions, scores, k):
+        """
+        (positions, scores) of the k best scored games, ties broken by most recent start time.
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        start_times = np.nan_to_num(self.start_times[positions], nan=-np.inf)
+        best = heapq.nlargest(k, range(len(positions)), key=lambda i: (scores[i], start_times[i]))
+        best = np.array(best, dtype=np.int64)
+        return positions[best], scores[best]
+
+    # Snapshots
+
+    def save(self, path=DRAFT_INDEX_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        n = self.num_games
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(
+                f,
+                game_ids=self.game_ids[:n],
+                pick_bits=self.pick_bits[:, :len(self.champion_ids), :(n + 7) // 8],
+                drafters=self.drafters[:, :n],
+                picks=self.picks[:n],
+                bans=self.bans[:n],
+                start_times=self.start_times[:n],
+                champion_ids=np.array(self.champion_ids, dtype=str),
+                drafter_ids=np.array(self.drafter_ids, dtype=str),
+                synced_until=self.synced_until.isoformat() if self.synced_until else "",
+                synced_game_ids=np.array(sorted(self.synced_game_ids), dtype=np.int64),
+                format_version=DRAFT_INDEX_FORMAT_VERSION,
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=DRAFT_INDEX_PATH):
+        """
+        Raises FileNotFoundError if there is no snapshot and ValueError if it was written
+        in an older format.
+        """
+        index = cls()
+        with np.load(path) as data:
+            if "format_version" not in data or int(data["format_version"]) != DRAFT_INDEX_FORMAT_VERSION:
+                raise ValueError(f"Draft index snapshot {path} has an outdated format")
+            index.game_ids = data["game_ids"].astype(np.int64)
+            index.num_games = len(index.game_ids)
+            index.pick_bits = data["pick_bits"].astype(np.uint8)
+            index.drafters = data["drafters"].astype(np.int32)
+            index.picks = data["picks"].astype(np.int32)
+            index.bans = data["bans"].astype(np.int32)
+            index.start_times = data["start_times"].astype(np.float64)
+            index.champion_ids = data["champion_ids"].tolist()
+            index.drafter_ids = data["drafter_ids"].tolist()
+            synced_until = str(data["synced_until"])
+            if "synced_game_ids" in data:
+                index.synced_game_ids = set(data["synced_game_ids"].tolist())
+        index.synced_until = datetime.fromisoformat(synced_until) if synced_until else None
+        index.game_pos = {int(g): i for i, g in enumerate(index.game_ids) if g >= 0}
+        index.champion_rows = {c: i for i, c in enumerate(index.champion_ids)}
+        index.drafter_codes = {d: i for i, d in enumerate(index.drafter_ids)}
+        return index
+
+
+_index = None
+_index_refreshed_at = 0.0
+_index_lock = threading.Lock()
+
+
+def get_draft_index():
+    """
+    Process-wide DraftIndex: loaded from the on-disk snapshot (or built from the database)
+    on first use, then refreshed with the written and deleted game summaries at most every
+    DRAFT_INDEX_REFRESH_SECONDS. A refresh with something to do updates a copy and swaps it in,
+    so requests holding the previous index keep reading consistent arrays.
+    """
+    global _index, _index_refreshed_at
+    refresh_seconds = getattr(settings, "DRAFT_INDEX_REFRESH_SECONDS", 60)
+    if _index is not None and time.monotonic() - _index_refreshed_at < refresh_seconds:
+        return _index
+
+    with _index_lock:
+        if _index is None:
+            try:
+                _index = DraftIndex.load()
+            except (FileNotFoundError, ValueError):
+                _index = DraftIndex()
+            _index_refreshed_at = 0.0
+        if time.monotonic() - _index_refreshed_at >= refresh_seconds:
+            if _index.has_changes():
+                refreshed = _index.copy()
+                refreshed.update_from_db()
+                _index = refreshed
+            _index_refreshed_at = time.monotonic()
+    return _index
@@ -0,0 +1,323 @@
+from dataclasses import dataclass, replace
+from itertools import islice
+
+import numpy as np
+
+from .models import DraftAction, DraftStatsGame
+
+PICK_COUNTERS = ['wins', 'games_played', 'red_side_wins', 'red_side_games', 'blue_side_wins', 'blue_side_games']
+BAN_COUNTERS = [
+    'games_banned', 'wins',
+    'total_self_bans', 'blue_side_self_bans', 'blue_side_self_wins', 'red_side_self_bans', 'red_side_self_wins',
+    'total_opponent_bans', 'red_side_opponent_bans', 'red_side_opponent_wins', 'blue_side_opponent_bans', 'blue_side_opponent_wins',
+]
+SUMMARY_COUNTERS = ['total_games', 'blue_games', 'red_games']
+
+ACTION_FIELDS = (
+    "game_id", "drafter_id", "champion_id", "action_type", "team_side",
+    "game__winning_team_id", "game__team_1_id", "game__team_1_side", "game__team_2_id", "game__team_2_side",
+)
+BLUE, RED = 0, 1
+SIDE_CODES = {"blue": BLUE, "red": RED}
+# Game columns of ActionColumns, also the fields of DraftStatsGame
+GAME_FIELDS = ("winner", "team_1", "team_1_side", "team_2", "team_2_side")
+
+
+@dataclass
+class ActionColumns:
+    """
+    DraftActions joined to their game as parallel arrays. Teams are Team pks and missing
+    values are -1; champions are codes into champion_ids; sides are BLUE, RED or -1.
+    """
+    game_id: np.ndarray
+    team: np.ndarray          # drafting team, resolved from drafter_id
+    champion: np.ndarray
+    is_pick: np.ndarray
+    is_ban: np.ndarray
+    action_side: np.ndarray   # team_side of the action
+    winner: np.ndarray
+    team_1: np.ndarray
+    team_1_side: np.ndarray
+    team_2: np.ndarray
+    team_2_side: np.ndarray
+    champion_ids: list
+
+    def __len__(self):
+        return len(self.game_id)
+
+
+def _ids(values):
+    """Nullable integer ids as int64, None -> -1."""
+    return np.nan_to_num(np.array(values, dtype=np.float64), nan=-1).astype(np.int64)
+
+
+def _codes(values, codes, default=-1):
+    return np.fromiter((codes.get(v, default) for v in values), dtype=np.int64, count=len(values))
+
+
+def action_rows(actions):
+    """ACTION_FIELDS rows of a DraftAction queryset, in no particular order."""
+    # Without the default sequence_number ordering, which would make SQLite sort every action
+    return actions.order_by().values_list(*ACTION_FIELDS)
+
+
+def fetch_action_columns(actions, team_pks, chunk_size=20000):
+    """
+    Streams the ACTION_FIELDS of a DraftAction queryset into ActionColumns.
+    team_pks: {external id: Team pk}, to resolve drafter_id.
+    """
+    parts = []
+    champion_codes = {}
+    rows = action_rows(actions).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        game_id, drafter_id, champion_id, action_type, team_side, winner, team_1, team_1_side, team_2, team_2_side = zip(*chunk)
+        action_type = np.array(action_type, dtype=object)
+        parts.append((
+            _ids(game_id),
+            _codes(drafter_id, team_pks),
+            np.fromiter((champion_codes.setdefault(c, len(champion_codes)) for c in champion_id), dtype=np.int64, count=len(chunk)),
+            action_type == "pick",
+            action_type == "ban",
+            _codes(team_side, SIDE_CODES),
+            _ids(winner),
+            _ids(team_1),
+            _codes(team_1_side, SIDE_CODES),
+            _ids(team_2),
+            _codes(team_2_side, SIDE_CODES),
+        ))
+
+    if not parts:
+        empty = np.zeros(0, dtype=np.int64)
+        return ActionColumns(*[empty] * 3, *[empty.astype(bool)] * 2, *[empty] * 6, champion_ids=[])
+    return ActionColumns(*(np.concatenate(column) for column in zip(*parts)), champion_ids=list(champion_codes))
+
+
+class PickBanTables:
+    """
+    Pick/ban counters as dense (team, champion) arrays, plus the distinct games per team
+    for TeamDraftSummary. Rows are the Team pks in team_ids, columns the Champion ids in
+    champion_ids; only teams that drafted get a summary.
+
+    counted_games: {game id: GAME_FIELDS values} the games were counted with, for DraftStatsGame.
+    """
+
+    def __init__(self, team_ids, champion_ids, picks, bans, summaries, drafted, counted_games=None):
+        self.team_ids = team_ids
+        self.champion_ids = champion_ids
+        self.picks = picks
+        self.bans = bans
+        self.summaries = summaries
+        self.drafted = drafted
+        self.counted_games = counted_games or {}
+
+    @classmethod
+    def merge(cls, parts):
+        """Sums the tables of disjoint sets of games (see aggregate_games) into one."""
+        team_ids = np.unique(np.concatenate([part.team_ids for part in parts]))
+        champion_codes = {}
+        for part in parts:
+            for champion_id in part.champion_ids:
+                champion_codes.setdefault(champion_id, len(champion_codes))
+        shape = (len(team_ids), len(champion_codes))
+        picks = {name: np.zeros(shape, dtype=np.int64) for name in PICK_COUNTERS}
+        bans = {name: np.zeros(shape, dtype=np.int64) for name in BAN_COUNTERS}
+        summaries = {name: np.zeros(len(team_ids), dtype=np.int64) for name in SUMMARY_COUNTERS}
+        drafted = np.zeros(len(team_ids), dtype=bool)
+        counted_games = {}
+
+        for part in parts:
+            rows = np.searchsorted(team_ids, part.team_ids)
+            cells = np.ix_(rows, np.array([champion_codes[c] for c in part.champion_ids], dtype=np.int64))
+            for merged, counters in ((picks, part.picks), (bans, part.bans)):
+                for name, values in counters.items():
+                    merged[name][cells] += values
+            for name, values in part.summaries.items():
+                summaries[name][rows] += values
+            drafted[rows] |= part.drafted
+            counted_games.update(part.counted_games)
+        return cls(team_ids, list(champion_codes), picks, bans, summaries, drafted, counted_games)
+
+    def negated(self):
+        """The same tables with every counter negated, to take counted games back out in a merge."""
+        return PickBanTables(
+            self.team_ids, self.champion_ids,
+            {name: -values for name, values in self.picks.items()},
+            {name: -values for name, values in self.bans.items()},
+            {name: -values for name, values in self.summaries.items()},
+            self.drafted,
+        )
+
+    def _rows(self, counters):
+        # Any non-zero counter: recounted games (see recount_games) can change wins but not games
+        teams, champions = np.nonzero(np.any([values != 0 for values in counters.values()], axis=0))
+        values = {name: counters[name][teams, champions].tolist() for name in counters}
+        team_ids = self.team_ids[teams].tolist()
+        champion_ids = [self.champion_ids[c] for c in champions]
+        return {
+            (team_id, champion_id): {
+                'team_id': team_id, 'champion_id': champion_id,
+                **{name: column[i] for name, column in values.items()},
+            }
+            for i, (team_id, champion_id) in enumerate(zip(team_ids, champion_ids))
+        }
+
+    def pick_stats(self):
+        """{(team pk, champion id): TeamChampionPickStats fields} for every pair with picks."""
+        return self._rows(self.picks)
+
+    def ban_stats(self):
+        return self._rows(self.bans)
+
+    def summary_stats(self):
+        return {
+            team_id: {'team_id': team_id, **{name: int(self.summaries[name][t]) for name in SUMMARY_COUNTERS}}
+            for t, team_id in zip(np.flatnonzero(self.drafted), self.team_ids[self.drafted].tolist())
+        }
+
+
+def aggregate_actions(columns, counted=None):
+    """
+    Computes PickBanTables from ActionColumns with grouped np.bincount reductions over
+    team * num_champions + champion keys.
+
+    Actions whose drafter is not a known team are skipped, and pick/ban counters need the
+    team to be one of the two teams of the game. A team's side and result come from the game,
+    the opponent's ban counters use the other team of the game.
+
+    counted: ActionColumns of actions aggregated by an earlier run. Their (team, game) and
+    (team, game, side) combinations are not counted as new games again.
+    """
+    known = columns.team >= 0
+    as_team_1 = known & (columns.team == columns.team_1)
+    as_team_2 = known & ~as_team_1 & (columns.team == columns.team_2)
+    in_game = as_team_1 | as_team_2
+    side = np.where(as_team_1, columns.team_1_side, np.where(as_team_2, columns.team_2_side, -1))
+    opponent = np.where(as_team_1, columns.team_2, np.where(as_team_2, columns.team_1, -1))
+    won = known & (columns.winner == columns.team)
+
+    team_ids = np.unique(np.concatenate([columns.team[known], opponent[opponent >= 0]]))
+    num_teams, num_champions = len(team_ids), len(columns.champion_ids)
+    team = np.searchsorted(team_ids, columns.team)
+    opp = np.searchsorted(team_ids, opponent)
+
+    def count(rows, mask):
+        key = rows[mask] * num_champions + columns.champion[mask]
+        return np.bincount(key, minlength=num_teams * num_champions).reshape(num_teams, num_champions)
+
+    blue, red = side == BLUE, side == RED
+    picks = columns.is_pick & in_game
+    picks = {
+        'games_played': count(team, picks),
+        'wins': count(team, picks & won),
+        'blue_side_games': count(team, picks & blue),
+        'blue_side_wins': count(team, picks & blue & won),
+        'red_side_games': count(team, picks & red),
+        'red_side_wins': count(team, picks & red & won),
+    }
+
+    bans = columns.is_ban & in_game
+    opp_bans = bans & (opponent >= 0)
+    # Seen from the opponent, which is on the blue side unless the banning team is
+    opp_blue = opp_bans & ~blue
+    opp_won = opp_bans & ~won
+    self_counters = {
+        'total_self_bans': count(team, bans),
+        'blue_side_self_bans': count(team, bans & blue),
+        'blue_side_self_wins': count(team, bans & blue & won),
+        'red_side_self_bans': count(team, bans & red),
+        'red_side_self_wins': count(team, bans & red & won),
+    }
+    opponent_counters = {
+        'total_opponent_bans': count(opp, opp_bans),
+        'blue_side_opponent_bans': count(opp, opp_blue),
+        'blue_side_opponent_wins': count(opp, opp_blue & opp_won),
+        'red_side_opponent_bans': count(opp, opp_bans & blue),
+        'red_side_opponent_wins': count(opp, opp_bans & blue & opp_won),
+    }
+    bans = {
+        'games_banned': self_counters['total_self_bans'] + opponent_counters['total_opponent_bans'],
+        'wins': count(team, bans & won) + count(opp, opp_won),
+        **self_counters,
+        **opponent_counters,
+    }
+
+    # Distinct games per drafting team, overall and per side of the action
+    summaries = {}
+    stride = int(max(columns.game_id.max(initial=0), counted.game_id.max(initial=0) if counted else 0)) + 1
+    for name, mask, counted_mask in (
+        ('total_games', known, None),
+        ('blue_games', known & (columns.action_side == BLUE), BLUE),
+        ('red_games', known & (columns.action_side == RED), RED),
+    ):
+        keys = np.unique(team_ids[team[mask]] * stride + columns.game_id[mask])
+        if counted is not None and len(counted):
+            seen = counted.team >= 0
+            if counted_mask is not None:
+                seen &= counted.action_side == counted_mask
+            keys = keys[~np.isin(keys, counted.team[seen] * stride + counted.game_id[seen])]
+        summaries[name] = np.bincount(np.searchsorted(team_ids, keys // stride), minlength=num_teams)
+
+    drafted = np.bincount(team[known], minlength=num_teams) > 0
+    games, first = np.unique(columns.game_id, return_index=True)
+    game_fields = np.stack([getattr(columns, name) for name in GAME_FIELDS], axis=1)[first]
+    counted_games = dict(zip(games.tolist(), map(tuple, game_fields.tolist())))
+    return PickBanTables(team_ids, columns.champion_ids, picks, bans, summaries, drafted, counted_games)
+
+
+def game_range_actions(first_game_id, last_game_id):
+    """DraftActions of the games first_game_id..last_game_id."""
+    return DraftAction.objects.filter(game_id__gte=first_game_id, game_id__lte=last_game_id)
+
+
+def aggregate_games(first_game_id, last_game_id, low_water_mark, high_water_mark, team_pks, chunk_size=20000):
+    """
+    PickBanTables of the actions with low_water_mark < id <= high_water_mark in the games
+    first_game_id..last_game_id. Games never span two ranges, so the tables of disjoint
+    ranges can be merged; process_draft_tables --workers runs the ranges in worker processes.
+    """
+    games = game_range_actions(first_game_id, last_game_id)
+    columns = fetch_action_columns(games.filter(id__gt=low_water_mark, id__lte=high_water_mark), team_pks, chunk_size)
+    # Earlier actions of the same games, whose games were counted by a previous run
+    counted = None
+    if low_water_mark:
+        new_games = games.filter(id__gt=low_water_mark, id__lte=high_water_mark).values('game_id')
+        counted = fetch_action_columns(games.filter(id__lte=low_water_mark, game_id__in=new_games), team_pks, chunk_size)
+    return aggregate_actions(columns, counted)
+
+
+
+def changed_games(chunk_size=20000):
+    """
+    {game id: GAME_FIELDS values it was counted with} of the counted games (DraftStatsGame)
+    whose winner, teams or sides were changed since.
+    """
+    rows = DraftStatsGame.objects.values_list(
+        "game_id", *GAME_FIELDS,
+        "game__winning_team_id", "game__team_1_id", "game__team_1_side", "game__team_2_id", "game__team_2_side",
+    ).iterator(chunk_size=chunk_size)
+    changed = {}
+    for game_id, *counted, winner, team_1, team_1_side, team_2, team_2_side in rows:
+        current = [
+            -1 if winner is None else winner,
+            -1 if team_1 is None else team_1, SIDE_CODES.get(team_1_side, -1),
+            -1 if team_2 is None else team_2, SIDE_CODES.get(team_2_side, -1),
+        ]
+        if current != counted:
+            changed[game_id] = tuple(counted)
+    return changed
+
+
+def recount_games(counted_games, low_water_mark, team_pks, chunk_size=20000):
+    """
+    PickBanTables of the correction for games counted with other GAME_FIELDS values than their
+    Game has now (see changed_games): their actions up to low_water_mark counted with the current
+    values minus the same actions counted with the old ones. The games per team do not change.
+    """
+    actions = DraftAction.objects.filter(game_id__in=list(counted_games), id__lte=low_water_mark)
+    columns = fetch_action_columns(actions, team_pks, chunk_size)
+    old_fields = np.array([counted_games[game_id] for game_id in columns.game_id.tolist()], dtype=np.int64).reshape(-1, len(GAME_FIELDS))
+    counted = replace(columns, **{name: old_fields[:, i] for i, name in enumerate(GAME_FIELDS)})
+    return PickBanTables.merge([aggregate_actions(columns), aggregate_actions(counted).negated()])
@@ -2,6 +2,7 @@
 import json
 import os
 import numpy as np
+from .pair_stats import PairStatsTables
 
 ROLES = ["top", "jungle", "mid", "bot", "support"]
 REQUIRED_SLOTS = {role: 1.0 for role in ROLES}
@@ -12,37 +13,69 @@ class DeltaAnalyzer:
         self.champ_to_idx = champ_to_idx
         self.idx_to_champ = idx_to_champ
         self.idx_to_name = idx_to_name
+        # Integer-indexed lookup tables so hot paths avoid str(idx) dict lookups
+        num_champions = self.model.num_champions
+        self.names = [idx_to_name.get(str(i)) for i in range(num_champions)]
+        self.champ_uuids = [idx_to_champ.get(str(i)) for i in range(num_champions)]
+        self.name_to_idx = {name: i for i, name in enumerate(self.names) if name}
         self.champ_roles = {}
         if os.path.exists(champ_roles_path):
             with open(champ_roles_path, 'r') as f:
                 data = json.load(f)
                 self.champ_roles = {self.normalize_name(k): v for k, v in data.items()}
+
+        # (num_champions, 5) role bitmasks, built once so role checks can be vectorized.
+        # role_bits only holds known roles; viable_role_bits treats unknown champions as flex.
+        self.role_bits = self.build_role_bits()
+        self.viable_role_bits = self.role_bits | ~self.role_bits.any(dim=1, keepdim=True)
         
-        # Load synergies if available
-        self.synergies = {}
-        self.counters = {}
-        synergy_path = os.path.join(os.path.dirname(champ_roles_path), "synergy_counter.json")
-        if os.path.exists(synergy_path):
-            try:
-                with open(synergy_path, 'r') as f:
-                    data = json.load(f)
-                    self.synergies = data.get("synergy", {})
-                    self.counters = data.get("counter", {})
-            except:
-                pass
+        # Dense synergy/counter tables (memory-mapped when available)
+        self.pair_stats = PairStatsTables.load(os.path.dirname(champ_roles_path), self.names)
 
     def normalize_name(self, name):
         if not name: return ""
         return name.replace("'", "").replace(" ", "").replace(".", "").lower()
 
+    def names_for_ids(self, champion_ids):
+        """
+        Resolves champion UUIDs to names through the name table.
+        Only champions unknown to the model are looked up in the database.
+        """
+        names = []
+        unknown = []
+        for champion_id in champion_ids:
+            idx = self.champ_to_idx.get(champion_id)
+            if idx is not None and idx < len(self.names) and self.names[idx]:
+                names.append(self.names[idx])
+            else:
+                unknown.append(champion_id)
+        if unknown:
+            from draft.models import Champion
+            names.extend(Champion.objects.filter(id__in=unknown).values_list('name', flat=True))
+        return names
+
+    def build_role_bits(self):
+        num_champions = self.model.num_champions
+        role_bits = torch.zeros((num_champions, len(ROLES)), dtype=torch.bool)
+        for idx_str, name in self.idx_to_name.items():
+            idx = int(idx_str)
+            if idx >= num_champions: continue
+            for r in self.champ_roles.get(self.normalize_name(name), []):
+                if r.lower() in ROLES:
+                    role_bits[idx, ROLES.index(r.lower())] = True
+        return role_bits
+
     def get_synergy_score(self, champ1, champ2):
-        key = f"{champ1}|{champ2}"
-        key_rev = f"{champ2}|{champ1}"
-        return self.synergies.get(key, 0) or self.synergies.get(key_rev, 0)
+        i, j = self.name_to_idx.get(champ1), self.name_to_idx.get(champ2)
+        if i is None or j is None:
+            return 0
+        return float(self.pair_stats.synergy[i, j])
 
     def get_counter_score(self, counter_champ, target_champ):
-        key = f"{counter_champ}|{target_champ}"
-        return self.counters.get(key, 0)
+        i, j = self.name_to_idx.get(counter_champ), self.name_to_idx.get(target_champ)
+        if i is None or j is None:
+            return 0
+        return float(self.pair_stats.counter[i, j])
 
     def role_coverage(self, picks):
         """
@@ -64,55 +97,83 @@ class DeltaAnalyzer:
         return pressure
 
     def compute_delta(self, champ_ids, action_types, sides, positions, team_idx, opp_team_idx, candidate_champ_idx, opp_side_val=None):
+        return self.compute_deltas(
+            champ_ids, action_types, sides, positions, team_idx, opp_team_idx,
+            [candidate_champ_idx], opp_side_val
+        )[0]
+
+    def compute_deltas(self, champ_ids, action_types, sides, positions, team_idx, opp_team_idx, candidate_champ_idxs, opp_side_val=None, p_now=None):
+        """
+        Batched compute_delta: scores every "opponent takes candidate X" state in a single
+        forward pass. champ_ids/action_types/sides/positions describe one draft (batch of 1).
+        If p_now (the current distribution, shape (1, num_champions)) is not given, it is
+        computed in the same pass as row 0 of a (K+1, 20) batch.
+        Returns a list of deltas aligned with candidate_champ_idxs.
+        """
+        candidate_champ_idxs = [int(c) for c in candidate_champ_idxs]
+        if not candidate_champ_idxs:
+            return []
+
         self.model.eval()
-        
+
         # Ensure indices are tensors
         if not isinstance(team_idx, torch.Tensor):
             team_idx = torch.tensor([team_idx], device=champ_ids.device)
         if not isinstance(opp_team_idx, torch.Tensor):
             opp_team_idx = torch.tensor([opp_team_idx], device=champ_ids.device)
 
+        num_champs = self.model.num_champions
+        # Find the first PAD slot
+        is_pad = (champ_ids[0] == num_champs)
+        if not is_pad.any():
+            return [0.0] * len(candidate_champ_idxs)
+
+        first_pad = is_pad.nonzero(as_tuple=True)[0][0].item()
+
+        # Use provided opponent side or infer it
+        if opp_side_val is not None:
+            opp_side = opp_side_val
+        else:
+            last_side = 1
+            if first_pad > 0:
+                last_side = sides[0, first_pad-1].item()
+            opp_side = 2 if last_side == 1 else 1
+
+        # Simulate skipping each candidate (opponent takes it).
+        # In their perspective, they are the acting team and WE are the opponent,
+        # but the AFTER states are still scored from our perspective.
+        k = len(candidate_champ_idxs)
+        new_champ_ids = champ_ids[:1].repeat(k, 1)
+        new_action_types = action_types[:1].repeat(k, 1)
+        new_sides = sides[:1].repeat(k, 1)
+
+        new_champ_ids[:, first_pad] = torch.tensor(candidate_champ_idxs, dtype=champ_ids.dtype, device=champ_ids.device)
+        new_action_types[:, first_pad] = 2 # PICK
+        new_sides[:, first_pad] = opp_side
+
+        if p_now is None:
+            # Row 0 is the current state, rows 1..K the AFTER states
+            new_champ_ids = torch.cat([champ_ids[:1], new_champ_ids])
+            new_action_types = torch.cat([action_types[:1], new_action_types])
+            new_sides = torch.cat([sides[:1], new_sides])
+
+        batch_size = new_champ_ids.size(0)
         with torch.no_grad():
-            # Step 1: current distribution
-            logits_now = self.model(champ_ids, action_types, sides, positions, team_idx, opp_team_idx)
-            p_now = torch.softmax(logits_now, dim=-1)
-
-            # Step 2: simulate skipping a candidate (opponent takes it)
-            # When we skip, the opponent picks it.
-            # In their perspective, they are the acting team and WE are the opponent.
-            new_champ_ids = champ_ids.clone()
-            new_action_types = action_types.clone()
-            new_sides = sides.clone()
-            
-            num_champs = self.model.num_champions
-            # Find the first PAD slot
-            is_pad = (new_champ_ids == num_champs)
-            if not is_pad.any():
-                return 0.0
-            
-            first_pad = is_pad.nonzero(as_tuple=True)[1][0].item()
-            
-            # Use provided opponent side or infer it
-            if opp_side_val is not None:
-                opp_side = opp_side_val
-            else:
-                last_side = 1
-                if first_pad > 0:
-                    last_side = sides[0, first_pad-1].item()
-                opp_side = 2 if last_side == 1 else 1
-            
-            new_champ_ids[0, first_pad] = candidate_champ_idx
-            new_action_types[0, first_pad] = 2 # PICK
-            new_sides[0, first_pad] = opp_side
-            
-            # Important: when simulating the AFTER state, the model should see it from our perspective.
-            # But the opponent just took a champion.
-            logits_after = self.model(new_champ_ids, new_action_types, new_sides, positions, team_idx, opp_team_idx)
-            p_after = torch.softmax(logits_after, dim=-1)
-            
-            # Step 3: KL divergence
-            delta = torch.sum(p_now * (torch.log(p_now + 1e-9) - torch.log(p_after + 1e-9))).item()
-            return delta
+            logits = self.model(
+                new_champ_ids, new_action_types, new_sides,
+                positions[:1].expand(batch_size, -1),
+                team_idx.expand(batch_size), opp_team_idx.expand(batch_size)
+            )
+            probs = torch.softmax(logits, dim=-1)
+
+        if p_now is None:
+            p_now, p_after = probs[:1], probs[1:]
+        else:
+            p_after = probs
+
+        # KL divergence per candidate
+        deltas = torch.sum(p_now * (torch.log(p_now + 1e-9) - torch.log(p_after + 1e-9)), dim=-1)
+        return deltas.tolist()
 
     def get_displayed_role(self, picks_so_far, new_pick_name):
         """
@@ -189,22 +250,45 @@ class DeltaAnalyzer:
             
         return self.find_role_assignment(champions_roles) is not None
 
-    def analyze_pick(self, candidate_name, own_picks_names, enemy_picks_names, all_bans_names, side, team_idx, opp_team_idx, total_actions, baseline_name, champ_ids, action_types, sides, positions, opp_side_val=None, candidate_idx=None, is_ban=False):
+    def viable_pick_mask(self, current_picks):
+        """
+        Vectorized is_viable_pick for every champion index at once.
+        current_picks: list of champion names
+        Returns a bool tensor (num_champions,).
+        """
+        num_champions = self.viable_role_bits.size(0)
+        if len(current_picks) + 1 > 5:
+            return torch.zeros(num_champions, dtype=torch.bool)
+
+        champions_roles = []
+        for name in current_picks:
+            roles = self.champ_roles.get(self.normalize_name(name), [])
+            roles = [r.lower() for r in roles if r.lower() in ROLES]
+            champions_roles.append(roles or ROLES)
+
+        # A new pick fits if it can take some role R while the current picks
+        # still have a valid assignment without R, so only 5 checks are needed.
+        open_roles = torch.tensor([
+            self.find_role_assignment([[r for r in roles if r != role] for roles in champions_roles]) is not None
+            for role in ROLES
+        ])
+        return (self.viable_role_bits & open_roles).any(dim=1)
+
+    def analyze_pick(self, candidate_name, own_picks_names, enemy_picks_names, all_bans_names, side, team_idx, opp_team_idx, total_actions, baseline_name, champ_ids, action_types, sides, positions, opp_side_val=None, candidate_idx=None, is_ban=False, delta=None):
         """
         Provides a descriptive explanation for a pick.
+        delta: precomputed urgency delta (see compute_deltas); computed on demand if omitted.
         """
         explanation = []
+        champ_idx = candidate_idx if candidate_idx is not None else self.name_to_idx.get(candidate_name)
         
         # 1. Synergy Analysis
         best_synergy = 0
         best_ally = ""
         # If it's a ban, we look at synergy with ENEMY team (to deny it)
         synergy_targets = enemy_picks_names if is_ban else own_picks_names
-        for target in synergy_targets:
-            score = self.get_synergy_score(candidate_name, target)
-            if score > best_synergy:
-                best_synergy = score
-                best_ally = target
+        if champ_idx is not None:
+            best_synergy, best_ally = self.best_pair_match(self.pair_stats.best_synergy_partner, champ_idx, synergy_targets)
         
         if best_synergy > 0.05:
             if is_ban:
@@ -217,17 +301,10 @@ class DeltaAnalyzer:
         best_target = ""
         # If it's a pick, we counter the enemy. 
         # If it's a ban, we prevent the enemy from countering us.
+        # If is_ban, we want to see if candidate counters our team
         counter_targets = own_picks_names if is_ban else enemy_picks_names
-        for target in counter_targets:
-            # If is_ban, we want to see if candidate counters our team
-            if is_ban:
-                score = self.get_counter_score(candidate_name, target)
-            else:
-                score = self.get_counter_score(candidate_name, target)
-            
-            if score > best_counter:
-                best_counter = score
-                best_target = target
+        if champ_idx is not None:
+            best_counter, best_target = self.best_pair_match(self.pair_stats.best_counter_target, champ_idx, counter_targets)
         
         if best_counter > 0.05:
             if is_ban:
@@ -254,8 +331,9 @@ class DeltaAnalyzer:
             explanation.append(f"Flexible pick ({len(roles)} roles)")
 
         # 5. Urgency (Delta)
-        if candidate_idx is not None:
+        if delta is None and candidate_idx is not None:
              delta = self.compute_delta(champ_ids, action_types, sides, positions, team_idx, opp_team_idx, candidate_idx, opp_side_val)
+        if delta is not None:
              if delta > 0.15:
                  explanation.append("Urgent: Highly contested")
              elif delta > 0.05:
@@ -278,6 +356,18 @@ class DeltaAnalyzer:
             return f"CRITICAL: {result}"
         return result
 
+    def best_pair_match(self, query, candidate_idx, target_names):
+        """
+        Runs a PairStatsTables best-match query for one candidate against named targets.
+        Returns (score, target_name), or (0, "") when no target scores above 0.
+        """
+        target_names = [t for t in target_names if t in self.name_to_idx]
+        targets = [self.name_to_idx[t] for t in target_names]
+        scores, matches = query([candidate_idx], targets)
+        if matches[0] < 0:
+            return 0, ""
+        return float(scores[0]), target_names[targets.index(matches[0])]
+
     def get_team_intent(self, champ_ids, action_types, sides, positions, acting_team_idx, opponent_team_idx, picks_names=None):
         """
         Predicts a team's most likely next moves, accounting for missing roles.
@@ -292,7 +382,46 @@ class DeltaAnalyzer:
         with torch.no_grad():
             logits = self.model(champ_ids, action_types, sides, positions, acting_team_idx, opponent_team_idx)
             probs = torch.softmax(logits, dim=-1)[0]
-        
+        return self.intent_from_probs(champ_ids, probs, picks_names)
+
+    def get_team_intents(self, champ_ids, action_types, sides, positions, blue_team_idx, red_team_idx, blue_picks, red_picks, p_now=None, side=None):
+        """
+        get_team_intent for both sides. If p_now (the distribution of the team acting on `side`)
+        is given, only the other side is run through the model; otherwise both sides go through
+        it as one batch of 2.
+        Returns (blue_intent, red_intent).
+        """
+        if not isinstance(blue_team_idx, torch.Tensor):
+            blue_team_idx = torch.tensor([blue_team_idx], device=champ_ids.device)
+        if not isinstance(red_team_idx, torch.Tensor):
+            red_team_idx = torch.tensor([red_team_idx], device=champ_ids.device)
+
+        if p_now is not None:
+            acting_idxs, opponent_idxs = (red_team_idx, blue_team_idx) if side == 'blue' else (blue_team_idx, red_team_idx)
+        else:
+            acting_idxs, opponent_idxs = torch.cat([blue_team_idx, red_team_idx]), torch.cat([red_team_idx, blue_team_idx])
+        batch_size = acting_idxs.size(0)
+
+        self.model.eval()
+        with torch.no_grad():
+            logits = self.model(
+                champ_ids[:1].expand(batch_size, -1), action_types[:1].expand(batch_size, -1),
+                sides[:1].expand(batch_size, -1), positions[:1].expand(batch_size, -1),
+                acting_idxs, opponent_idxs,
+            )
+            probs = torch.softmax(logits, dim=-1)
+
+        if p_now is not None:
+            blue_probs, red_probs = (p_now[0], probs[0]) if side == 'blue' else (probs[0], p_now[0])
+        else:
+            blue_probs, red_probs = probs[0], probs[1]
+        return (
+            self.intent_from_probs(champ_ids, blue_probs, blue_picks),
+            self.intent_from_probs(champ_ids, red_probs, red_picks),
+        )
+
+    def intent_from_probs(self, champ_ids, probs, picks_names=None):
+        """Top 5 likely next champions from a team's distribution, without used champions or roles it already filled."""
         num_champions = self.model.num_champions
         mask = torch.ones_like(probs)
         for i in range(champ_ids.size(1)):
@@ -306,15 +435,9 @@ class DeltaAnalyzer:
             missing_roles = [r for r, v in pressure.items() if v > 0.1]
             
             if missing_roles and len(picks_names) < 5:
-                role_mask = torch.zeros_like(probs)
-                for idx_str, name in self.idx_to_name.items():
-                    idx = int(idx_str)
-                    if idx >= num_champions: continue
-                    
-                    champ_roles = [r.lower() for r in self.champ_roles.get(self.normalize_name(name), [])]
-                    # If champion can fill any of the missing roles, it's a candidate
-                    if any(r in missing_roles for r in champ_roles):
-                        role_mask[idx] = 1.0
+                # If champion can fill any of the missing roles, it's a candidate
+                missing_cols = [ROLES.index(r) for r in missing_roles]
+                role_mask = self.role_bits[:, missing_cols].any(dim=1).to(probs.dtype)
                 
                 # Apply role mask if it's not empty (don't want to mask everything if no champ fits)
                 if role_mask.sum() > 0:
@@ -324,34 +447,42 @@ class DeltaAnalyzer:
         
         k = min(5, probs.size(0))
         top_k = torch.topk(probs, k)
-        return [{"name": self.idx_to_name[str(idx.item())], "prob": prob.item()} for idx, prob in zip(top_k.indices, top_k.values) if prob.item() > 0.01]
+        return [{"name": self.names[idx.item()], "prob": prob.item()} for idx, prob in zip(top_k.indices, top_k.values) if prob.item() > 0.01]
 
-    def get_general_insights(self, champ_ids, action_types, sides, positions, team_idx, opp_team_idx, own_picks_names, enemy_picks_names, all_bans_names, total_actions, side, action_type):
+    def get_general_insights(self, champ_ids, action_types, sides, positions, team_idx, opp_team_idx, own_picks_names, enemy_picks_names, all_bans_names, total_actions, side, action_type, deltas=None, p_now=None):
+        """
+        deltas: optional {champion_idx: delta} already computed for this state (see compute_deltas).
+        p_now: optional distribution of the acting team for this state, shape (1, num_champions).
+        """
         # Ensure indices are tensors
         if not isinstance(team_idx, torch.Tensor):
             team_idx = torch.tensor([team_idx], device=champ_ids.device)
         if not isinstance(opp_team_idx, torch.Tensor):
             opp_team_idx = torch.tensor([opp_team_idx], device=champ_ids.device)
 
-        self.model.eval()
-        with torch.no_grad():
-            logits = self.model(champ_ids, action_types, sides, positions, team_idx, opp_team_idx)
-            probs = torch.softmax(logits, dim=-1)[0]
-            
-            # Mask already used champions
-            num_champions = self.model.num_champions
-            mask = torch.ones_like(probs)
-            for i in range(champ_ids.size(1)):
-                val = champ_ids[0, i].item()
-                if val < num_champions:
-                    mask[val] = 0
-            probs = probs * mask
+        if p_now is None:
+            self.model.eval()
+            with torch.no_grad():
+                logits = self.model(champ_ids, action_types, sides, positions, team_idx, opp_team_idx)
+                p_now = torch.softmax(logits, dim=-1)
+        probs = p_now[0]
+
+        # Mask already used champions
+        num_champions = self.model.num_champions
+        mask = torch.ones_like(probs)
+        for i in range(champ_ids.size(1)):
+            val = champ_ids[0, i].item()
+            if val < num_champions:
+                mask[val] = 0
+        probs = probs * mask
             
         # Urgency: Check if delta of top pick is high
         top_champ_idx = torch.argmax(probs).item()
-        top_champ_name = self.idx_to_name[str(top_champ_idx)]
+        top_champ_name = self.names[top_champ_idx]
         opp_side_val = 2 if side == 'blue' else 1
-        delta = self.compute_delta(champ_ids, action_types, sides, positions, team_idx, opp_team_idx, top_champ_idx, opp_side_val)
+        delta = deltas.get(top_champ_idx) if deltas else None
+        if delta is None:
+            delta = self.compute_delta(champ_ids, action_types, sides, positions, team_idx, opp_team_idx, top_champ_idx, opp_side_val)
         
         urgent_champ = None
         if delta > 0.15:
@@ -372,8 +503,10 @@ class DeltaAnalyzer:
             blue_idx, red_idx = opp_team_idx, team_idx
             blue_picks, red_picks = enemy_picks_names, own_picks_names
 
-        blue_intent = self.get_team_intent(champ_ids, action_types, sides, positions, blue_idx, red_idx, picks_names=blue_picks)
-        red_intent = self.get_team_intent(champ_ids, action_types, sides, positions, red_idx, blue_idx, picks_names=red_picks)
+        # The acting team's intent is p_now itself, only the other side needs the model
+        blue_intent, red_intent = self.get_team_intents(
+            champ_ids, action_types, sides, positions, blue_idx, red_idx, blue_picks, red_picks, p_now=p_now, side=side
+        )
 
         # Missing Roles
         blue_pressure = self.get_role_pressure(blue_picks)
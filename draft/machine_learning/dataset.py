@@ -1,9 +1,16 @@
 ﻿import torch
 from torch.utils.data import Dataset
-from draft.models import Champion, DraftAction
+from draft.models import Champion, DraftAction, GameDraftSummary
 from matches.models import Team, Game
+import glob
+import hashlib
 import json
 import os
+import numpy as np
+
+# Bump when the packed dataset layout changes so stale caches are ignored
+DATASET_FORMAT_VERSION = 1
+DATASET_CACHE_DIR = os.path.join("draft", "ml_artifacts", "cache")
 
 def get_champion_mapping():
     champions = Champion.objects.all().order_by('id')
@@ -18,98 +25,265 @@ def get_team_mapping():
     return team_to_idx
 
 class DraftDataset(Dataset):
+    """
+    Training samples packed into contiguous NumPy arrays: one row per draft action,
+    holding the draft state before that action and the champion that was taken.
+
+    champ_ids, action_types, sides: (N, 20) int16
+    team_idx, opp_team_idx, targets: (N,) int16
+    """
+    ARRAY_NAMES = ("champ_ids", "action_types", "sides", "team_idx", "opp_team_idx", "targets")
+
     def __init__(self, games_data, champ_to_idx, team_to_idx, num_champions):
-        self.samples = []
         self.champ_to_idx = champ_to_idx
         self.num_champs = num_champions
-        
-        for g_data in games_data:
-            actions = g_data['actions']
-            team_map = g_data['team_map']
-            
-            for i, action in enumerate(actions):
-                if i >= 20:
-                    break
-                    
-                target_champ_idx = champ_to_idx.get(action['champion_id'])
-                if target_champ_idx is None:
-                    continue
-                
-                team_idx = team_map.get(action['team_side'].lower(), 0)
-                opp_side = 'red' if action['team_side'].lower() == 'blue' else 'blue'
-                opp_team_idx = team_map.get(opp_side, 0)
-                
-                # Store enough info to reconstruct the state
-                self.samples.append({
-                    "team_idx": team_idx,
-                    "opp_team_idx": opp_team_idx,
-                    "step": i,
-                    "game_actions": [champ_to_idx.get(a['champion_id'], self.num_champs) for a in actions[:i]],
-                    "game_action_types": [1 if a['action_type'] == 'ban' else 2 for a in actions[:i]],
-                    "game_sides": [1 if a['team_side'].lower() == 'blue' else 2 for a in actions[:i]],
-                    "target_champion": target_champ_idx
-                })
+        self._set_arrays(pack_games(games_data, champ_to_idx, num_champions))
+
+    @classmethod
+    def from_database(cls, champ_to_idx, team_to_idx, num_champions, chunk_size=2000):
+        """
+        Builds the dataset straight from streamed DraftAction rows (see iter_game_drafts).
+        """
+        builder = PackedSampleBuilder(champ_to_idx, num_champions)
+        for team_map, actions in iter_game_drafts(team_to_idx, chunk_size=chunk_size):
+            builder.add_game(actions, team_map)
+        dataset = cls.from_arrays(builder.build(), num_champions)
+        dataset.champ_to_idx = champ_to_idx
+        return dataset
+
+    @classmethod
+    def from_arrays(cls, arrays, num_champions):
+        dataset = cls.__new__(cls)
+        dataset.champ_to_idx = None
+        dataset.num_champs = num_champions
+        dataset._set_arrays(arrays)
+        return dataset
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in cls.ARRAY_NAMES}
+            num_champions = int(data["num_champions"])
+        return cls.from_arrays(arrays, num_champions)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, num_champions=self.num_champs, **{name: getattr(self, name) for name in self.ARRAY_NAMES})
+        os.replace(tmp_path, path)
+
+    def split_newest(self, count):
+        """
+        Returns (older, newest) datasets, newest holding the last `count` samples.
+        Samples are packed in game order, so these come from the most recent games.
+        """
+        cut = max(len(self) - count, 0)
+        older = {name: getattr(self, name)[:cut] for name in self.ARRAY_NAMES}
+        newest = {name: getattr(self, name)[cut:] for name in self.ARRAY_NAMES}
+        return self.from_arrays(older, self.num_champs), self.from_arrays(newest, self.num_champs)
+
+    def _set_arrays(self, arrays):
+        for name in self.ARRAY_NAMES:
+            setattr(self, name, arrays[name])
 
     def __len__(self):
-        return len(self.samples)
+        return len(self.targets)
 
     def __getitem__(self, idx):
-        sample = self.samples[idx]
-        
-        champ_ids = torch.full((20,), self.num_champs, dtype=torch.long)
-        action_types = torch.zeros((20,), dtype=torch.long)
-        sides = torch.zeros((20,), dtype=torch.long)
-        positions = torch.arange(20, dtype=torch.long)
-        
-        i = sample['step']
-        prev_champs = sample['game_actions']
-        prev_types = sample['game_action_types']
-        prev_sides = sample['game_sides']
-        
-        for j in range(i):
-            champ_ids[j] = prev_champs[j]
-            action_types[j] = prev_types[j]
-            sides[j] = prev_sides[j]
-            
         return (
-            champ_ids, action_types, sides, positions, 
-            torch.tensor(sample['team_idx'], dtype=torch.long), 
-            torch.tensor(sample['opp_team_idx'], dtype=torch.long),
-            torch.tensor(sample['target_champion'], dtype=torch.long)
+            torch.from_numpy(self.champ_ids[idx].astype(np.int64)),
+            torch.from_numpy(self.action_types[idx].astype(np.int64)),
+            torch.from_numpy(self.sides[idx].astype(np.int64)),
+            torch.arange(20, dtype=torch.long),
+            torch.tensor(self.team_idx[idx], dtype=torch.long),
+            torch.tensor(self.opp_team_idx[idx], dtype=torch.long),
+            torch.tensor(self.targets[idx], dtype=torch.long)
         )
 
+    def get_batch(self, indices):
+        """
+        Same layout as a DataLoader batch of __getitem__ samples, built with one slice per array.
+        """
+        def column(arr):
+            return torch.from_numpy(arr[indices].astype(np.int64))
+
+        champ_ids = column(self.champ_ids)
+        return (
+            champ_ids, column(self.action_types), column(self.sides),
+            torch.arange(20, dtype=torch.long).expand(champ_ids.size(0), -1),
+            column(self.team_idx), column(self.opp_team_idx), column(self.targets)
+        )
+
+    def num_batches(self, batch_size):
+        return (len(self) + batch_size - 1) // batch_size
+
+    def batches(self, batch_size, shuffle=True):
+        order = np.random.permutation(len(self)) if shuffle else np.arange(len(self))
+        for start in range(0, len(order), batch_size):
+            yield self.get_batch(order[start:start + batch_size])
+
+
+class PackedSampleBuilder:
+    """
+    Accumulates games into the packed DraftDataset arrays.
+    Sample i of a game sees actions [0, i) and predicts action i.
+    Per-game rows are consolidated every flush_every games to keep the overhead per game small.
+    """
+    def __init__(self, champ_to_idx, num_champions, flush_every=1024):
+        self.champ_to_idx = champ_to_idx
+        self.num_champs = num_champions
+        self.flush_every = flush_every
+        self.slots = np.arange(20)
+        self.chunks = {name: [] for name in DraftDataset.ARRAY_NAMES}
+        self.pending = {name: [] for name in DraftDataset.ARRAY_NAMES}
+
+    def add_game(self, actions, team_map):
+        """
+        actions: (champion_id, action_type, team_side) tuples in sequence order
+        team_map: {"blue": team_idx, "red": team_idx}
+        """
+        actions = actions[:20]
+        n = len(actions)
+        if n == 0:
+            return
+
+        champs = np.full(20, self.num_champs, dtype=np.int16)
+        types = np.zeros(20, dtype=np.int16)
+        sides = np.zeros(20, dtype=np.int16)
+        champs[:n] = [self.champ_to_idx.get(champion_id, self.num_champs) for champion_id, _, _ in actions]
+        types[:n] = [1 if action_type == 'ban' else 2 for _, action_type, _ in actions]
+        sides[:n] = [1 if team_side.lower() == 'blue' else 2 for _, _, team_side in actions]
+
+        steps = np.array([i for i, (champion_id, _, _) in enumerate(actions) if champion_id in self.champ_to_idx], dtype=np.int64)
+        if steps.size == 0:
+            return
+
+        before = self.slots[None, :] < steps[:, None]
+        self.pending["champ_ids"].append(np.where(before, champs, self.num_champs).astype(np.int16))
+        self.pending["action_types"].append(np.where(before, types, 0).astype(np.int16))
+        self.pending["sides"].append(np.where(before, sides, 0).astype(np.int16))
+
+        blue_team, red_team = team_map.get('blue', 0), team_map.get('red', 0)
+        is_blue = sides[steps] == 1
+        self.pending["team_idx"].append(np.where(is_blue, blue_team, red_team).astype(np.int16))
+        self.pending["opp_team_idx"].append(np.where(is_blue, red_team, blue_team).astype(np.int16))
+        self.pending["targets"].append(champs[steps])
+
+        if len(self.pending["targets"]) >= self.flush_every:
+            self._flush()
+
+    def _flush(self):
+        for name, parts in self.pending.items():
+            if parts:
+                self.chunks[name].append(np.concatenate(parts))
+            self.pending[name] = []
+
+    def build(self):
+        self._flush()
+        return {
+            name: np.concatenate(parts) if parts else np.zeros((0, 20) if name in ("champ_ids", "action_types", "sides") else (0,), dtype=np.int16)
+            for name, parts in self.chunks.items()
+        }
+
+
+def pack_games(games_data, champ_to_idx, num_champions):
+    """
+    Expands games (see prepare_data) into the packed DraftDataset arrays.
+    """
+    builder = PackedSampleBuilder(champ_to_idx, num_champions)
+    for g_data in games_data:
+        actions = [(a['champion_id'], a['action_type'], a['team_side']) for a in g_data['actions']]
+        builder.add_game(actions, g_data['team_map'])
+    return builder.build()
+
+
+def iter_game_drafts(team_to_idx, chunk_size=2000):
+    """
+    Streams (team_map, actions) per game without instantiating ORM objects.
+    actions are (champion_id, action_type, team_side) tuples in sequence order.
+    DraftAction and Game rows are both read in game order with server-side chunking and
+    merge-joined, so memory stays proportional to chunk_size.
+    """
+    games = Game.objects.order_by('id').values_list(
+        'id', 'team_1__external_id', 'team_1_side', 'team_2__external_id', 'team_2_side'
+    ).iterator(chunk_size=chunk_size)
+    actions = DraftAction.objects.order_by('game_id', 'sequence_number').values_list(
+        'game_id', 'champion_id', 'action_type', 'team_side'
+    ).iterator(chunk_size=chunk_size)
+
+    game_row = next(games, None)
+    current_game_id = None
+    current_actions = []
+
+    def team_map_for(game_id):
+        nonlocal game_row
+        while game_row is not None and game_row[0] < game_id:
+            game_row = next(games, None)
+        team_map = {}
+        if game_row is not None and game_row[0] == game_id:
+            _, team_1, team_1_side, team_2, team_2_side = game_row
+            if team_1 and team_1_side:
+                team_map[team_1_side.lower()] = team_to_idx.get(team_1, 0)
+            if team_2 and team_2_side:
+                team_map[team_2_side.lower()] = team_to_idx.get(team_2, 0)
+        return team_map
+
+    for game_id, champion_id, action_type, team_side in actions:
+        if game_id != current_game_id:
+            if current_actions:
+                yield team_map_for(current_game_id), current_actions
+            current_game_id = game_id
+            current_actions = []
+        current_actions.append((champion_id, action_type, team_side))
+
+    if current_actions:
+        yield team_map_for(current_game_id), current_actions
+
+
+def dataset_fingerprint():
+    """
+    Cheap fingerprint of the training data and mappings, used to key the packed dataset cache.
+    """
+    from django.db.models import Count, Max
+    actions = DraftAction.objects.aggregate(count=Count('id'), max_id=Max('id'))
+    games = Game.objects.aggregate(count=Count('id'), max_id=Max('id'))
+    # Summaries are re-synced whenever a game's actions, sides or result change (see draft.signals),
+    # so their latest update also catches edits and deletions that leave the counts and ids alike
+    summaries = GameDraftSummary.objects.aggregate(count=Count('game_id'), updated_at=Max('updated_at'))
+    digest = hashlib.sha1()
+    digest.update(json.dumps([
+        DATASET_FORMAT_VERSION, actions, games, summaries,
+        list(Champion.objects.order_by('id').values_list('id', flat=True)),
+        list(Team.objects.order_by('id').values_list('external_id', flat=True)),
+    ], default=str).encode())
+    return digest.hexdigest()[:16]
+
+def dataset_cache_path():
+    """Packed dataset cache file for the current training data."""
+    return os.path.join(DATASET_CACHE_DIR, f"draft_dataset_{dataset_fingerprint()}.npz")
+
+def prune_dataset_cache(keep_path):
+    """Deletes the cached datasets of every other fingerprint; they can never be hit again."""
+    for path in glob.glob(os.path.join(DATASET_CACHE_DIR, "draft_dataset_*.npz")):
+        if os.path.abspath(path) != os.path.abspath(keep_path):
+            os.remove(path)
+
 def prepare_data():
-    from django.db.models import Prefetch
     champ_to_idx, _, _ = get_champion_mapping()
     team_to_idx = get_team_mapping()
-    
-    games_data = []
-    # Optimize queries with select_related and prefetch_related
-    draft_actions_prefetch = Prefetch(
-        'draft_actions', 
-        queryset=DraftAction.objects.all().order_by('sequence_number')
-    )
-    games = Game.objects.all().select_related('team_1', 'team_2').prefetch_related(draft_actions_prefetch)
-    
     num_champs = len(champ_to_idx)
-    
-    for game in games:
-        actions = list(game.draft_actions.all())
-        if not actions:
-            continue
-            
-        team_map = {}
-        if game.team_1 and game.team_1_side:
-            team_map[game.team_1_side.lower()] = team_to_idx.get(game.team_1.external_id, 0)
-        if game.team_2 and game.team_2_side:
-            team_map[game.team_2_side.lower()] = team_to_idx.get(game.team_2.external_id, 0)
 
-        # Store minimal game data
-        games_data.append({
+    games_data = [
+        {
             "team_map": team_map,
-            "actions": [{"champion_id": a.champion_id, "action_type": a.action_type, "team_side": a.team_side} for a in actions]
-        })
-            
+            "actions": [
+                {"champion_id": champion_id, "action_type": action_type, "team_side": team_side}
+                for champion_id, action_type, team_side in actions
+            ]
+        }
+        for team_map, actions in iter_game_drafts(team_to_idx)
+    ]
     return games_data, champ_to_idx, team_to_idx, num_champs
 
 DRAFT_PHASES = [
@@ -1,40 +1,45 @@
 ﻿import numpy as np
 import json
 from pathlib import Path
+from .pair_stats import PairStatsTables
+from .registry import current_dir
 
 class DraftFeatureExtractor:
     def __init__(self):
-        self.artifacts_dir = Path("draft/ml_artifacts")
+        self.artifacts_dir = Path(current_dir())
         self.synergy_counter = self._load_json("synergy_counter.json")
         self.player_pools = self._load_json("player_pools.json")
+
+        # Champion names/ids -> model index, for the dense pair tables
+        mappings = self._load_json("draft_mappings.json")
+        num_champions = mappings.get("num_champions", 0)
+        names = [mappings.get("idx_to_name", {}).get(str(i)) for i in range(num_champions)]
+        self.champ_index = {name: i for i, name in enumerate(names) if name}
+        self.champ_index.update(mappings.get("champ_to_idx", {}))
+        self.pair_stats = PairStatsTables.load(str(self.artifacts_dir), names)
         
     def _load_json(self, filename):
         path = self.artifacts_dir / filename
         if path.exists():
-            with open(path, "r") as f:
+            with open(path, "r", encoding="utf-8-sig") as f:
                 return json.load(f)
         return {}
 
+    def _indices(self, champs):
+        return np.array([self.champ_index[str(c)] for c in champs if str(c) in self.champ_index], dtype=np.int64)
+
     def get_synergy_score(self, champs):
         """champs: list of champion names/ids (strings)"""
-        score = 0
-        count = 0
-        for i in range(len(champs)):
-            for j in range(i + 1, len(champs)):
-                pair = "|".join(sorted([str(champs[i]), str(champs[j])]))
-                score += self.synergy_counter.get("synergy", {}).get(pair, 0)
-                count += 1
-        return score / max(1, count)
+        count = len(champs) * (len(champs) - 1) // 2
+        idx = self._indices(champs)
+        pair_scores = np.asarray(self.pair_stats.synergy[np.ix_(idx, idx)])
+        score = np.triu(pair_scores, k=1).sum()
+        return float(score) / max(1, count)
 
     def get_counter_score(self, blue_champs, red_champs):
-        score = 0
-        count = 0
-        for bc in blue_champs:
-            for rc in red_champs:
-                pair = f"{bc}|{rc}"
-                score += self.synergy_counter.get("counter", {}).get(pair, 0)
-                count += 1
-        return score / max(1, count)
+        count = len(blue_champs) * len(red_champs)
+        score = np.asarray(self.pair_stats.counter[np.ix_(self._indices(blue_champs), self._indices(red_champs))]).sum()
+        return float(score) / max(1, count)
 
     def get_player_wr(self, player_name, champ_name):
         key = f"{player_name}|{champ_name}"
@@ -0,0 +1,285 @@
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+INFERENCE_BACKENDS = ("eager", "torchscript", "onnx")
+MODEL_VARIANTS = ("fp32", "int8")
+TORCHSCRIPT_FILE = "draft_model.ts"
+ONNX_FILE = "draft_model.onnx"
+QUANTIZED_FILE = "draft_model_int8.pth"
+INPUT_NAMES = ["champ_ids", "action_types", "sides", "positions", "team_idx", "opp_team_idx"]
+
+
+def example_inputs(num_champions, num_teams, batch_size=1, filled=10, seed=0):
+    """
+    Random draft states in the model input layout, with the first `filled` slots set
+    (alternating sides, bans first). Used for export, parity checks and benchmarks.
+    """
+    generator = torch.Generator().manual_seed(seed)
+    champ_ids = torch.full((batch_size, 20), num_champions, dtype=torch.long)
+    action_types = torch.zeros((batch_size, 20), dtype=torch.long)
+    sides = torch.zeros((batch_size, 20), dtype=torch.long)
+    for i in range(filled):
+        champ_ids[:, i] = torch.randint(0, num_champions, (batch_size,), generator=generator)
+        action_types[:, i] = 1 if i < 6 else 2
+        sides[:, i] = 1 + i % 2
+    positions = torch.arange(20).repeat(batch_size, 1)
+    team_idx = torch.randint(0, num_teams, (batch_size,), generator=generator)
+    opp_team_idx = torch.randint(0, num_teams, (batch_size,), generator=generator)
+    return champ_ids, action_types, sides, positions, team_idx, opp_team_idx
+
+
+class TorchScriptBackend:
+    """
+    Runs a scripted and frozen DraftTransformerModel (see export_torchscript).
+    Callable like the eager model.
+    """
+    name = "torchscript"
+
+    def __init__(self, path, num_champions):
+        self.module = torch.jit.load(path, map_location="cpu")
+        self.module.eval()
+        self.num_champions = num_champions
+
+    def eval(self):
+        return self
+
+    def __call__(self, champ_ids, action_types, sides, positions, team_idx, opp_team_idx=None):
+        return self.module(champ_ids, action_types, sides, positions, team_idx, opp_team_idx)
+
+
+class OnnxBackend:
+    """
+    Runs the ONNX export of DraftTransformerModel on CPU with onnxruntime.
+    Callable like the eager model; returns a torch tensor.
+    """
+    name = "onnx"
+
+    def __init__(self, path, num_champions):
+        import onnxruntime
+
+        self.session = onnxruntime.InferenceSession(path, providers=["CPUExecutionProvider"])
+        self.num_champions = num_champions
+
+    def eval(self):
+        return self
+
+    def __call__(self, champ_ids, action_types, sides, positions, team_idx, opp_team_idx=None):
+        if opp_team_idx is None:
+            opp_team_idx = torch.zeros_like(team_idx)
+        inputs = (champ_ids, action_types, sides, positions, team_idx, opp_team_idx)
+        feeds = {name: np.ascontiguousarray(t.numpy()) for name, t in zip(INPUT_NAMES, inputs)}
+        logits, = self.session.run(None, feeds)
+        return torch.from_numpy(logits)
+
+
+@contextmanager
+def fastpath_disabled():
+    """
+    Turns off the fused nn.TransformerEncoder fast path, which has no ONNX equivalent and
+    reads Linear weights that dynamic quantized layers do not expose.
+    """
+    enabled = torch.backends.mha.get_fastpath_enabled()
+    torch.backends.mha.set_fastpath_enabled(False)
+    try:
+        yield
+    finally:
+        torch.backends.mha.set_fastpath_enabled(enabled)
+
+
+def quantize_int8(model, inplace=False):
+    """
+    Dynamic int8 quantization of the Linear layers (input projection, encoder feed-forward
+    layers and output head); activations stay fp32 and are quantized on the fly.
+    The attention projections are left in fp32 by PyTorch. The result must run with
+    fastpath_disabled().
+    """
+    return torch.ao.quantization.quantize_dynamic(model.eval(), {nn.Linear}, dtype=torch.qint8, inplace=inplace)
+
+
+def save_quantized(model, path):
+    tmp_path = f"{path}.tmp"
+    torch.save(model.state_dict(), tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_variant(model, variant, weights_path):
+    """
+    Returns the fp32 model as is, or for "int8" the quantized variant saved next to
+    weights_path by quantize_draft_model. Falls back to fp32 when that file is missing
+    or older than the weights. Loading the int8 variant disables the transformer fast path
+    for the whole process (see fastpath_disabled).
+    """
+    if variant not in MODEL_VARIANTS:
+        raise ValueError(f"Unknown model variant {variant!r}, expected one of {MODEL_VARIANTS}")
+    path = os.path.join(os.path.dirname(weights_path), QUANTIZED_FILE)
+    if variant == "fp32" or not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(weights_path):
+        return model
+    quantized = quantize_int8(model, inplace=True)
+    quantized.load_state_dict(torch.load(path, map_location="cpu"))
+    torch.backends.mha.set_fastpath_enabled(False)
+    return quantized
+
+
+class _PendingCall:
+    def __init__(self, inputs):
+        self.inputs = inputs
+        self.rows = len(inputs[0])
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class MicroBatcher:
+    """
+    Runs model calls from concurrent request threads as shared batches: a background thread
+    takes the queued calls (up to max_batch_size rows, waiting at most max_wait seconds for
+    more), concatenates their inputs, runs the model once and hands each caller its rows.
+    Callable like the eager model.
+
+    The wait only applies while calls actually arrive concurrently (the previous batch held
+    several), so a lone request is not slowed down. The thread is started lazily in the process
+    that makes the first call; calls made inside direct() (warming up before a fork) skip it.
+    """
+    name = "microbatch"
+
+    def __init__(self, model, max_batch_size=64, max_wait=0.002):
+        self.model = model
+        self.num_champions = model.num_champions
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue = None
+        self._worker_pid = None
+        self._start_lock = threading.Lock()
+        self._direct = threading.local()
+
+    def eval(self):
+        return self
+
+    def __call__(self, champ_ids, action_types, sides, positions, team_idx, opp_team_idx=None):
+        if opp_team_idx is None:
+            opp_team_idx = torch.zeros_like(team_idx)
+        if getattr(self._direct, "active", False):
+            return self.model(champ_ids, action_types, sides, positions, team_idx, opp_team_idx)
+        call = _PendingCall((champ_ids, action_types, sides, positions, team_idx, opp_team_idx))
+        self._ensure_worker().put(call)
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    @contextmanager
+    def direct(self):
+        """Calls from the current thread run the model directly, without the batching thread."""
+        self._direct.active = True
+        try:
+            yield self.model
+        finally:
+            self._direct.active = False
+
+    def _ensure_worker(self):
+        pid = os.getpid()
+        if self._worker_pid != pid:
+            with self._start_lock:
+                if self._worker_pid != pid:
+                    self._queue = queue.Queue()
+                    threading.Thread(target=self._run, args=(self._queue,), name="draft-microbatch", daemon=True).start()
+                    self._worker_pid = pid
+        return self._queue
+
+    def _run(self, calls):
+        carry = None
+        concurrent = False
+        while True:
+            batch = [carry or calls.get()]
+            carry = None
+            rows = batch[0].rows
+            deadline = time.monotonic() + (self.max_wait if concurrent else 0)
+            while rows < self.max_batch_size:
+                try:
+                    call = calls.get(timeout=max(deadline - time.monotonic(), 0)) if concurrent else calls.get_nowait()
+                except queue.Empty:
+                    break
+                if rows + call.rows > self.max_batch_size:
+                    carry = call
+                    break
+                batch.append(call)
+                rows += call.rows
+            concurrent = len(batch) > 1 or carry is not None
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        try:
+            with torch.no_grad():
+                if len(batch) == 1:
+                    batch[0].result = self.model(*batch[0].inputs)
+                else:
+                    inputs = [torch.cat(parts) for parts in zip(*(call.inputs for call in batch))]
+                    logits = self.model(*inputs)
+                    for call, rows in zip(batch, logits.split([call.rows for call in batch])):
+                        call.result = rows
+        except Exception as e:
+            for call in batch:
+                call.error = e
+        finally:
+            for call in batch:
+                call.done.set()
+
+
+def export_torchscript(model, path):
+    """Scripts and freezes the model (which must be in eval mode) and saves it to path."""
+    scripted = torch.jit.freeze(torch.jit.script(model.eval()))
+    tmp_path = f"{path}.tmp"
+    torch.jit.save(scripted, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def export_onnx(model, path, num_teams, opset=17):
+    """Traces the model to ONNX with a dynamic batch dimension."""
+    tmp_path = f"{path}.tmp"
+    with fastpath_disabled(), torch.no_grad():
+        torch.onnx.export(
+            model.eval(),
+            example_inputs(model.num_champions, num_teams, batch_size=2),
+            tmp_path,
+            input_names=INPUT_NAMES,
+            output_names=["logits"],
+            dynamic_axes={name: {0: "batch"} for name in INPUT_NAMES + ["logits"]},
+            opset_version=opset,
+            dynamo=False,
+        )
+    os.replace(tmp_path, path)
+
+
+def exported_path(backend, artifacts_dir):
+    return os.path.join(artifacts_dir, TORCHSCRIPT_FILE if backend == "torchscript" else ONNX_FILE)
+
+
+def load_backend(model, backend, weights_path):
+    """
+    Returns the model to run inference with: the eager model itself, or a wrapper around its
+    exported artifact (next to weights_path) with the same call signature, num_champions and eval().
+
+    Falls back to the eager model when the export is missing or older than the weights, so a
+    retrained model is never served through a stale export, and when onnxruntime is not installed.
+    """
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown inference backend {backend!r}, expected one of {INFERENCE_BACKENDS}")
+    if backend == "eager":
+        return model
+
+    path = exported_path(backend, os.path.dirname(weights_path))
+    if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(weights_path):
+        return model
+    if backend == "torchscript":
+        return TorchScriptBackend(path, model.num_champions)
+    try:
+        return OnnxBackend(path, model.num_champions)
+    except ImportError:
+        return model
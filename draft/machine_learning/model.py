@@ -1,6 +1,7 @@
 ﻿import torch
 import torch.nn as nn
 import torch.nn.functional as F
+from typing import Optional
 
 class DraftTransformerModel(nn.Module):
     def __init__(self, num_champions=171, num_teams=200, dropout=0.1):
@@ -34,7 +35,7 @@ class DraftTransformerModel(nn.Module):
             nn.Linear(256, num_champions)
         )
 
-    def forward(self, champ_ids, action_types, sides, positions, team_idx, opp_team_idx=None):
+    def forward(self, champ_ids, action_types, sides, positions, team_idx, opp_team_idx: Optional[torch.Tensor] = None):
         """
         champ_ids: (batch, 20) - indices 0..170, 171 for PAD
         action_types: (batch, 20) - 0: PAD, 1: BAN, 2: PICK
@@ -59,10 +60,11 @@ class DraftTransformerModel(nn.Module):
         # Using the PAD index of champion_embedding
         src_key_padding_mask = (champ_ids == self.num_champions)
         
-        # All-masked sequences cause RuntimeError in some PyTorch versions
+        # All-masked sequences cause RuntimeError in some PyTorch versions, so their first
+        # slot is unmasked. Written without data-dependent branches so the model can be
+        # traced/scripted for export (see draft.machine_learning.inference).
         all_masked = src_key_padding_mask.all(dim=1)
-        if all_masked.any():
-            src_key_padding_mask[all_masked, 0] = False
+        src_key_padding_mask[:, 0] = src_key_padding_mask[:, 0] & ~all_masked
         
         # Transformer Encoder
         x = self.transformer_encoder(x, src_key_padding_mask=src_key_padding_mask) # (batch, 20, 128)
@@ -0,0 +1,146 @@
+import json
+import os
+import numpy as np
+
+SYNERGY_MATRIX_FILE = "synergy_matrix.npy"
+COUNTER_MATRIX_FILE = "counter_matrix.npy"
+PAIR_STATS_META_FILE = "pair_stats_meta.json"
+LEGACY_PAIR_STATS_FILE = "synergy_counter.json"
+
+
+def decay_weights(start_times, now, half_life_days):
+    """
+    Per-game weights 0.5 ** (age_days / half_life_days).
+    Games without a start time, or all games when half_life_days is 0, get weight 1.
+    """
+    weights = np.ones(len(start_times), dtype=np.float64)
+    if not half_life_days:
+        return weights
+    ts = np.array([t.timestamp() if t else np.nan for t in start_times], dtype=np.float64)
+    age_days = np.clip((now.timestamp() - ts) / 86400.0, 0, None)
+    known = ~np.isnan(age_days)
+    weights[known] = 0.5 ** (age_days[known] / half_life_days)
+    return weights
+
+
+def winner_flags(winning_team_ids, team_1_ids, team_2_ids):
+    """(G, 2) bool array: did team_1 / team_2 win the game."""
+    winner = np.array([w if w is not None else -1 for w in winning_team_ids])
+    t1 = np.array([t if t is not None else -2 for t in team_1_ids])
+    t2 = np.array([t if t is not None else -2 for t in team_2_ids])
+    return np.stack([winner == t1, winner == t2], axis=1)
+
+
+class PairStatsTables:
+    """
+    Dense champion-pair tables indexed by model champion index.
+
+    synergy[a, b]: how well a and b perform on the same team (symmetric)
+    counter[a, b]: how well a performs against b
+
+    Both are float32 (num_champions, num_champions) arrays, saved as .npy so that
+    load() can memory-map them instead of parsing string-keyed JSON.
+    """
+
+    def __init__(self, synergy, counter):
+        self.synergy = synergy
+        self.counter = counter
+
+    @classmethod
+    def empty(cls, num_champions):
+        shape = (num_champions, num_champions)
+        return cls(np.zeros(shape, dtype=np.float32), np.zeros(shape, dtype=np.float32))
+
+    @classmethod
+    def from_json(cls, data, names):
+        """
+        Builds the tables from the legacy {"synergy": {"A|B": x}, "counter": {...}} format.
+        names: champion names ordered by model index.
+        """
+        name_to_idx = {name: i for i, name in enumerate(names) if name}
+        tables = cls.empty(len(names))
+        for matrix, key in ((tables.synergy, "synergy"), (tables.counter, "counter")):
+            for pair, score in data.get(key, {}).items():
+                a, _, b = pair.partition("|")
+                if a in name_to_idx and b in name_to_idx:
+                    matrix[name_to_idx[a], name_to_idx[b]] = score
+        # Synergy lookups accept either order, preferring the key as written
+        tables.synergy = np.where(tables.synergy != 0, tables.synergy, tables.synergy.T).astype(np.float32)
+        return tables
+
+    @classmethod
+    def load(cls, artifacts_dir, names):
+        """
+        Memory-maps the .npy tables from artifacts_dir, falling back to the legacy JSON file.
+        names: champion names ordered by model index; tables saved under a different
+        champion order are remapped by name.
+        """
+        synergy_path = os.path.join(artifacts_dir, SYNERGY_MATRIX_FILE)
+        counter_path = os.path.join(artifacts_dir, COUNTER_MATRIX_FILE)
+        meta_path = os.path.join(artifacts_dir, PAIR_STATS_META_FILE)
+
+        if os.path.exists(synergy_path) and os.path.exists(counter_path) and os.path.exists(meta_path):
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                saved_names = json.load(f).get("champions", [])
+            synergy = np.load(synergy_path, mmap_mode="r")
+            counter = np.load(counter_path, mmap_mode="r")
+            if list(saved_names) == list(names):
+                return cls(synergy, counter)
+            return cls(synergy, counter).remap(saved_names, names)
+
+        legacy_path = os.path.join(artifacts_dir, LEGACY_PAIR_STATS_FILE)
+        if os.path.exists(legacy_path):
+            try:
+                with open(legacy_path, 'r', encoding='utf-8-sig') as f:
+                    return cls.from_json(json.load(f), names)
+            except (OSError, ValueError):
+                pass
+        return cls.empty(len(names))
+
+    def remap(self, saved_names, names):
+        """
+        Returns tables re-indexed from saved_names order to names order.
+        Champions missing from the saved tables get zero scores.
+        """
+        saved_idx = {name: i for i, name in enumerate(saved_names)}
+        src = np.array([saved_idx.get(name, -1) for name in names], dtype=np.int64)
+        known = src >= 0
+        remapped = []
+        for matrix in (self.synergy, self.counter):
+            out = np.zeros((len(names), len(names)), dtype=np.float32)
+            out[np.ix_(known, known)] = matrix[np.ix_(src[known], src[known])]
+            remapped.append(out)
+        return PairStatsTables(*remapped)
+
+    def save(self, artifacts_dir, names):
+        os.makedirs(artifacts_dir, exist_ok=True)
+        np.save(os.path.join(artifacts_dir, SYNERGY_MATRIX_FILE), np.ascontiguousarray(self.synergy, dtype=np.float32))
+        np.save(os.path.join(artifacts_dir, COUNTER_MATRIX_FILE), np.ascontiguousarray(self.counter, dtype=np.float32))
+        with open(os.path.join(artifacts_dir, PAIR_STATS_META_FILE), 'w', encoding='utf-8') as f:
+            json.dump({"champions": list(names)}, f)
+
+    def best_synergy_partner(self, candidates, targets):
+        """
+        For each candidate index, the target index with the highest positive synergy.
+        Returns (scores, partners): scores is 0 and partner -1 where no target scores above 0.
+        """
+        return self._best_match(self.synergy, candidates, targets)
+
+    def best_counter_target(self, candidates, targets):
+        """
+        For each candidate index, the target index it counters best (see best_synergy_partner).
+        """
+        return self._best_match(self.counter, candidates, targets)
+
+    @staticmethod
+    def _best_match(matrix, candidates, targets):
+        candidates = np.asarray(candidates, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        if candidates.size == 0 or targets.size == 0:
+            return np.zeros(candidates.size, dtype=np.float32), np.full(candidates.size, -1, dtype=np.int64)
+
+        scores = np.asarray(matrix[np.ix_(candidates, targets)])
+        best = scores.argmax(axis=1)
+        best_scores = scores[np.arange(candidates.size), best]
+        positive = best_scores > 0
+        return np.where(positive, best_scores, 0).astype(np.float32), np.where(positive, targets[best], -1)
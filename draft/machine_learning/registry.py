@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+
+from .inference import ONNX_FILE, QUANTIZED_FILE, TORCHSCRIPT_FILE
+from .pair_stats import COUNTER_MATRIX_FILE, LEGACY_PAIR_STATS_FILE, PAIR_STATS_META_FILE, SYNERGY_MATRIX_FILE
+
+ARTIFACTS_DIR = os.path.join("draft", "ml_artifacts")
+VERSIONS_DIR = os.path.join(ARTIFACTS_DIR, "versions")
+CURRENT_FILE = os.path.join(ARTIFACTS_DIR, "CURRENT")
+METADATA_FILE = "metadata.json"
+
+MODEL_FILE = "draft_model.pth"
+MAPPINGS_FILE = "draft_mappings.json"
+ROLES_FILE = "champ_roles.json"
+PLAYER_POOLS_FILE = "player_pools.json"
+
+# Files that belong to a version. A new version takes over the ones it does not write from
+# the version it replaces; the exports and the int8 variant only while the weights are unchanged.
+# The opening book (see build_opening_book) is never taken over, it belongs to the version it was built from.
+VERSIONED_FILES = (
+    MODEL_FILE, MAPPINGS_FILE, ROLES_FILE, PLAYER_POOLS_FILE,
+    SYNERGY_MATRIX_FILE, COUNTER_MATRIX_FILE, PAIR_STATS_META_FILE, LEGACY_PAIR_STATS_FILE,
+    TORCHSCRIPT_FILE, ONNX_FILE, QUANTIZED_FILE,
+)
+DERIVED_FROM_WEIGHTS = (TORCHSCRIPT_FILE, ONNX_FILE, QUANTIZED_FILE)
+# Files maintained in the repository's flat layout; every new version copies them fresh from there.
+SOURCE_FILES = (ROLES_FILE,)
+
+
+def current_version():
+    """Name of the published version, or None while the artifacts still use the flat layout."""
+    try:
+        with open(CURRENT_FILE, 'r', encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def version_dir(version):
+    return os.path.join(VERSIONS_DIR, version) if version else ARTIFACTS_DIR
+
+
+def current_dir():
+    """Directory holding the artifacts of the current version."""
+    return version_dir(current_version())
+
+
+def list_versions():
+    if not os.path.isdir(VERSIONS_DIR):
+        return []
+    return sorted(name for name in os.listdir(VERSIONS_DIR) if not name.startswith("."))
+
+
+def read_metadata(version):
+    with open(os.path.join(version_dir(version), METADATA_FILE), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def verify(directory):
+    """
+    Returns the files of a version directory that are missing or whose checksum differs from
+    its metadata. The flat layout has no metadata and nothing to verify.
+    """
+    metadata_path = os.path.join(directory, METADATA_FILE)
+    if not os.path.exists(metadata_path):
+        return []
+    with open(metadata_path, 'r', encoding='utf-8') as f:
+        files = json.load(f)["files"]
+    return [
+        name for name, info in files.items()
+        if not os.path.exists(os.path.join(directory, name))
+        or file_checksum(os.path.join(directory, name)) != info["sha256"]
+    ]
+
+
+def publish(write, note=""):
+    """
+    Publishes a new artifact version and makes it current.
+
+    write(directory) writes the new or changed files into a staging directory; every other
+    file of VERSIONED_FILES is taken over (hard-linked) from the current version, except
+    SOURCE_FILES, which are copied from the flat layout. Files of the flat layout are always
+    copied, since they can be edited in place and a link would change a published version. The staging
+    directory is renamed into versions/ with its metadata and checksums, then CURRENT is
+    replaced, so servers see either the old or the new version but never a partial one.
+    Returns the new version name.
+    """
+    parent = current_version()
+    parent_dir = version_dir(parent)
+    version = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S-%f")
+    staging = os.path.join(VERSIONS_DIR, f".{version}.tmp")
+    os.makedirs(staging)
+    try:
+        write(staging)
+        weights_changed = any(os.path.exists(os.path.join(staging, name)) for name in (MODEL_FILE, MAPPINGS_FILE))
+        for name in VERSIONED_FILES:
+            source_dir = parent_dir
+            if name in SOURCE_FILES and os.path.exists(os.path.join(ARTIFACTS_DIR, name)):
+                source_dir = ARTIFACTS_DIR
+            source = os.path.join(source_dir, name)
+            target = os.path.join(staging, name)
+            if os.path.exists(target) or not os.path.exists(source):
+                continue
+            if weights_changed and name in DERIVED_FROM_WEIGHTS:
+                continue
+            if source_dir == ARTIFACTS_DIR:
+                shutil.copy2(source, target)
+                continue
+            try:
+                os.link(source, target)
+            except OSError:
+                shutil.copy2(source, target)
+
+        files = {}
+        for name in sorted(os.listdir(staging)):
+            path = os.path.join(staging, name)
+            files[name] = {"sha256": file_checksum(path), "size": os.path.getsize(path)}
+        with open(os.path.join(staging, METADATA_FILE), 'w', encoding='utf-8') as f:
+            json.dump({
+                "version": version,
+                "parent": parent,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "note": note,
+                "files": files,
+            }, f, indent=2)
+        os.rename(staging, version_dir(version))
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    activate(version)
+    return version
+
+
+def activate(version):
+    """Points CURRENT at an existing version, e.g. to roll back."""
+    if not version or not os.path.isdir(version_dir(version)):
+        raise ValueError(f"Unknown artifact version {version!r}")
+    tmp_path = f"{CURRENT_FILE}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(version)
+    os.replace(tmp_path, CURRENT_FILE)
+
+
+def prune(keep):
+    """Deletes all but the current and the newest `keep` other versions. Returns the deleted names."""
+    current = current_version()
+    versions = [v for v in list_versions() if v != current]
+    deleted = versions[:max(len(versions) - keep, 0)]
+    for version in deleted:
+        shutil.rmtree(version_dir(version))
+    return deleted
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from draft.machine_learning import registry
+
+
+class Command(BaseCommand):
+    help = "List, verify, activate (roll back to) or prune the published model artifact versions"
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=["list", "verify", "activate", "prune"])
+        parser.add_argument("version", nargs="?", help="Version for verify/activate (verify defaults to the current one)")
+        parser.add_argument("--keep", type=int, default=5, help="Versions kept by prune, besides the current one")
+
+    def handle(self, *args, **options):
+        action = options["action"]
+        current = registry.current_version()
+
+        if action == "list":
+            for version in registry.list_versions():
+                metadata = registry.read_metadata(version)
+                marker = "*" if version == current else " "
+                self.stdout.write(
+                    f"{marker} {version}  {len(metadata['files'])} files  parent {metadata['parent'] or '-'}  {metadata['note']}"
+                )
+            if current is None:
+                self.stdout.write("No published version, serving the flat ml_artifacts layout")
+
+        elif action == "verify":
+            version = options["version"] or current
+            if version is None:
+                raise CommandError("No published version to verify")
+            corrupted = registry.verify(registry.version_dir(version))
+            if corrupted:
+                raise CommandError(f"{version}: checksum mismatch for {', '.join(corrupted)}")
+            self.stdout.write(self.style.SUCCESS(f"{version}: all files match their checksums"))
+
+        elif action == "activate":
+            if not options["version"]:
+                raise CommandError("activate needs a version")
+            try:
+                registry.activate(options["version"])
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS(f"{options['version']} is now current, servers pick it up on their next check"))
+
+        else:
+            deleted = registry.prune(options["keep"])
+            self.stdout.write(f"Deleted {len(deleted)} versions: {', '.join(deleted) or '-'}")
@@ -0,0 +1,147 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from draft.draft_tables import BAN_COUNTERS, BLUE, PICK_COUNTERS, RED, ActionColumns, aggregate_actions
+
+# Side and action of each of the 20 draft slots (bans 1-6, picks 1-6, bans 7-10, picks 7-10)
+SLOT_SIDES = [BLUE, RED] * 3 + [BLUE, RED, RED, BLUE, BLUE, RED] + [RED, BLUE] * 2 + [RED, BLUE, BLUE, RED]
+SLOT_PICKS = [False] * 6 + [True] * 6 + [False] * 4 + [True] * 4
+
+
+class Command(BaseCommand):
+    help = "Time the columnar pick/ban aggregation of process_draft_tables against the per-action loop on synthetic drafts"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--actions", type=int, default=1_000_000)
+        parser.add_argument("--teams", type=int, default=400)
+        parser.add_argument("--champions", type=int, default=170)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        columns = self.synthetic_columns(options["actions"], options["teams"], options["champions"], options["seed"])
+        self.stdout.write(f"Generated {len(columns)} actions in {len(columns) // 20} games")
+
+        started = time.perf_counter()
+        tables = aggregate_actions(columns)
+        expected = (tables.pick_stats(), tables.ban_stats(), tables.summary_stats())
+        columnar = time.perf_counter() - started
+        self.stdout.write(f"columnar: {columnar:.2f}s")
+
+        rows = self.to_rows(columns)
+        started = time.perf_counter()
+        result = self.aggregate_loop(rows)
+        loop = time.perf_counter() - started
+        self.stdout.write(f"    loop: {loop:.2f}s (rows already in memory, no ORM instances)")
+
+        for name, a, b in zip(("pick", "ban", "summary"), expected, result):
+            if a != b:
+                raise CommandError(f"Columnar and loop {name} stats differ")
+        self.stdout.write(self.style.SUCCESS(f"Identical stats, columnar is {loop / columnar:.1f}x faster"))
+
+    def synthetic_columns(self, num_actions, num_teams, num_champions, seed):
+        rng = np.random.default_rng(seed)
+        num_games = max(num_actions // 20, 1)
+        slots = np.tile(np.arange(20), num_games)
+        game = np.repeat(np.arange(1, num_games + 1), 20)
+        # Team pks 1..num_teams; team_1 always plays blue, a few games have no known winner
+        team_1 = rng.integers(1, num_teams + 1, num_games)
+        team_2 = (team_1 + rng.integers(1, num_teams, num_games) - 1) % num_teams + 1
+        winner = np.where(rng.random(num_games) < 0.5, team_1, team_2)
+        winner[rng.random(num_games) < 0.01] = -1
+        action_side = np.array(SLOT_SIDES)[slots]
+        team = np.where(action_side == BLUE, team_1[game - 1], team_2[game - 1])
+        # Drafters that are not registered teams are skipped
+        team[rng.random(len(team)) < 0.01] = -1
+        return ActionColumns(
+            game_id=game,
+            team=team,
+            champion=rng.integers(0, num_champions, len(game)),
+            is_pick=np.array(SLOT_PICKS)[slots],
+            is_ban=~np.array(SLOT_PICKS)[slots],
+            action_side=action_side,
+            winner=winner[game - 1],
+            team_1=team_1[game - 1],
+            team_1_side=np.full(len(game), BLUE),
+            team_2=team_2[game - 1],
+            team_2_side=np.full(len(game), RED),
+            champion_ids=[f"champion-{c}" for c in range(num_champions)],
+        )
+
+    def to_rows(self, columns):
+        sides = {BLUE: "blue", RED: "red"}
+        none = lambda value: None if value < 0 else value  # noqa: E731
+        return list(zip(
+            columns.game_id.tolist(),
+            [none(t) for t in columns.team.tolist()],
+            [columns.champion_ids[c] for c in columns.champion.tolist()],
+            ["pick" if p else "ban" for p in columns.is_pick.tolist()],
+            [sides.get(s) for s in columns.action_side.tolist()],
+            [none(w) for w in columns.winner.tolist()],
+            columns.team_1.tolist(),
+            [sides.get(s) for s in columns.team_1_side.tolist()],
+            columns.team_2.tolist(),
+            [sides.get(s) for s in columns.team_2_side.tolist()],
+        ))
+
+    def aggregate_loop(self, rows):
+        """The per-action dict updates process_draft_tables did before, over plain row tuples."""
+        pick_accumulator = {}
+        ban_accumulator = {}
+        team_games = {}
+        for game_id, team_id, champion_id, action_type, team_side, winner_id, team_1_id, team_1_side, team_2_id, team_2_side in rows:
+            if team_id is None:
+                continue
+
+            games = team_games.setdefault(team_id, {'total': set(), 'blue': set(), 'red': set()})
+            games['total'].add(game_id)
+            if team_side in ('blue', 'red'):
+                games[team_side].add(game_id)
+
+            is_win = winner_id == team_id
+            if team_1_id == team_id:
+                side, opponent_id = team_1_side, team_2_id
+            elif team_2_id == team_id:
+                side, opponent_id = team_2_side, team_1_id
+            else:
+                continue
+
+            if action_type == "pick":
+                stats = pick_accumulator.setdefault((team_id, champion_id), self.init_stats(team_id, champion_id, PICK_COUNTERS))
+                stats['games_played'] += 1
+                if is_win:
+                    stats['wins'] += 1
+                if side in ('blue', 'red'):
+                    stats[f'{side}_side_games'] += 1
+                    if is_win:
+                        stats[f'{side}_side_wins'] += 1
+            else:
+                s_stats = ban_accumulator.setdefault((team_id, champion_id), self.init_stats(team_id, champion_id, BAN_COUNTERS))
+                s_stats['games_banned'] += 1
+                s_stats['total_self_bans'] += 1
+                if is_win:
+                    s_stats['wins'] += 1
+                if side in ('blue', 'red'):
+                    s_stats[f'{side}_side_self_bans'] += 1
+                    if is_win:
+                        s_stats[f'{side}_side_self_wins'] += 1
+
+                if opponent_id is not None:
+                    o_stats = ban_accumulator.setdefault((opponent_id, champion_id), self.init_stats(opponent_id, champion_id, BAN_COUNTERS))
+                    o_stats['games_banned'] += 1
+                    o_stats['total_opponent_bans'] += 1
+                    opponent_side = 'red' if side == 'blue' else 'blue'
+                    o_stats[f'{opponent_side}_side_opponent_bans'] += 1
+                    if not is_win:
+                        o_stats['wins'] += 1
+                        o_stats[f'{opponent_side}_side_opponent_wins'] += 1
+
+        summaries = {
+            team_id: {'team_id': team_id, 'total_games': len(games['total']), 'blue_games': len(games['blue']), 'red_games': len(games['red'])}
+            for team_id, games in team_games.items()
+        }
+        return pick_accumulator, ban_accumulator, summaries
+
+    def init_stats(self, team_id, champion_id, counters):
+        return {'team_id': team_id, 'champion_id': champion_id, **{counter: 0 for counter in counters}}
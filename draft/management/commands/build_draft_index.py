@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from draft.draft_index import DraftIndex, DRAFT_INDEX_PATH
+
+
+class Command(BaseCommand):
+    help = "Build the champion -> game bitset index used by the similar matches endpoint"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", type=str, default=DRAFT_INDEX_PATH)
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Rebuild from scratch instead of extending the existing snapshot",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        path = options["output"]
+
+        try:
+            index = DraftIndex() if options["full"] else DraftIndex.load(path)
+        except (FileNotFoundError, ValueError):
+            index = DraftIndex()
+
+        added = index.update_from_db()
+        index.save(path)
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {added} new, updated or removed games ({len(index.game_pos)} total, "
+            f"{len(index.champion_ids)} champions) in {time.monotonic() - started:.1f}s -> {path}"
+        ))
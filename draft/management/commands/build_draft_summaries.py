@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from draft.models import DraftAction, GameDraftSummary
+from draft.summaries import save_summaries, summarize_games
+
+
+class Command(BaseCommand):
+    help = "Rebuild GameDraftSummary (one row per game with ordered picks and bans) from DraftAction"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched per database round trip')
+        parser.add_argument('--batch-size', type=int, default=500, help='Summaries written per upsert')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        with transaction.atomic():
+            saved = save_summaries(summarize_games(chunk_size=options["chunk_size"]), batch_size=options["batch_size"])
+            stale, _ = GameDraftSummary.objects.exclude(
+                game_id__in=DraftAction.objects.values("game_id")
+            ).delete()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {saved} game summaries, removed {stale} stale ones in {time.monotonic() - started:.1f}s"
+        ))
@@ -0,0 +1,85 @@
+import os
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from tqdm import tqdm
+
+from draft.api import DraftRecommendationView, current_artifacts
+from draft.machine_learning import registry
+from draft.models import GameDraftSummary
+from draft.opening_book import OPENING_BOOK_FILE, OpeningBook
+
+
+class Command(BaseCommand):
+    help = (
+        "Precompute recommendations for the opening draft states of the most frequent team pairs "
+        "and publish them as a new artifact version"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pairs", type=int, default=200, help="Most frequent team pairs to cover (0 for all)")
+        parser.add_argument("--depth", type=int, default=2, help="Number of opening actions to follow")
+        parser.add_argument("--branching", type=int, default=5, help="Top recommendations followed from each state")
+        parser.add_argument("--batch-size", type=int, default=256, help="States per model forward pass")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        recommender = DraftRecommendationView.get_recommender()
+        if recommender is None:
+            raise CommandError("Model not found")
+        team_to_idx = recommender.mappings["team_to_idx"]
+
+        # Games per pair of model team indices, whichever side each team was on
+        games = Counter()
+        for blue, red, count in (
+            GameDraftSummary.objects.values("blue_drafter_id", "red_drafter_id")
+            .annotate(games=Count("game"))
+            .values_list("blue_drafter_id", "red_drafter_id", "games")
+        ):
+            games[tuple(sorted((team_to_idx.get(blue, 0), team_to_idx.get(red, 0))))] += count
+        top_pairs = games.most_common(options["pairs"] or None)
+        # Both side assignments of every covered pair
+        pairs = {(a, b) for (a, b), _ in top_pairs} | {(b, a) for (a, b), _ in top_pairs}
+        self.stdout.write(
+            f"Building opening book for {len(pairs)} team pairs "
+            f"({sum(count for _, count in top_pairs)} of {sum(games.values())} games)..."
+        )
+
+        book = OpeningBook(max_actions=options["depth"])
+        batch_size = options["batch_size"]
+        level = [(blue_idx, red_idx, {"blue": [], "red": []}, {"blue": [], "red": []}) for blue_idx, red_idx in sorted(pairs)]
+
+        for depth in range(options["depth"] + 1):
+            next_level = []
+            for start in tqdm(range(0, len(level), batch_size), desc=f"{depth} actions"):
+                batch = level[start:start + batch_size]
+                states = [recommender.encode_state(picks, bans) for _, _, picks, bans in batch]
+                p_nows = recommender.batch_probabilities(states, [b for b, *_ in batch], [r for _, r, *_ in batch])
+
+                for (blue_idx, red_idx, picks, bans), state, p_now in zip(batch, states, p_nows):
+                    result = recommender.recommend(state, blue_idx, red_idx, p_now=p_now)
+                    book.add(recommender.state_key(state, blue_idx, red_idx, None), result)
+                    if depth == options["depth"] or state["total_actions"] + 1 >= 20:
+                        continue
+
+                    # Follow the states analysts are most likely to step into next
+                    side = state["side"]
+                    for rec in result["recommendations"][:options["branching"]]:
+                        next_picks = {s: list(ids) for s, ids in picks.items()}
+                        next_bans = {s: list(ids) for s, ids in bans.items()}
+                        (next_picks if state["action_type"] == "pick" else next_bans)[side].append(rec["champion_id"])
+                        next_level.append((blue_idx, red_idx, next_picks, next_bans))
+            level = next_level
+
+        # The book goes into a version with the artifacts it was computed from
+        if current_artifacts()[0] != recommender.version:
+            raise CommandError("Another artifact version was published meanwhile, rerun to build its book")
+        version = registry.publish(
+            lambda directory: book.save(os.path.join(directory, OPENING_BOOK_FILE)),
+            note=f"opening book: {len(pairs)} team pairs, depth {options['depth']}",
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored {len(book)} opening states in {time.monotonic() - started:.1f}s, published as version {version}"
+        ))
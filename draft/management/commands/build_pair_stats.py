@@ -0,0 +1,283 @@
+import json
+import os
+import time
+from itertools import islice
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from draft.machine_learning import registry
+from draft.machine_learning.dataset import get_champion_mapping
+from draft.machine_learning.pair_stats import PairStatsTables, LEGACY_PAIR_STATS_FILE, decay_weights, winner_flags
+from draft.models import DraftAction
+from matches.models import Game
+
+ROLES = ["top", "jungle", "mid", "bot", "support"]
+SIDES = {"blue": 0, "red": 1}
+
+
+def draft_pick_rows():
+    """Pick rows with the result, teams and start time of their game, in draft order."""
+    return (
+        DraftAction.objects.filter(action_type="pick")
+        .order_by("game_id", "sequence_number")
+        .values_list(
+            "game_id", "champion_id", "team_side",
+            "game__winning_team_id", "game__team_1_id", "game__team_1_side",
+            "game__team_2_id", "game__team_2_side", "game__match__start_time",
+        )
+    )
+
+
+class PairAccumulator:
+    """
+    Weighted games/wins counters over champion indices and (champion, champion) pairs,
+    kept as flat float64 arrays and filled with np.bincount.
+    """
+
+    def __init__(self, num_champions):
+        self.n = num_champions
+        self.champ_games = np.zeros(num_champions)
+        self.champ_wins = np.zeros(num_champions)
+        self.pairs = {
+            kind: (np.zeros(num_champions * num_champions), np.zeros(num_champions * num_champions))
+            for kind in ("synergy", "counter", "lane_counter")
+        }
+        self.player_index = {}
+        self.player_games = np.zeros((0, num_champions))
+        self.player_wins = np.zeros((0, num_champions))
+
+    def add_champions(self, champs, won, weights):
+        valid = champs >= 0
+        self.champ_games += np.bincount(champs[valid], weights=weights[valid], minlength=self.n)
+        self.champ_wins += np.bincount(champs[valid], weights=(weights * won)[valid], minlength=self.n)
+
+    def add_pairs(self, kind, a, b, won, weights):
+        """Adds pair (a, b) samples; won is from a's point of view."""
+        valid = (a >= 0) & (b >= 0) & (a != b)
+        flat = a[valid] * self.n + b[valid]
+        games, wins = self.pairs[kind]
+        games += np.bincount(flat, weights=weights[valid], minlength=self.n * self.n)
+        wins += np.bincount(flat, weights=(weights * won)[valid], minlength=self.n * self.n)
+
+    def add_players(self, players, champs, won, weights):
+        codes = np.array([self.player_index.setdefault(p, len(self.player_index)) if p else -1 for p in players])
+        if len(self.player_index) > self.player_games.shape[0]:
+            grow = len(self.player_index) - self.player_games.shape[0]
+            self.player_games = np.vstack([self.player_games, np.zeros((grow, self.n))])
+            self.player_wins = np.vstack([self.player_wins, np.zeros((grow, self.n))])
+        valid = (codes >= 0) & (champs >= 0)
+        flat = codes[valid] * self.n + champs[valid]
+        size = self.player_games.size
+        self.player_games += np.bincount(flat, weights=weights[valid], minlength=size).reshape(self.player_games.shape)
+        self.player_wins += np.bincount(flat, weights=(weights * won)[valid], minlength=size).reshape(self.player_wins.shape)
+
+
+class Command(BaseCommand):
+    help = "Build champion synergy/counter tables and player champion pools from DraftAction and Game history"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--half-life', type=float, default=0, help='Time decay half-life in days (0 disables decay)')
+        parser.add_argument('--min-games', type=float, default=5, help='Minimum (weighted) games for a pair score to be kept')
+        parser.add_argument('--prior-games', type=float, default=10, help='Strength of the smoothing prior, in games')
+        parser.add_argument('--chunk-size', type=int, default=20000, help='Rows fetched per database round trip')
+        parser.add_argument('--output-dir', help='Write the tables here instead of publishing them as a new artifact version')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        champ_to_idx, _, idx_to_name = get_champion_mapping()
+        names = [idx_to_name[i] for i in range(len(idx_to_name))]
+        self.champ_to_idx = champ_to_idx
+        self.name_to_idx = {name: i for i, name in enumerate(names)}
+        self.now = timezone.now()
+        self.half_life = options["half_life"]
+        self.chunk_size = options["chunk_size"]
+
+        acc = PairAccumulator(len(names))
+
+        self.stdout.write("Aggregating draft picks...")
+        games = self.accumulate_draft_picks(acc)
+        self.stdout.write(f"Processed {games} drafted games.")
+
+        self.stdout.write("Aggregating lane matchups and player pools...")
+        games = self.accumulate_lanes_and_players(acc)
+        self.stdout.write(f"Processed {games} games with role data.")
+
+        if options["output_dir"]:
+            output_dir = options["output_dir"]
+            os.makedirs(output_dir, exist_ok=True)
+            self.write_outputs(acc, names, options, output_dir)
+        else:
+            version = registry.publish(lambda version_dir: self.write_outputs(acc, names, options, version_dir), note="build_pair_stats")
+            output_dir = registry.version_dir(version)
+        self.stdout.write(self.style.SUCCESS(f"Pair stats built in {time.monotonic() - started:.1f}s -> {output_dir}"))
+
+    def accumulate_draft_picks(self, acc):
+        rows = draft_pick_rows().iterator(chunk_size=self.chunk_size)
+
+        total_games = 0
+        carry = []
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            # Only process complete games; the last game may continue in the next chunk
+            batch = carry + chunk
+            last_game = batch[-1][0]
+            split = len(batch)
+            while split > 0 and batch[split - 1][0] == last_game:
+                split -= 1
+            batch, carry = batch[:split], batch[split:]
+            total_games += self.process_pick_rows(acc, batch)
+        total_games += self.process_pick_rows(acc, carry)
+        return total_games
+
+    def process_pick_rows(self, acc, rows):
+        if not rows:
+            return 0
+        game_ids = np.array([r[0] for r in rows])
+        champs = np.array([self.champ_to_idx.get(r[1], -1) for r in rows])
+        sides = np.array([SIDES.get((r[2] or "").lower(), -1) for r in rows])
+
+        unique_games, first_row, game_idx = np.unique(game_ids, return_index=True, return_inverse=True)
+        num_games = len(unique_games)
+        game_rows = [rows[i] for i in first_row]
+
+        # Which side won each game, via the winning team's side
+        team_won = winner_flags([r[3] for r in game_rows], [r[4] for r in game_rows], [r[6] for r in game_rows])
+        team_sides = np.array([[SIDES.get((r[5] or "").lower(), -1), SIDES.get((r[7] or "").lower(), -1)] for r in game_rows])
+        side_won = np.zeros((num_games, 2), dtype=bool)
+        for t in range(2):
+            for s in range(2):
+                side_won[:, s] |= team_won[:, t] & (team_sides[:, t] == s)
+        weights = decay_weights([r[8] for r in game_rows], self.now, self.half_life)
+        # Games without a known winning side would count as a loss for both sides
+        decided = side_won.any(axis=1)
+
+        # (G, 2, 5) pick slots per game and side, in pick order
+        valid = sides >= 0
+        team_key = game_idx * 2 + np.where(valid, sides, 0)
+        order = np.lexsort((np.arange(len(rows)), team_key))
+        order = order[valid[order]]
+        sorted_keys = team_key[order]
+        slot = np.arange(len(sorted_keys)) - np.searchsorted(sorted_keys, sorted_keys)
+        keep = slot < 5
+        picks = np.full((num_games * 2, 5), -1)
+        picks[sorted_keys[keep], slot[keep]] = champs[order][keep]
+        picks = picks.reshape(num_games, 2, 5)[decided]
+        side_won = side_won[decided]
+        weights = weights[decided]
+
+        game_weights = np.repeat(weights, 2)
+        team_won_flat = side_won.reshape(-1).astype(np.float64)
+        acc.add_champions(picks.reshape(-1), np.repeat(team_won_flat, 5), np.repeat(game_weights, 5))
+
+        flat_picks = picks.reshape(-1, 5)
+        for i in range(5):
+            for j in range(5):
+                if i != j:
+                    acc.add_pairs("synergy", flat_picks[:, i], flat_picks[:, j], team_won_flat, game_weights)
+                # Blue slot i against red slot j, from both points of view
+                acc.add_pairs("counter", picks[:, 0, i], picks[:, 1, j], side_won[:, 0].astype(np.float64), weights)
+                acc.add_pairs("counter", picks[:, 1, j], picks[:, 0, i], side_won[:, 1].astype(np.float64), weights)
+        return len(picks)
+
+    def accumulate_lanes_and_players(self, acc):
+        champ_fields = [f"team_{t}_{role}_champion" for t in (1, 2) for role in ROLES]
+        player_fields = [f"team_{t}_{role}_player_name" for t in (1, 2) for role in ROLES]
+        rows = (
+            Game.objects.order_by("id")
+            .values_list("winning_team_id", "team_1_id", "team_2_id", "match__start_time", *champ_fields, *player_fields)
+            .iterator(chunk_size=self.chunk_size)
+        )
+
+        total_games = 0
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            champs = np.array([[self.lookup_champion(c) for c in r[4:14]] for r in chunk]).reshape(-1, 2, 5)
+            team_won = winner_flags([r[0] for r in chunk], [r[1] for r in chunk], [r[2] for r in chunk])
+            # Games without a known winner would count as a loss for both teams
+            keep = (champs >= 0).any(axis=(1, 2)) & team_won.any(axis=1)
+            if not keep.any():
+                continue
+            chunk = [r for r, k in zip(chunk, keep) if k]
+            champs = champs[keep]
+            team_won = team_won[keep].astype(np.float64)
+            weights = decay_weights([r[3] for r in chunk], self.now, self.half_life)
+
+            for role in range(5):
+                acc.add_pairs("lane_counter", champs[:, 0, role], champs[:, 1, role], team_won[:, 0], weights)
+                acc.add_pairs("lane_counter", champs[:, 1, role], champs[:, 0, role], team_won[:, 1], weights)
+
+            players = [p for r in chunk for p in r[14:24]]
+            acc.add_players(players, champs.reshape(-1), np.repeat(team_won, 5, axis=1).reshape(-1), np.repeat(weights, 10))
+            total_games += len(chunk)
+        return total_games
+
+    def lookup_champion(self, value):
+        if not value:
+            return -1
+        idx = self.name_to_idx.get(value)
+        return idx if idx is not None else self.champ_to_idx.get(value, -1)
+
+    def write_outputs(self, acc, names, options, output_dir):
+        prior = options["prior_games"]
+        min_games = options["min_games"]
+        n = len(names)
+
+        # Smoothed per-champion win rates, shrunk towards 50%
+        champ_wr = (acc.champ_wins + prior * 0.5) / (acc.champ_games + prior)
+
+        def smoothed_delta(kind, expected):
+            games, wins = (a.reshape(n, n) for a in acc.pairs[kind])
+            score = (wins + prior * expected) / (games + prior) - expected
+            score[games < min_games] = 0
+            np.fill_diagonal(score, 0)
+            return score.astype(np.float32)
+
+        # Synergy: pair win rate above the average of both champions
+        synergy = smoothed_delta("synergy", (champ_wr[:, None] + champ_wr[None, :]) / 2)
+        # Counter: head-to-head win rate above what both champions' overall strength predicts
+        matchup_expectation = 0.5 + (champ_wr[:, None] - champ_wr[None, :]) / 2
+        counter = smoothed_delta("counter", matchup_expectation)
+        lane_counter = smoothed_delta("lane_counter", matchup_expectation)
+
+        PairStatsTables(synergy, counter).save(output_dir, names)
+
+        def pair_dict(matrix, symmetric=False):
+            rows, cols = np.nonzero(matrix)
+            return {
+                f"{names[a]}|{names[b]}": round(float(matrix[a, b]), 4)
+                for a, b in zip(rows, cols)
+                if not symmetric or names[a] <= names[b]
+            }
+
+        with open(os.path.join(output_dir, LEGACY_PAIR_STATS_FILE), "w", encoding="utf-8") as f:
+            json.dump({
+                "synergy": pair_dict(synergy, symmetric=True),
+                "counter": pair_dict(counter),
+                "lane_counter": pair_dict(lane_counter),
+                "champ_avg_wr": {
+                    names[c]: round(float(champ_wr[c]), 4) for c in range(n) if acc.champ_games[c] > 0
+                },
+            }, f)
+
+        player_names = sorted(acc.player_index, key=acc.player_index.get)
+        rows, cols = np.nonzero(acc.player_games)
+        player_pools = {
+            f"{player_names[p]}|{names[c]}": {
+                "wins": round(float(acc.player_wins[p, c]), 3),
+                "games": round(float(acc.player_games[p, c]), 3),
+            }
+            for p, c in zip(rows, cols)
+        }
+        with open(os.path.join(output_dir, registry.PLAYER_POOLS_FILE), "w", encoding="utf-8") as f:
+            json.dump(player_pools, f)
+
+        self.stdout.write(
+            f"Wrote {int((synergy != 0).sum() // 2)} synergy pairs, {int((counter != 0).sum())} counter pairs "
+            f"and {len(player_pools)} player/champion pools"
+        )
@@ -0,0 +1,92 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from draft.api import DraftSimilarMatchesView, TeamListView
+from draft.draft_index import DraftIndex
+from draft.draft_tables import action_rows, game_range_actions
+from draft.management.commands.build_pair_stats import draft_pick_rows
+from draft.models import DraftAction, GameDraftSummary, TeamChampionBanStats, TeamChampionPickStats
+from draft.team_stats import team_champion_stats
+
+# Rowid lookups go through the primary key, the id column of every model here
+USING_INDEX = re.compile(r"USING (?:(?:COVERING )?INDEX (\w+)|INTEGER PRIMARY KEY)")
+PRIMARY_KEY = "PRIMARY KEY"
+
+
+def plan_checks(game_ids):
+    """
+    (name, queryset, table, acceptable leading index columns, whether the rows must come out
+    sorted by the index) for the hot queries of the views and stats commands. The querysets come
+    from the same builders the code runs, with example values for their parameters.
+    """
+    index = DraftIndex()
+    index.synced_until = timezone.now()
+    pick_stats, ban_stats = team_champion_stats(1)
+    return [
+        ("TeamListView: actions per drafter",
+         TeamListView.drafter_counts(),
+         DraftAction._meta.db_table, [("drafter_id",)], False),
+        # prefetch_related adds the game filter to the prefetch queryset
+        ("DraftSimilarMatchesView: picks of the listed games",
+         DraftSimilarMatchesView.game_picks().filter(game_id__in=game_ids),
+         DraftAction._meta.db_table, [("action_type", "game_id")], False),
+        ("build_pair_stats: picks in draft order",
+         draft_pick_rows(),
+         DraftAction._meta.db_table, [("action_type", "game_id")], True),
+        # aggregate_games: the actions between the low and high water marks, found by game or by id
+        ("process_draft_tables: new actions of a game range",
+         action_rows(game_range_actions(min(game_ids), max(game_ids)).filter(id__gt=0, id__lte=1 << 31)),
+         DraftAction._meta.db_table, [("game_id",), ("id",)], True),
+        ("TeamStatsCache: pick stats of a team",
+         pick_stats,
+         TeamChampionPickStats._meta.db_table, [("team_id",)], False),
+        ("TeamStatsCache: ban stats of a team",
+         ban_stats,
+         TeamChampionBanStats._meta.db_table, [("team_id",)], False),
+        ("DraftIndex: summaries updated since the last refresh",
+         index.new_summary_rows(),
+         GameDraftSummary._meta.db_table, [("updated_at",)], True),
+    ]
+
+
+class Command(BaseCommand):
+    help = "Run the hot draft queries under EXPLAIN QUERY PLAN (SQLite) and check that they use the expected indexes"
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError(f"EXPLAIN QUERY PLAN checks need SQLite, the database is {connection.vendor}")
+
+        with connection.cursor() as cursor:
+            index_columns = {PRIMARY_KEY: ("id",)}
+            for table in connection.introspection.table_names(cursor):
+                for name, constraint in connection.introspection.get_constraints(cursor, table).items():
+                    if constraint["index"] or constraint["unique"]:
+                        index_columns[name] = tuple(constraint["columns"])
+
+        game_ids = list(DraftAction.objects.order_by().values_list("game_id", flat=True).distinct()[:20]) or [1]
+        failures = []
+        for name, queryset, table, columns, sorted_by_index in plan_checks(game_ids):
+            plan = queryset.explain()
+            lines = [line for line in plan.splitlines() if re.search(rf"\b{table}\b", line)]
+            indexes = [match.group(1) or PRIMARY_KEY for line in lines for match in [USING_INDEX.search(line)] if match]
+            problems = []
+            if not lines or len(indexes) < len(lines):
+                problems.append(f"scans {table} without an index")
+            elif not any(index_columns.get(index, ())[:len(leading)] == leading for index in indexes for leading in columns):
+                expected = " or ".join(f"({', '.join(leading)})" for leading in columns)
+                problems.append(f"does not use an index on {expected} but {', '.join(indexes)}")
+            if sorted_by_index and "USE TEMP B-TREE" in plan:
+                problems.append("sorts the rows instead of reading them in index order")
+
+            if problems:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f"FAIL {name}: {'; '.join(problems)}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"ok   {name}"))
+            self.stdout.write("       " + plan.replace("\n", "\n       "))
+
+        if failures:
+            raise CommandError(f"{len(failures)} of the query plans do not use their index")
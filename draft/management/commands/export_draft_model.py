@@ -0,0 +1,99 @@
+import json
+import os
+import statistics
+import time
+
+import torch
+from django.core.management.base import BaseCommand, CommandError
+
+from draft.machine_learning import registry
+from draft.machine_learning.inference import (
+    OnnxBackend, TorchScriptBackend, example_inputs, export_onnx, export_torchscript, exported_path,
+)
+from draft.machine_learning.model import DraftTransformerModel
+
+# (batch size, filled slots) combinations compared by --check
+PARITY_CASES = [(1, 0), (1, 1), (1, 6), (1, 13), (1, 19), (8, 0), (8, 10), (64, 15)]
+
+
+class Command(BaseCommand):
+    help = "Export DraftTransformerModel to TorchScript and/or ONNX for the DRAFT_INFERENCE_BACKEND setting"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=["torchscript", "onnx", "all"], default="torchscript")
+        parser.add_argument("--check", action="store_true", help="Compare exported and eager logits")
+        parser.add_argument("--tolerance", type=float, default=1e-4, help="Max absolute logit difference for --check")
+        parser.add_argument("--benchmark", type=int, default=0, help="Time this many batch size 1 calls per backend")
+
+    def handle(self, *args, **options):
+        artifacts_dir = registry.current_dir()
+        model_path = os.path.join(artifacts_dir, registry.MODEL_FILE)
+        mapping_path = os.path.join(artifacts_dir, registry.MAPPINGS_FILE)
+        if not os.path.exists(model_path) or not os.path.exists(mapping_path):
+            raise CommandError("Model not found, run train_draft_model first")
+
+        with open(mapping_path, 'r', encoding='utf-8-sig') as f:
+            mappings = json.load(f)
+        num_champions, num_teams = mappings["num_champions"], mappings["num_teams"]
+        model = DraftTransformerModel(num_champions=num_champions, num_teams=num_teams)
+        model.load_state_dict(torch.load(model_path, map_location="cpu"))
+        model.eval()
+
+        formats = ["torchscript", "onnx"] if options["format"] == "all" else [options["format"]]
+        backends = {}
+
+        # The exports are published with the model as a new artifact version, only once they passed --check
+        def write(version_dir):
+            for fmt in formats:
+                path = exported_path(fmt, version_dir)
+                started = time.monotonic()
+                if fmt == "torchscript":
+                    export_torchscript(model, path)
+                    backends[fmt] = TorchScriptBackend(path, num_champions)
+                else:
+                    try:
+                        export_onnx(model, path, num_teams)
+                    except torch.onnx.OnnxExporterError as e:
+                        raise CommandError(f"ONNX export failed: {e}")
+                    try:
+                        backends[fmt] = OnnxBackend(path, num_champions)
+                    except ImportError:
+                        self.stdout.write(self.style.WARNING("onnxruntime is not installed, skipping ONNX checks"))
+                self.stdout.write(f"Exported {fmt} model in {time.monotonic() - started:.1f}s")
+
+            if options["check"]:
+                self.check_parity(model, backends, num_teams, options["tolerance"])
+
+        version = registry.publish(write, note=f"export_draft_model --format {options['format']}")
+        self.stdout.write(f"Published the export as version {version} -> {registry.version_dir(version)}")
+        if options["benchmark"]:
+            self.benchmark(model, backends, num_teams, options["benchmark"])
+
+    def check_parity(self, model, backends, num_teams, tolerance):
+        for name, backend in backends.items():
+            worst = 0.0
+            with torch.no_grad():
+                for seed, (batch_size, filled) in enumerate(PARITY_CASES):
+                    inputs = example_inputs(model.num_champions, num_teams, batch_size, filled, seed=seed)
+                    diff = (model(*inputs) - backend(*inputs)).abs().max().item()
+                    worst = max(worst, diff)
+            if worst > tolerance:
+                raise CommandError(f"{name} export differs from the eager model by {worst:.2e} (tolerance {tolerance:.0e})")
+            self.stdout.write(self.style.SUCCESS(f"{name} matches the eager model (max abs diff {worst:.2e})"))
+
+    def benchmark(self, model, backends, num_teams, iterations):
+        inputs = example_inputs(model.num_champions, num_teams, batch_size=1, filled=10)
+        for name, backend in [("eager", model), *backends.items()]:
+            timings = []
+            with torch.no_grad():
+                for _ in range(20):
+                    backend(*inputs)
+                for _ in range(iterations):
+                    started = time.perf_counter()
+                    backend(*inputs)
+                    timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            self.stdout.write(
+                f"{name:>12}: mean {statistics.mean(timings):.3f}ms, "
+                f"p50 {timings[len(timings) // 2]:.3f}ms, p95 {timings[int(len(timings) * 0.95)]:.3f}ms"
+            )
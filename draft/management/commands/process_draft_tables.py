@@ -1,159 +1,141 @@
-from django.core.management.base import BaseCommand
-from django.db import transaction
-from tqdm import tqdm
+import time
+from concurrent.futures import ProcessPoolExecutor
 
-from draft.models import DraftAction, TeamChampionPickStats, TeamChampionBanStats, Champion
-from matches.models import Team, Game
+import django
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.db.models import Max
 
-BLUE_SIDE = 'blue'
-RED_SIDE = 'red'
+from draft.draft_tables import (
+    BAN_COUNTERS, GAME_FIELDS, PICK_COUNTERS, SUMMARY_COUNTERS, PickBanTables, aggregate_games, changed_games, recount_games,
+)
+from draft.models import (
+    DraftAction, DraftStatsGame, DraftStatsWatermark, TeamChampionPickStats, TeamChampionBanStats, TeamDraftSummary,
+)
+from matches.models import Team
 
 
 class Command(BaseCommand):
     help = "Aggregate pick and ban statistics from DraftAction with bulk insert and low memory usage"
 
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Rebuild all stats from every DraftAction instead of adding the actions since the last run')
+        parser.add_argument('--chunk-size', type=int, default=20000, help='Rows fetched per database round trip')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Worker processes; the games are split into game id ranges aggregated in parallel')
+
     def handle(self, *args, **options):
+        started = time.monotonic()
         self.stdout.write("Starting draft stats aggregation...")
 
-        # Clear existing stats
-        TeamChampionPickStats.objects.all().delete()
-        TeamChampionBanStats.objects.all().delete()
-
-        # Cache teams by external_id for fast lookup
-        teams_cache = {t.external_id: t for t in Team.objects.all()}
-        # Also cache teams by ID for lookup when we have team_1_id/team_2_id
-        teams_by_id = {t.id: t for t in teams_cache.values()}
-
-        pick_accumulator = {}
-        ban_accumulator = {}
-
-        actions_queryset = DraftAction.objects.select_related("game", "champion").iterator()
-        total_actions = DraftAction.objects.count()
-
-        self.stdout.write(f"Processing {total_actions} draft actions...")
-
-        for action in tqdm(actions_queryset, total=total_actions, desc="Aggregating stats"):
-            game = action.game
-            champion = action.champion
-
-            if not game or not champion:
-                continue
+        watermark = DraftStatsWatermark.objects.filter(pk=1).first()
+        # Actions written while this run aggregates are left for the next one
+        high_water_mark = DraftAction.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+        # Without a watermark the stored stats may come from anywhere, and without the counted
+        # games their later result changes cannot be found, so they are rebuilt
+        full = options['full'] or watermark is None or (watermark.last_action_id > 0 and not DraftStatsGame.objects.exists())
+        low_water_mark = 0 if full else watermark.last_action_id
+        # Counted games whose winner, teams or sides were changed since
+        recount = {} if full else changed_games(options['chunk_size'])
+
+        if high_water_mark <= low_water_mark and not recount:
+            self.stdout.write(self.style.SUCCESS("Draft stats are up to date."))
+            return
+
+        team_pks = dict(Team.objects.values_list('external_id', 'id'))
+        parts = []
+        shards = []
+        if high_water_mark > low_water_mark:
+            actions = DraftAction.objects.filter(id__gt=low_water_mark, id__lte=high_water_mark)
+            game_ids = np.fromiter(actions.order_by('game_id').values_list('game_id', flat=True).distinct(), dtype=np.int64)
+
+            self.stdout.write(f"Processing {actions.count()} draft actions in {len(game_ids)} games...")
+            # A few ranges per worker with about the same number of games each, so that no worker idles
+            workers = options['workers']
+            num_shards = min(workers * 4, len(game_ids)) if workers > 1 else 1
+            shards = [
+                (int(games[0]), int(games[-1]), low_water_mark, high_water_mark, team_pks, options['chunk_size'])
+                for games in np.array_split(game_ids, num_shards)
+            ]
+
+            if workers > 1:
+                # Each worker opens its own database connection; none may be inherited from this process
+                connections.close_all()
+                with ProcessPoolExecutor(workers, initializer=django.setup) as pool:
+                    parts += pool.map(aggregate_games, *zip(*shards))
+            else:
+                parts.append(aggregate_games(*shards[0]))
 
-            team = teams_cache.get(action.drafter_id)
-            if not team:
-                continue
+        if recount:
+            self.stdout.write(f"Recounting {len(recount)} games whose result or teams changed...")
+            parts.append(recount_games(recount, low_water_mark, team_pks, options['chunk_size']))
+        tables = PickBanTables.merge(parts) if len(parts) > 1 else parts[0]
 
-            is_win = game.winning_team_id == team.id
-
-            if game.team_1_id == team.id:
-                side = game.team_1_side
-                opponent_team = teams_by_id.get(game.team_2_id)
-            elif game.team_2_id == team.id:
-                side = game.team_2_side
-                opponent_team = teams_by_id.get(game.team_1_id)
-            else:
-                continue
-
-            if action.action_type == "pick":
-                key = (team.id, champion.id)
-                if key not in pick_accumulator:
-                    pick_accumulator[key] = {
-                        'team': team,
-                        'champion': champion,
-                        'wins': 0,
-                        'games_played': 0,
-                        'red_side_wins': 0,
-                        'red_side_games': 0,
-                        'blue_side_wins': 0,
-                        'blue_side_games': 0,
-                    }
-
-                stats = pick_accumulator[key]
-                stats['games_played'] += 1
-                if is_win:
-                    stats['wins'] += 1
-
-                if side == BLUE_SIDE:
-                    stats['blue_side_games'] += 1
-                    if is_win:
-                        stats['blue_side_wins'] += 1
-                elif side == RED_SIDE:
-                    stats['red_side_games'] += 1
-                    if is_win:
-                        stats['red_side_wins'] += 1
-
-            elif action.action_type == "ban":
-                # Self stats
-                self_key = (team.id, champion.id)
-                if self_key not in ban_accumulator:
-                    ban_accumulator[self_key] = self._init_ban_stats(team, champion)
-
-                s_stats = ban_accumulator[self_key]
-                s_stats['games_banned'] += 1
-                s_stats['total_self_bans'] += 1
-                if is_win:
-                    s_stats['wins'] += 1
-
-                if side == BLUE_SIDE:
-                    s_stats['blue_side_self_bans'] += 1
-                    if is_win:
-                        s_stats['blue_side_self_wins'] += 1
-                elif side == RED_SIDE:
-                    s_stats['red_side_self_bans'] += 1
-                    if is_win:
-                        s_stats['red_side_self_wins'] += 1
-
-                # Opponent stats
-                if opponent_team:
-                    opp_key = (opponent_team.id, champion.id)
-                    if opp_key not in ban_accumulator:
-                        ban_accumulator[opp_key] = self._init_ban_stats(opponent_team, champion)
-
-                    o_stats = ban_accumulator[opp_key]
-                    o_stats['games_banned'] += 1
-                    o_stats['total_opponent_bans'] += 1
-
-                    opponent_won = not is_win
-                    if opponent_won:
-                        o_stats['wins'] += 1
-
-                    opponent_side = RED_SIDE if side == BLUE_SIDE else BLUE_SIDE
-                    if opponent_side == BLUE_SIDE:
-                        o_stats['blue_side_opponent_bans'] += 1
-                        if opponent_won:
-                            o_stats['blue_side_opponent_wins'] += 1
-                    elif opponent_side == RED_SIDE:
-                        o_stats['red_side_opponent_bans'] += 1
-                        if opponent_won:
-                            o_stats['red_side_opponent_wins'] += 1
-
-        # Bulk insert
-        self.stdout.write("Inserting new stats...")
-
-        pick_objects = [TeamChampionPickStats(**stats) for stats in pick_accumulator.values()]
-        ban_objects = [TeamChampionBanStats(**stats) for stats in ban_accumulator.values()]
+        pick_accumulator = tables.pick_stats()
+        ban_accumulator = tables.ban_stats()
+        summary_accumulator = tables.summary_stats()
+        self.stdout.write(f"Aggregated {len(shards)} game ranges and {len(recount)} recounted games in {time.monotonic() - started:.1f}s.")
 
+        # Bulk write. Both modes replace the stats in one transaction, so readers see either
+        # the previous or the new numbers and never an emptied table
+        self.stdout.write("Writing stats...")
         with transaction.atomic():
-            TeamChampionPickStats.objects.bulk_create(pick_objects, batch_size=1000)
-            TeamChampionBanStats.objects.bulk_create(ban_objects, batch_size=1000)
-
+            if full:
+                TeamChampionPickStats.objects.all().delete()
+                TeamChampionBanStats.objects.all().delete()
+                TeamDraftSummary.objects.all().delete()
+                DraftStatsGame.objects.all().delete()
+            else:
+                self._add_existing(TeamChampionPickStats, pick_accumulator, PICK_COUNTERS)
+                self._add_existing(TeamChampionBanStats, ban_accumulator, BAN_COUNTERS)
+                self._add_existing(TeamDraftSummary, summary_accumulator, SUMMARY_COUNTERS)
+
+            self._upsert(TeamChampionPickStats, pick_accumulator, PICK_COUNTERS, ['team', 'champion'])
+            self._upsert(TeamChampionBanStats, ban_accumulator, BAN_COUNTERS, ['team', 'champion'])
+            self._upsert(TeamDraftSummary, summary_accumulator, SUMMARY_COUNTERS, ['team'])
+            DraftStatsGame.objects.bulk_create(
+                [DraftStatsGame(game_id=game_id, **dict(zip(GAME_FIELDS, fields))) for game_id, fields in tables.counted_games.items()],
+                batch_size=1000,
+                update_conflicts=True,
+                unique_fields=['game'],
+                update_fields=list(GAME_FIELDS),
+            )
+
+            DraftStatsWatermark.objects.update_or_create(
+                pk=1, defaults={'last_action_id': max(high_water_mark, low_water_mark)}
+            )
+
+        mode = "Rebuilt" if full else "Updated"
         self.stdout.write(self.style.SUCCESS(
-            f"Draft stats aggregation complete. Created {len(pick_objects)} pick records and {len(ban_objects)} ban records."))
-
-    def _init_ban_stats(self, team, champion):
-        return {
-            'team': team,
-            'champion': champion,
-            'games_banned': 0,
-            'wins': 0,
-            'total_self_bans': 0,
-            'blue_side_self_bans': 0,
-            'blue_side_self_wins': 0,
-            'red_side_self_bans': 0,
-            'red_side_self_wins': 0,
-            'total_opponent_bans': 0,
-            'red_side_opponent_bans': 0,
-            'red_side_opponent_wins': 0,
-            'blue_side_opponent_bans': 0,
-            'blue_side_opponent_wins': 0,
-        }
+            f"Draft stats aggregation complete in {time.monotonic() - started:.1f}s. {mode} {len(pick_accumulator)} pick records, "
+            f"{len(ban_accumulator)} ban records and {len(summary_accumulator)} team summaries."))
+
+    def _add_existing(self, model, accumulator, counters):
+        """Adds the stored counters of the rows an incremental run touches to its deltas."""
+        if not accumulator:
+            return
+        if model is TeamDraftSummary:
+            rows = model.objects.filter(team_id__in=accumulator)
+            keys = ((row.team_id, row) for row in rows)
+        else:
+            rows = model.objects.filter(
+                team_id__in={team_id for team_id, _ in accumulator},
+                champion_id__in={champion_id for _, champion_id in accumulator},
+            )
+            keys = (((row.team_id, row.champion_id), row) for row in rows)
+        for key, row in keys:
+            stats = accumulator.get(key)
+            if stats is not None:
+                for counter in counters:
+                    stats[counter] += getattr(row, counter)
+
+    def _upsert(self, model, accumulator, counters, unique_fields):
+        model.objects.bulk_create(
+            [model(**stats) for stats in accumulator.values()],
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=unique_fields,
+            update_fields=counters + ['last_updated'],
+        )
@@ -0,0 +1,119 @@
+import io
+import json
+import os
+import time
+from contextlib import nullcontext
+
+import torch
+from django.core.management.base import BaseCommand, CommandError
+
+from draft.machine_learning import registry
+from draft.machine_learning.dataset import DraftDataset, dataset_cache_path, get_champion_mapping, get_team_mapping, prune_dataset_cache
+from draft.machine_learning.inference import QUANTIZED_FILE, example_inputs, fastpath_disabled, quantize_int8, save_quantized
+from draft.machine_learning.model import DraftTransformerModel
+
+
+class Command(BaseCommand):
+    help = "Build the dynamic int8 variant of the draft model (DRAFT_MODEL_VARIANT=int8) after checking it against fp32"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--samples", type=int, default=5000,
+                            help="Compare on the samples of the newest games. The model may have been trained on them, so the "
+                                 "reported top-k accuracy is not a held-out score; the fp32/int8 agreement does not need one")
+        parser.add_argument("--top-k", type=int, default=5)
+        parser.add_argument("--min-agreement", type=float, default=0.9,
+                            help="Minimum mean top-k overlap with fp32 required to save the variant")
+        parser.add_argument("--batch-size", type=int, default=512)
+        parser.add_argument("--rebuild-cache", action="store_true", help="Ignore the cached packed dataset and rebuild it")
+
+    def handle(self, *args, **options):
+        artifacts_dir = registry.current_dir()
+        model_path = os.path.join(artifacts_dir, registry.MODEL_FILE)
+        mapping_path = os.path.join(artifacts_dir, registry.MAPPINGS_FILE)
+        if not os.path.exists(model_path) or not os.path.exists(mapping_path):
+            raise CommandError("Model not found, run train_draft_model first")
+
+        with open(mapping_path, 'r', encoding='utf-8-sig') as f:
+            mappings = json.load(f)
+        model = DraftTransformerModel(num_champions=mappings["num_champions"], num_teams=mappings["num_teams"])
+        model.load_state_dict(torch.load(model_path, map_location="cpu"))
+        model.eval()
+        quantized = quantize_int8(model)
+
+        samples = self.load_samples(mappings, options["samples"], options["rebuild_cache"])
+        agreement = self.compare(model, quantized, samples, options["top_k"], options["batch_size"])
+
+        k = options["top_k"]
+        self.stdout.write(
+            f"Compared on {len(samples)} samples: top-1 agreement {agreement['top1']:.3f}, "
+            f"top-{k} overlap {agreement['overlap']:.3f}, "
+            f"top-{k} accuracy fp32 {agreement['fp32_hits']:.3f} / int8 {agreement['int8_hits']:.3f}"
+        )
+        for name, variant in (("fp32", model), ("int8", quantized)):
+            self.stdout.write(
+                f"{name}: {self.state_size(variant) / 2 ** 20:.2f} MiB, "
+                f"{self.latency(variant, mappings['num_teams'], fastpath=variant is model):.3f}ms per batch size 1 call"
+            )
+
+        if agreement["overlap"] < options["min_agreement"]:
+            raise CommandError(
+                f"int8 top-{k} overlap {agreement['overlap']:.3f} is below {options['min_agreement']}, not saving it"
+            )
+        version = registry.publish(
+            lambda version_dir: save_quantized(quantized, os.path.join(version_dir, QUANTIZED_FILE)),
+            note=f"quantize_draft_model, top-{k} overlap {agreement['overlap']:.3f}",
+        )
+        self.stdout.write(self.style.SUCCESS(f"Saved int8 model as version {version} -> {registry.version_dir(version)}"))
+
+    def load_samples(self, mappings, count, rebuild_cache):
+        champ_to_idx, _, _ = get_champion_mapping()
+        team_to_idx = get_team_mapping()
+        # Samples are encoded with the current tables; they must still match the model's
+        if champ_to_idx != mappings["champ_to_idx"] or team_to_idx != mappings["team_to_idx"]:
+            raise CommandError("Champions or teams changed since the model was trained, retrain it first")
+
+        cache_path = dataset_cache_path()
+        if os.path.exists(cache_path) and not rebuild_cache:
+            dataset = DraftDataset.load(cache_path)
+        else:
+            dataset = DraftDataset.from_database(champ_to_idx, team_to_idx, len(champ_to_idx))
+            dataset.save(cache_path)
+            prune_dataset_cache(cache_path)
+        _, newest = dataset.split_newest(count)
+        if not len(newest):
+            raise CommandError("No draft samples to compare on")
+        return newest
+
+    def compare(self, model, quantized, dataset, k, batch_size):
+        num_champions = model.num_champions
+        totals = {"top1": 0, "overlap": 0.0, "fp32_hits": 0, "int8_hits": 0}
+        with torch.no_grad():
+            for *inputs, targets in dataset.batches(batch_size, shuffle=False):
+                # Rank like the recommendation view: champions already in the draft are excluded
+                used = torch.zeros((len(targets), num_champions + 1), dtype=torch.bool)
+                used.scatter_(1, inputs[0], True)
+                used = used[:, :num_champions]
+                fp32_top = model(*inputs).masked_fill(used, float("-inf")).topk(k).indices
+                with fastpath_disabled():
+                    int8_top = quantized(*inputs).masked_fill(used, float("-inf")).topk(k).indices
+
+                totals["top1"] += (fp32_top[:, 0] == int8_top[:, 0]).sum().item()
+                totals["overlap"] += (fp32_top.unsqueeze(2) == int8_top.unsqueeze(1)).any(2).sum().item() / k
+                totals["fp32_hits"] += (fp32_top == targets.unsqueeze(1)).any(1).sum().item()
+                totals["int8_hits"] += (int8_top == targets.unsqueeze(1)).any(1).sum().item()
+        return {name: value / len(dataset) for name, value in totals.items()}
+
+    def state_size(self, model):
+        buffer = io.BytesIO()
+        torch.save(model.state_dict(), buffer)
+        return buffer.tell()
+
+    def latency(self, model, num_teams, iterations=200, fastpath=True):
+        inputs = example_inputs(model.num_champions, num_teams, batch_size=1, filled=10)
+        with torch.no_grad(), (nullcontext() if fastpath else fastpath_disabled()):
+            for _ in range(20):
+                model(*inputs)
+            started = time.perf_counter()
+            for _ in range(iterations):
+                model(*inputs)
+        return (time.perf_counter() - started) * 1000 / iterations
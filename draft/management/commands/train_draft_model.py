@@ -4,8 +4,8 @@ import torch.nn as nn
 import torch.optim as optim
 from django.core.management.base import BaseCommand
 from draft.machine_learning.model import DraftTransformerModel
-from draft.machine_learning.dataset import prepare_data, DraftDataset, get_champion_mapping, get_team_mapping
-from torch.utils.data import DataLoader
+from draft.machine_learning.dataset import DraftDataset, get_champion_mapping, get_team_mapping, dataset_cache_path, prune_dataset_cache
+from draft.machine_learning import registry
 import json
 
 class Command(BaseCommand):
@@ -13,27 +13,37 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument('--epochs', type=int, default=10, help='Number of epochs to train')
+        parser.add_argument('--rebuild-cache', action='store_true', help='Ignore the cached packed dataset and rebuild it')
+        parser.add_argument('--holdout', type=int, default=0, help='Leave the samples of the newest games out of this run; training resumes from the current weights, so earlier runs may have used them')
 
     def handle(self, *args, **options):
-        self.stdout.write("Preparing data...")
-        games_data, champ_to_idx, team_to_idx, num_champions = prepare_data()
-        
-        # Get reverse mappings for saving
-        from draft.machine_learning.dataset import get_champion_mapping
-        _, idx_to_champ, idx_to_name = get_champion_mapping()
-        
+        champ_to_idx, idx_to_champ, idx_to_name = get_champion_mapping()
+        team_to_idx = get_team_mapping()
+        num_champions = len(champ_to_idx)
         num_teams = len(team_to_idx) + 1 # +1 for unknown
-        
-        dataset = DraftDataset(games_data, champ_to_idx, team_to_idx, num_champions)
+
+        # Packed samples are cached per data fingerprint, so unchanged data is never re-read from the DB
+        cache_path = dataset_cache_path()
+        if os.path.exists(cache_path) and not options['rebuild_cache']:
+            self.stdout.write(f"Loading cached dataset from {cache_path}...")
+            dataset = DraftDataset.load(cache_path)
+        else:
+            self.stdout.write("Preparing data...")
+            dataset = DraftDataset.from_database(champ_to_idx, team_to_idx, num_champions)
+            dataset.save(cache_path)
+            prune_dataset_cache(cache_path)
+        if options['holdout']:
+            dataset, held_out = dataset.split_newest(options['holdout'])
+            self.stdout.write(f"Holding out the newest {len(held_out)} samples.")
         self.stdout.write(f"Found {len(dataset)} training samples.")
         
-        dataloader = DataLoader(dataset, batch_size=64, shuffle=True)
+        batch_size = 64
+        num_batches = dataset.num_batches(batch_size)
         
         device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         model = DraftTransformerModel(num_champions=num_champions, num_teams=num_teams).to(device)
         
-        artifacts_dir = "draft/ml_artifacts"
-        save_path = os.path.join(artifacts_dir, "draft_model.pth")
+        save_path = os.path.join(registry.current_dir(), registry.MODEL_FILE)
         
         if os.path.exists(save_path):
             self.stdout.write("Loading existing model weights for incremental training...")
@@ -49,7 +59,7 @@ class Command(BaseCommand):
         num_epochs = options['epochs']
         for epoch in range(num_epochs):
             total_loss = 0
-            for i, batch in enumerate(dataloader):
+            for i, batch in enumerate(dataset.batches(batch_size, shuffle=True)):
                 champ_ids, action_types, sides, positions, team_idx, opp_team_idx, target_champ = [t.to(device) for t in batch]
                 
                 optimizer.zero_grad()
@@ -61,17 +71,11 @@ class Command(BaseCommand):
                 total_loss += loss.item()
                 
                 if (i + 1) % 100 == 0:
-                    self.stdout.write(f"Epoch {epoch+1}, Batch {i+1}/{len(dataloader)}, Loss: {loss.item():.4f}")
+                    self.stdout.write(f"Epoch {epoch+1}, Batch {i+1}/{num_batches}, Loss: {loss.item():.4f}")
             
-            self.stdout.write(f"Epoch {epoch+1}/{num_epochs} COMPLETED, Avg Loss: {total_loss/len(dataloader):.4f}")
+            self.stdout.write(f"Epoch {epoch+1}/{num_epochs} COMPLETED, Avg Loss: {total_loss/max(1, num_batches):.4f}")
             
-        # Save model and mappings
-        artifacts_dir = "draft/ml_artifacts"
-        os.makedirs(artifacts_dir, exist_ok=True)
-        
-        save_path = os.path.join(artifacts_dir, "draft_model.pth")
-        torch.save(model.state_dict(), save_path)
-        
+        # Save model and mappings as a new artifact version; running servers switch to it on their own
         mappings = {
             "champ_to_idx": champ_to_idx,
             "idx_to_champ": idx_to_champ,
@@ -80,8 +84,11 @@ class Command(BaseCommand):
             "num_champions": num_champions,
             "num_teams": num_teams
         }
-        with open(os.path.join(artifacts_dir, "draft_mappings.json"), 'w') as f:
-            json.dump(mappings, f)
-            
-        self.stdout.write(f"Model saved to {save_path}")
-        self.stdout.write(f"Mappings saved to {os.path.join(artifacts_dir, 'draft_mappings.json')}")
+
+        def write(version_dir):
+            torch.save(model.state_dict(), os.path.join(version_dir, registry.MODEL_FILE))
+            with open(os.path.join(version_dir, registry.MAPPINGS_FILE), 'w') as f:
+                json.dump(mappings, f)
+
+        version = registry.publish(write, note=f"train_draft_model --epochs {num_epochs}")
+        self.stdout.write(f"Model and mappings saved to {registry.version_dir(version)}")
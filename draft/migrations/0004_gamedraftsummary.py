@@ -0,0 +1,30 @@
+# Generated by Django 4.2.24 on 2026-10-17 10:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matches', '0034_alter_playerframes_gold'),
+        ('draft', '0003_draftsession'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GameDraftSummary',
+            fields=[
+                ('game', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='draft_summary', serialize=False, to='matches.game')),
+                ('blue_picks', models.JSONField(default=list)),
+                ('red_picks', models.JSONField(default=list)),
+                ('blue_bans', models.JSONField(default=list)),
+                ('red_bans', models.JSONField(default=list)),
+                ('blue_drafter_id', models.CharField(blank=True, db_index=True, max_length=16, null=True)),
+                ('red_drafter_id', models.CharField(blank=True, db_index=True, max_length=16, null=True)),
+                ('winning_side', models.CharField(blank=True, choices=[('blue', 'Blue'), ('red', 'Red')], max_length=4, null=True)),
+                ('start_time', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.24 on 2026-10-17 11:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matches', '0034_alter_playerframes_gold'),
+        ('draft', '0004_gamedraftsummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TeamDraftSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_games', models.PositiveIntegerField(default=0)),
+                ('blue_games', models.PositiveIntegerField(default=0)),
+                ('red_games', models.PositiveIntegerField(default=0)),
+                ('last_updated', models.DateTimeField(auto_now=True, db_index=True)),
+                ('team', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='draft_totals', to='matches.team')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.24 on 2026-10-17 11:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('draft', '0005_teamdraftsummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='draftsession',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.24 on 2026-10-17 15:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matches', '0034_alter_playerframes_gold'),
+        ('draft', '0007_draftstatswatermark'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TeamChampionDecayedStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('side', models.CharField(choices=[('blue', 'Blue'), ('red', 'Red')], max_length=4)),
+                ('picks', models.FloatField(default=0)),
+                ('wins', models.FloatField(default=0)),
+                ('bans', models.FloatField(default=0)),
+                ('bans_against', models.FloatField(default=0)),
+                ('half_life_days', models.FloatField()),
+                ('last_updated', models.DateTimeField(auto_now=True)),
+                ('champion', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='draft.champion')),
+                ('team', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='matches.team')),
+            ],
+            options={
+                'unique_together': {('team', 'champion', 'side')},
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.3 on 2026-10-17 08:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('draft', '0008_teamchampiondecayedstats'),
+        ('matches', '0034_alter_playerframes_gold'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='draftaction',
+            index=models.Index(fields=['drafter_id', 'team_side', 'game'], name='draft_action_drafter_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='draftaction',
+            index=models.Index(fields=['action_type', 'game', 'sequence_number'], name='draft_action_type_game_idx'),
+        ),
+    ]
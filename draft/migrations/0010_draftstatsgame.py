@@ -0,0 +1,26 @@
+# Generated by Django 5.0.3 on 2026-10-17 08:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('draft', '0009_draftaction_query_indexes'),
+        ('matches', '0034_alter_playerframes_gold'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DraftStatsGame',
+            fields=[
+                ('game', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='draft_stats_counted', serialize=False, to='matches.game')),
+                ('winner', models.BigIntegerField()),
+                ('team_1', models.BigIntegerField()),
+                ('team_1_side', models.SmallIntegerField()),
+                ('team_2', models.BigIntegerField()),
+                ('team_2_side', models.SmallIntegerField()),
+            ],
+        ),
+    ]
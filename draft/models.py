@@ -40,6 +40,12 @@ class DraftAction(models.Model):
     class Meta:
         ordering = ["sequence_number"]
         unique_together = ("game", "sequence_number")
+        indexes = [
+            # Actions per drafter (TeamListView), optionally per side and game
+            models.Index(fields=["drafter_id", "team_side", "game"], name="draft_action_drafter_idx"),
+            # Picks or bans of games in draft order (similar matches, build_pair_stats)
+            models.Index(fields=["action_type", "game", "sequence_number"], name="draft_action_type_game_idx"),
+        ]
 
     def __str__(self):
         return f"{self.action_type.title()} {self.champion.name} by {self.team_side} in Game {self.game.game_id}"
@@ -95,11 +101,74 @@ class TeamChampionBanStats(models.Model):
             models.Index(fields=["team", "champion"]),
         ]
 
+class TeamDraftSummary(models.Model):
+    """
+    Distinct games a team drafted in, overall and per side. Written by process_draft_tables
+    alongside the pick and ban stats; serialize_draft uses it for pick and ban rates.
+    """
+    team = models.OneToOneField(Team, on_delete=models.CASCADE, related_name="draft_totals")
+
+    total_games = models.PositiveIntegerField(default=0)
+    blue_games = models.PositiveIntegerField(default=0)
+    red_games = models.PositiveIntegerField(default=0)
+
+    last_updated = models.DateTimeField(auto_now=True, db_index=True)
+
+class TeamChampionDecayedStats(models.Model):
+    """
+    Time-decayed pick and ban weights of a team per champion and side: each game counts
+    0.5 ** (age in days / half_life_days), so the current meta outweighs old patches.
+    Rebuilt by build_champion_stats.
+    """
+    team = models.ForeignKey(Team, on_delete=models.CASCADE)
+    champion = models.ForeignKey(Champion, on_delete=models.PROTECT)
+    side = models.CharField(
+        max_length=4,
+        choices=[("blue", "Blue"), ("red", "Red")]
+    )
+
+    picks = models.FloatField(default=0)
+    wins = models.FloatField(default=0)
+    # Bans by the team, and by its opponents against it
+    bans = models.FloatField(default=0)
+    bans_against = models.FloatField(default=0)
+
+    half_life_days = models.FloatField()
+    last_updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("team", "champion", "side")
+
+class DraftStatsWatermark(models.Model):
+    """
+    Highest DraftAction id aggregated into the pick/ban stats and TeamDraftSummary so far.
+    Single row; incremental process_draft_tables runs only aggregate the actions after it.
+    """
+    last_action_id = models.BigIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+class DraftStatsGame(models.Model):
+    """
+    Result and teams of a game as they were when its actions were counted into the pick/ban
+    stats: Team pks and the side codes of draft_tables, -1 when missing. Incremental
+    process_draft_tables runs recount the games whose Game no longer matches.
+    """
+    game = models.OneToOneField(Game, on_delete=models.CASCADE, primary_key=True, related_name="draft_stats_counted")
+
+    winner = models.BigIntegerField()
+    team_1 = models.BigIntegerField()
+    team_1_side = models.SmallIntegerField()
+    team_2 = models.BigIntegerField()
+    team_2_side = models.SmallIntegerField()
+
 class DraftSession(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Bumped on every write; backs the ETag / If-Match handling in views.py
+    version = models.PositiveIntegerField(default=1)
 
     # Core state
     blue_team = models.CharField(max_length=128, null=True, blank=True)
@@ -120,4 +189,40 @@ class DraftSession(models.Model):
     )
 
     def __str__(self):
-        return f"Draft {self.id}"
\ No newline at end of file
+        return f"Draft {self.id}"
+
+
+class GameDraftSummary(models.Model):
+    """
+    One row per drafted game with its picks and bans per side in draft order.
+    Derived from DraftAction (see draft/summaries.py): built by build_draft_summaries
+    and kept in sync when DraftActions are saved or deleted.
+    """
+    game = models.OneToOneField(
+        Game,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="draft_summary"
+    )
+
+    # Champion ids in draft order
+    blue_picks = models.JSONField(default=list)
+    red_picks = models.JSONField(default=list)
+    blue_bans = models.JSONField(default=list)
+    red_bans = models.JSONField(default=list)
+
+    blue_drafter_id = models.CharField(max_length=16, null=True, blank=True, db_index=True)
+    red_drafter_id = models.CharField(max_length=16, null=True, blank=True, db_index=True)
+
+    winning_side = models.CharField(
+        max_length=4,
+        null=True,
+        blank=True,
+        choices=[("blue", "Blue"), ("red", "Red")]
+    )
+    start_time = models.DateTimeField(null=True, blank=True)
+
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"Draft summary for Game {self.game_id}"
@@ -0,0 +1,50 @@
+import gzip
+import json
+
+OPENING_BOOK_FILE = "opening_book.json.gz"
+OPENING_BOOK_FORMAT_VERSION = 2
+
+
+class OpeningBook:
+    """
+    Precomputed recommendation responses for early draft states, keyed by
+    DraftRecommender.state_key without a model version. A book is published into the artifact
+    version it was built from (see build_opening_book) and loaded together with it, so it
+    always matches the model serving it; later versions do not take it over.
+    """
+
+    def __init__(self, max_actions=-1, entries=None):
+        self.max_actions = max_actions  # states with more actions are never in the book
+        self.entries = entries or {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def add(self, key, result):
+        self.entries[key] = result
+
+    def save(self, path):
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            json.dump({
+                "format_version": OPENING_BOOK_FORMAT_VERSION,
+                "max_actions": self.max_actions,
+                "entries": self.entries,
+            }, f, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path):
+        """
+        Raises FileNotFoundError if there is no book and ValueError if it was written
+        in an older format.
+        """
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("format_version") != OPENING_BOOK_FORMAT_VERSION:
+            raise ValueError(f"Opening book {path} has an outdated format")
+        return cls(data["max_actions"], data["entries"])
+
+
+EMPTY_BOOK = OpeningBook()
@@ -0,0 +1,90 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+KEY_PREFIX = "draft-rec"
+
+
+def artifact_signature(*paths):
+    """
+    Short fingerprint of the given files (size and modification time), used as the model
+    version in cache keys. Missing files are part of the signature too.
+    """
+    parts = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            parts.append(f"{path}:{stat.st_size}:{stat.st_mtime_ns}")
+        except FileNotFoundError:
+            parts.append(f"{path}:missing")
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()[:16]
+
+
+def recommendation_key(model_version, blue_team_idx, red_team_idx, slots, actions):
+    """
+    Hashes a canonical draft state.
+    slots: one token per DRAFT_PHASES slot (champion index, or None when empty).
+    actions: the picks and bans per side as champion indices, in order; champions the model
+    does not know keep their id since the hints resolve them by name.
+    """
+    canonical = repr((model_version, blue_team_idx, red_team_idx, tuple(slots), tuple(map(tuple, actions))))
+    return f"{KEY_PREFIX}:{hashlib.sha1(canonical.encode()).hexdigest()}"
+
+
+class RecommendationCache:
+    """
+    Bounded LRU of recommendation responses with a TTL, optionally backed by a Django cache
+    (RECOMMENDATION_CACHE_ALIAS) so that workers share their results.
+
+    Keys include the model version, so entries of a replaced model are never served; clear()
+    drops them from memory right away.
+    """
+
+    def __init__(self, max_entries=None, ttl=None, alias=None):
+        self.max_entries = max_entries or getattr(settings, "RECOMMENDATION_CACHE_SIZE", 1024)
+        self.ttl = ttl or getattr(settings, "RECOMMENDATION_CACHE_TTL", 600)
+        self.alias = alias or getattr(settings, "RECOMMENDATION_CACHE_ALIAS", None)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    return value
+                del self._entries[key]
+
+        if self.alias:
+            value = caches[self.alias].get(key)
+            if value is not None:
+                self._store(key, value, now)
+            return value
+        return None
+
+    def set(self, key, value):
+        self._store(key, value, time.monotonic())
+        if self.alias:
+            caches[self.alias].set(key, value, timeout=self.ttl)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _store(self, key, value, now):
+        with self._lock:
+            self._entries[key] = (now + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+recommendation_cache = RecommendationCache()
@@ -0,0 +1,67 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from matches.models import Game, Match
+
+from .models import DraftAction, GameDraftSummary
+from .summaries import sync_game_summaries
+
+
+class PendingSummarySync:
+    """
+    Game ids changed in the current transaction. Every change registers this with on_commit
+    itself, so Django discards the registration together with a rolled-back savepoint; the
+    first call after a commit syncs all collected games in one go and later calls find nothing
+    left. Games changed only in rolled-back work may be synced along, which just rebuilds their
+    summaries from the committed rows.
+    """
+
+    def __init__(self):
+        self.game_ids = set()
+
+    def __call__(self):
+        game_ids, self.game_ids = self.game_ids, set()
+        if game_ids:
+            sync_game_summaries(game_ids)
+
+
+def schedule_summary_sync(game_ids, using):
+    """
+    Syncs the summaries of game_ids after the current transaction commits (right away in
+    autocommit), collecting the games of a whole transaction into one sync_game_summaries call.
+    """
+    game_ids = [game_id for game_id in game_ids if game_id is not None]
+    if not game_ids:
+        return
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        sync_game_summaries(game_ids)
+        return
+    pending = getattr(connection, "draft_summary_sync", None)
+    if pending is None:
+        pending = connection.draft_summary_sync = PendingSummarySync()
+    pending.game_ids.update(game_ids)
+    transaction.on_commit(pending, using=using)
+
+
+@receiver(post_save, sender=DraftAction)
+@receiver(post_delete, sender=DraftAction)
+def sync_draft_summary(sender, instance, using, **kwargs):
+    """Keeps GameDraftSummary in step with DraftActions saved through the ORM."""
+    schedule_summary_sync([instance.game_id], using)
+
+
+@receiver(post_save, sender=Game)
+def sync_game_result(sender, instance, created, using, **kwargs):
+    """Winner and team sides of a summary come from its Game."""
+    if not created:
+        schedule_summary_sync([instance.pk], using)
+
+
+@receiver(post_save, sender=Match)
+def sync_match_start_time(sender, instance, created, using, **kwargs):
+    """The start time of a summary comes from the Match of its game."""
+    if not created:
+        game_ids = GameDraftSummary.objects.using(using).filter(game__match=instance).values_list("game_id", flat=True)
+        schedule_summary_sync(list(game_ids), using)
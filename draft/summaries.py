@@ -0,0 +1,73 @@
+from itertools import groupby, islice
+from operator import itemgetter
+
+from .models import DraftAction, GameDraftSummary
+
+SUMMARY_UPDATE_FIELDS = [
+    "blue_picks", "red_picks", "blue_bans", "red_bans",
+    "blue_drafter_id", "red_drafter_id", "winning_side", "start_time", "updated_at",
+]
+
+
+def summarize_games(game_ids=None, chunk_size=2000):
+    """
+    Yields unsaved GameDraftSummary objects for every game with draft actions
+    (or only the given game ids), from one streamed DraftAction query joined to Game.
+    """
+    actions = DraftAction.objects.order_by("game_id", "sequence_number")
+    if game_ids is not None:
+        actions = actions.filter(game_id__in=list(game_ids))
+    rows = actions.values_list(
+        "game_id", "champion_id", "action_type", "team_side", "drafter_id",
+        "game__winning_team_id", "game__team_1_id", "game__team_1_side",
+        "game__team_2_id", "game__team_2_side", "game__match__start_time",
+    ).iterator(chunk_size=chunk_size)
+
+    for game_id, game_rows in groupby(rows, key=itemgetter(0)):
+        game_rows = list(game_rows)
+        summary = GameDraftSummary(game_id=game_id, start_time=game_rows[0][10])
+
+        for _, champion_id, action_type, side, drafter_id, *_ in game_rows:
+            side = (side or "").lower()
+            if side not in ("blue", "red"):
+                continue
+            getattr(summary, f"{side}_{'picks' if action_type == 'pick' else 'bans'}").append(champion_id)
+            if drafter_id and not getattr(summary, f"{side}_drafter_id"):
+                setattr(summary, f"{side}_drafter_id", drafter_id)
+
+        winner, team_1, team_1_side, team_2, team_2_side = game_rows[0][5:10]
+        if winner is not None:
+            if winner == team_1 and team_1_side:
+                summary.winning_side = team_1_side.lower()
+            elif winner == team_2 and team_2_side:
+                summary.winning_side = team_2_side.lower()
+        yield summary
+
+
+def save_summaries(summaries, batch_size=500):
+    """Upserts summaries in batches. Returns the number of rows written."""
+    summaries = iter(summaries)
+    saved = 0
+    while batch := list(islice(summaries, batch_size)):
+        GameDraftSummary.objects.bulk_create(
+            batch,
+            update_conflicts=True,
+            unique_fields=["game"],
+            update_fields=SUMMARY_UPDATE_FIELDS,
+        )
+        saved += len(batch)
+    return saved
+
+
+def sync_game_summaries(game_ids):
+    """
+    Rebuilds the summaries of the given games, removing those left without draft actions.
+    """
+    game_ids = set(game_ids)
+    if not game_ids:
+        return
+    summaries = list(summarize_games(game_ids))
+    save_summaries(summaries)
+    stale = game_ids - {s.game_id for s in summaries}
+    if stale:
+        GameDraftSummary.objects.filter(game_id__in=stale).delete()
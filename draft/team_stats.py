@@ -0,0 +1,93 @@
+import threading
+from dataclasses import dataclass, field
+
+from django.db.models import Max, Q
+
+from matches.models import Team
+from .models import TeamChampionBanStats, TeamChampionPickStats, TeamDraftSummary
+
+EMPTY_GAMES = {"total": 0, "blue": 0, "red": 0}
+
+
+def team_champion_stats(team):
+    """(pick stats, ban stats) querysets of a team, a Team or its pk."""
+    return TeamChampionPickStats.objects.filter(team=team), TeamChampionBanStats.objects.filter(team=team)
+
+
+@dataclass
+class TeamStats:
+    team: Team
+    games: dict = field(default_factory=lambda: dict(EMPTY_GAMES))
+    pick_stats: dict = field(default_factory=dict)   # champion id -> TeamChampionPickStats
+    ban_stats: dict = field(default_factory=dict)    # champion id -> TeamChampionBanStats
+
+
+class TeamStatsCache:
+    """
+    In-process cache of the per-team stats serialize_draft needs (game counts plus every
+    pick and ban stats row of the team), keyed by the name or external id used in drafts.
+
+    The version is the latest TeamDraftSummary.last_updated, which process_draft_tables
+    bumps on every run, so a lookup costs one indexed MAX query while the stats are
+    unchanged and the cache is dropped as soon as they are rebuilt.
+    """
+
+    def __init__(self, max_teams=512):
+        self.max_teams = max_teams
+        self._version = None
+        self._teams = {}
+        self._lock = threading.Lock()
+
+    def current_version(self):
+        return TeamDraftSummary.objects.aggregate(version=Max("last_updated"))["version"]
+
+    def get_many(self, team_keys, version=None):
+        """
+        Returns {team key: TeamStats or None} for the given draft team names/ids.
+        Unknown teams are not cached, so they become visible as soon as they are created.
+        version: a current_version() the caller already fetched, to skip the query.
+        """
+        if version is None:
+            version = self.current_version()
+        with self._lock:
+            if version != self._version:
+                self._version = version
+                self._teams = {}
+            cached = {key: self._teams[key] for key in team_keys if key in self._teams}
+
+        result = dict(cached)
+        for key in team_keys:
+            if key in result or not key:
+                result.setdefault(key, None)
+                continue
+            stats = self._load(key)
+            result[key] = stats
+            if stats is not None:
+                with self._lock:
+                    if self._version == version:
+                        if len(self._teams) >= self.max_teams:
+                            self._teams.pop(next(iter(self._teams)))
+                        self._teams[key] = stats
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._version = None
+            self._teams = {}
+
+    def _load(self, team_key):
+        team = Team.objects.filter(Q(name=team_key) | Q(external_id=team_key)).first()
+        if team is None:
+            return None
+
+        stats = TeamStats(team=team)
+        summary = TeamDraftSummary.objects.filter(team=team).first()
+        if summary is not None:
+            stats.games = {"total": summary.total_games, "blue": summary.blue_games, "red": summary.red_games}
+        pick_stats, ban_stats = team_champion_stats(team)
+        stats.pick_stats = {str(s.champion_id): s for s in pick_stats}
+        stats.ban_stats = {str(s.champion_id): s for s in ban_stats}
+        return stats
+
+
+team_stats_cache = TeamStatsCache()
@@ -0,0 +1,56 @@
+import json
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from draft.machine_learning import registry
+from draft.machine_learning.pair_stats import LEGACY_PAIR_STATS_FILE
+from draft.models import Champion, DraftAction
+from matches.models import Game, Team
+
+
+class BuildPairStatsTests(TestCase):
+    def setUp(self):
+        self.blue_team = Team.objects.create(external_id="blue")
+        self.red_team = Team.objects.create(external_id="red")
+        self.blue_champion = Champion.objects.create(id="1", name="Ahri")
+        self.red_champion = Champion.objects.create(id="2", name="Zed")
+
+    def create_game(self, winning_team):
+        game = Game.objects.create(
+            team_1=self.blue_team, team_1_side="blue",
+            team_2=self.red_team, team_2_side="red",
+            winning_team=winning_team,
+            team_1_mid_champion="Ahri", team_1_mid_player_name="blue mid",
+            team_2_mid_champion="Zed", team_2_mid_player_name="red mid",
+        )
+        DraftAction.objects.create(game=game, sequence_number=1, action_type="pick", team_side="blue", champion=self.blue_champion)
+        DraftAction.objects.create(game=game, sequence_number=2, action_type="pick", team_side="red", champion=self.red_champion)
+
+    def build_pair_stats(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            call_command("build_pair_stats", output_dir=output_dir, prior_games=10, stdout=open(os.devnull, "w"))
+            with open(os.path.join(output_dir, LEGACY_PAIR_STATS_FILE), encoding="utf-8") as f:
+                stats = json.load(f)
+            with open(os.path.join(output_dir, registry.PLAYER_POOLS_FILE), encoding="utf-8") as f:
+                return stats, json.load(f)
+
+    def test_games_without_winner_are_skipped(self):
+        self.create_game(winning_team=self.blue_team)
+        self.create_game(winning_team=None)
+
+        stats, player_pools = self.build_pair_stats()
+
+        self.assertEqual(stats["champ_avg_wr"], {"Ahri": round(6 / 11, 4), "Zed": round(5 / 11, 4)})
+        self.assertEqual(player_pools["blue mid|Ahri"], {"wins": 1.0, "games": 1.0})
+        self.assertEqual(player_pools["red mid|Zed"], {"wins": 0.0, "games": 1.0})
+
+    def test_only_games_without_winner(self):
+        self.create_game(winning_team=None)
+
+        stats, player_pools = self.build_pair_stats()
+
+        self.assertEqual(stats["champ_avg_wr"], {})
+        self.assertEqual(player_pools, {})
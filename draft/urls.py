@@ -1,12 +1,14 @@
 ﻿# drafts/urls.py
 from django.urls import include, path
-from .views import DraftCreateView, DraftDetailView, DraftUpdateView
+from .views import DraftCreateView, DraftDetailView, DraftUpdateView, DraftAutosaveView, DraftStatsView
 from .api import ChampionListView, TeamListView, DraftRecommendationView, DraftSimilarMatchesView
 
 urlpatterns = [
     path("drafts/", DraftCreateView.as_view()),
     path("drafts/<uuid:draft_id>/", DraftDetailView.as_view()),
     path("drafts/<uuid:draft_id>/update/", DraftUpdateView.as_view()),
+    path("drafts/<uuid:draft_id>/autosave/", DraftAutosaveView.as_view()),
+    path("drafts/<uuid:draft_id>/stats/", DraftStatsView.as_view()),
     path("champions/", ChampionListView.as_view()),
     path("teams/", TeamListView.as_view()),
     path("recommendations/", DraftRecommendationView.as_view()),
@@ -1,9 +1,18 @@
 ﻿# drafts/views.py
-from .models import DraftSession as Draft, TeamChampionPickStats, TeamChampionBanStats, DraftAction
+from .models import DraftSession as Draft
+from .team_stats import team_stats_cache
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from matches.models import Team
-from django.db.models import Q, Count
+from django.db.models import F
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+
+AUTOSAVE_FIELDS = ("blue_team", "red_team", "status")
+UPDATE_FIELDS = ["blue_team", "red_team", "picks", "bans", "status"]
+SLOTS_PER_SIDE = 5
+# Retries for writes without If-Match that lose a compare-and-set race
+SAVE_ATTEMPTS = 3
 
 class DraftCreateView(APIView):
     def post(self, request):
@@ -31,23 +40,110 @@ class DraftCreateView(APIView):
             "draft": serialize_draft(draft),
         })
 
+def detail_etag(request, draft_id):
+    version = Draft.objects.filter(id=draft_id).values_list("version", flat=True).first()
+    if version is None:
+        return None
+    return draft_etag(version, team_stats_cache.current_version())
+
 class DraftDetailView(APIView):
+    """
+    Conditional GETs (If-None-Match) get a 304 while neither the draft nor the stats tables changed.
+    """
+    @method_decorator(condition(etag_func=detail_etag))
     def get(self, request, draft_id):
         draft = Draft.objects.get(id=draft_id)
-        return Response(serialize_draft(draft))
+        stats_version = team_stats_cache.current_version()
+        return Response(serialize_draft(draft, stats_version), headers={"ETag": draft_etag(draft.version, stats_version)})
 
 class DraftUpdateView(APIView):
+    """
+    Sending If-Match (an ETag from DraftDetailView or a bare version number) makes the update
+    fail with 412 if someone else saved the draft in the meantime. Without it, last write wins.
+    """
     def patch(self, request, draft_id):
-        draft = Draft.objects.get(id=draft_id)
+        try:
+            expected_version = if_match_version(request)
+        except ValueError:
+            return Response({"error": "Malformed If-Match header"}, status=400)
 
-        for field in ["blue_team", "red_team", "picks", "bans", "status"]:
-            if field in request.data:
+        fields = [field for field in UPDATE_FIELDS if field in request.data]
+        for _ in range(SAVE_ATTEMPTS):
+            draft = Draft.objects.get(id=draft_id)
+            if expected_version is not None and draft.version != expected_version:
+                return precondition_failed(draft)
+
+            for field in fields:
                 setattr(draft, field, request.data[field])
 
-        draft.save()
-        return Response(serialize_draft(draft))
+            if save_draft(draft, fields):
+                break
+        else:
+            return precondition_failed(draft)
+
+        stats_version = team_stats_cache.current_version()
+        return Response(serialize_draft(draft, stats_version), headers={"ETag": draft_etag(draft.version, stats_version)})
+
+class DraftAutosaveView(APIView):
+    """
+    Lightweight autosave: applies slot-level operations (see apply_draft_ops) and only
+    writes the changed columns. Stats are not recomputed; stats_changed tells the client
+    whether to fetch them again from DraftStatsView.
+    """
+    def patch(self, request, draft_id):
+        ops = request.data.get("ops")
+        if not isinstance(ops, list):
+            return Response({"error": "ops must be a list of operations"}, status=400)
+
+        try:
+            expected_version = if_match_version(request)
+        except ValueError:
+            return Response({"error": "Malformed If-Match header"}, status=400)
+
+        for _ in range(SAVE_ATTEMPTS):
+            draft = Draft.objects.filter(id=draft_id).first()
+            if draft is None:
+                return Response({"error": "Draft not found"}, status=404)
+            if expected_version is not None and draft.version != expected_version:
+                return precondition_failed(draft)
+
+            before = stats_inputs(draft)
+            try:
+                changed = apply_draft_ops(draft, ops)
+            except ValueError as e:
+                return Response({"error": str(e)}, status=400)
+
+            if not changed or save_draft(draft, sorted(changed)):
+                break
+        else:
+            return precondition_failed(draft)
+
+        return Response({
+            "id": str(draft.id),
+            "version": draft.version,
+            "updated_at": draft.updated_at,
+            "stats_changed": stats_inputs(draft) != before,
+        })
+
+class DraftStatsView(APIView):
+    def get(self, request, draft_id):
+        draft = Draft.objects.get(id=draft_id)
+        return Response(serialize_draft_stats(draft))
 
-def serialize_draft(draft):
+def serialize_draft(draft, stats_version=None):
+    return {
+        "id": str(draft.id),
+        "blue_team": draft.blue_team,
+        "red_team": draft.red_team,
+        "picks": draft.picks,
+        "bans": draft.bans,
+        "status": draft.status,
+        "version": draft.version,
+        "updated_at": draft.updated_at,
+        **serialize_draft_stats(draft, stats_version),
+    }
+
+def serialize_draft_stats(draft, stats_version=None):
     stats = {"blue": {}, "red": {}}
     ban_stats_data = {"blue": {}, "red": {}}
     
@@ -58,30 +154,14 @@ def serialize_draft(draft):
     
     is_finished = draft.status == "COMPLETED" or total_picks >= 10
     
-    # Pre-fetch stats if teams are selected
+    # Pre-fetch stats if teams are selected (cached per team until the stats tables are rebuilt)
     if draft.blue_team or draft.red_team:
-        blue_team_obj = Team.objects.filter(Q(name=draft.blue_team) | Q(external_id=draft.blue_team)).first()
-        red_team_obj = Team.objects.filter(Q(name=draft.red_team) | Q(external_id=draft.red_team)).first()
-        
-        # Calculate unique games per team for banrate percentages
-        team_side_total_games = {}
-        for team_obj in [blue_team_obj, red_team_obj]:
-            if team_obj and team_obj.external_id:
-                # Total games
-                total = DraftAction.objects.filter(drafter_id=team_obj.external_id).values('game').distinct().count()
-                # Blue side games
-                blue_total = DraftAction.objects.filter(drafter_id=team_obj.external_id, team_side='blue').values('game').distinct().count()
-                # Red side games
-                red_total = DraftAction.objects.filter(drafter_id=team_obj.external_id, team_side='red').values('game').distinct().count()
-                
-                team_side_total_games[team_obj.external_id] = {
-                    "total": total,
-                    "blue": blue_total,
-                    "red": red_total
-                }
-
-        def get_team_stats(team_obj, side):
-            if not team_obj:
+        cached = team_stats_cache.get_many([draft.blue_team, draft.red_team], stats_version)
+        blue_team_stats = cached.get(draft.blue_team)
+        red_team_stats = cached.get(draft.red_team)
+
+        def get_team_stats(team_stats, side):
+            if not team_stats:
                 return
             
             # Get IDs of picked champions for this side
@@ -89,17 +169,9 @@ def serialize_draft(draft):
             champ_ids = [p["id"] if isinstance(p, dict) else p for p in side_picks if p]
             
             if champ_ids:
-                pick_stats = TeamChampionPickStats.objects.filter(
-                    team=team_obj,
-                    champion_id__in=champ_ids
-                )
-                
-                # Create a map for easy lookup
-                pick_stats_map = {str(s.champion_id): s for s in pick_stats}
-                
                 for cid in champ_ids:
-                    s = pick_stats_map.get(str(cid))
-                    team_games = team_side_total_games.get(team_obj.external_id, {"total": 0, "blue": 0, "red": 0})
+                    s = team_stats.pick_stats.get(str(cid))
+                    team_games = team_stats.games
                     if s:
                         stats[side][str(cid)] = {
                             "wins": s.wins,
@@ -130,18 +202,12 @@ def serialize_draft(draft):
 
             if ban_champ_ids:
                 opp_side = "red" if side == "blue" else "blue"
-                opp_team_obj = red_team_obj if side == "blue" else blue_team_obj
+                opp_team_stats = red_team_stats if side == "blue" else blue_team_stats
                 
-                if opp_team_obj:
-                    ban_stats = TeamChampionBanStats.objects.filter(
-                        team=opp_team_obj,
-                        champion_id__in=ban_champ_ids
-                    )
-                    ban_stats_map = {str(s.champion_id): s for s in ban_stats}
-
+                if opp_team_stats:
                     for cid in ban_champ_ids:
-                        s = ban_stats_map.get(str(cid))
-                        opp_games = team_side_total_games.get(opp_team_obj.external_id, {"total": 0, "blue": 0, "red": 0})
+                        s = opp_team_stats.ban_stats.get(str(cid))
+                        opp_games = opp_team_stats.games
                         
                         if s:
                             ban_stats_data[side][str(cid)] = {
@@ -174,17 +240,94 @@ def serialize_draft(draft):
                                 "opp_total_games": opp_games["total"], "opp_blue_games": opp_games["blue"], "opp_red_games": opp_games["red"],
                             }
 
-        get_team_stats(blue_team_obj, "blue")
-        get_team_stats(red_team_obj, "red")
+        get_team_stats(blue_team_stats, "blue")
+        get_team_stats(red_team_stats, "red")
 
     return {
-        "id": str(draft.id),
-        "blue_team": draft.blue_team,
-        "red_team": draft.red_team,
-        "picks": draft.picks,
-        "bans": draft.bans,
-        "status": draft.status,
-        "updated_at": draft.updated_at,
         "stats": stats,
         "ban_stats": ban_stats_data,
     }
+
+def draft_etag(version, stats_version=None):
+    """ETag of a serialized draft: its version plus the version of the stats tables it embeds."""
+    stamp = int(stats_version.timestamp() * 1000000) if stats_version else 0
+    return f'"{version}-{stamp}"'
+
+def if_match_version(request):
+    """
+    Draft version required by an If-Match header holding a draft_etag or a bare version number.
+    None when there is no header or it is "*"; raises ValueError when it is malformed.
+    """
+    header = request.headers.get("If-Match", "").strip()
+    if not header or header == "*":
+        return None
+    tag = header.split(",")[0].strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    return int(tag.strip('"').split("-")[0])
+
+def save_draft(draft, fields):
+    """
+    Writes the given fields and bumps the version, but only if the row is still at
+    draft.version (compare-and-set). Returns False if another write got there first.
+    """
+    now = timezone.now()
+    updated = Draft.objects.filter(id=draft.id, version=draft.version).update(
+        version=F("version") + 1,
+        updated_at=now,
+        **{field: getattr(draft, field) for field in fields},
+    )
+    if updated:
+        draft.version += 1
+        draft.updated_at = now
+    return bool(updated)
+
+def precondition_failed(draft):
+    return Response(
+        {"error": "Draft was modified by someone else", "version": draft.version},
+        status=412,
+        headers={"ETag": draft_etag(draft.version, team_stats_cache.current_version())},
+    )
+
+def stats_inputs(draft):
+    """Everything serialize_draft_stats depends on: the teams and the champions per side."""
+    def ids(items):
+        return tuple(sorted(str(p["id"] if isinstance(p, dict) else p) for p in items or [] if p))
+
+    return (
+        draft.blue_team,
+        draft.red_team,
+        ids(draft.picks.get("blue")), ids(draft.picks.get("red")),
+        ids(draft.bans.get("blue")), ids(draft.bans.get("red")),
+    )
+
+def apply_draft_ops(draft, ops):
+    """
+    Applies JSON-patch style "replace" operations to a draft, e.g.
+    {"op": "replace", "path": "/picks/blue/2", "value": {...}} or {"op": "replace", "path": "/status", "value": "COMPLETED"}.
+    Returns the set of model fields that changed; raises ValueError on malformed operations.
+    """
+    changed = set()
+    for op in ops:
+        if not isinstance(op, dict) or op.get("op", "replace") != "replace" or "value" not in op:
+            raise ValueError("Only replace operations with a value are supported")
+        parts = str(op.get("path", "")).strip("/").split("/")
+        value = op["value"]
+
+        if len(parts) == 1 and parts[0] in AUTOSAVE_FIELDS:
+            if getattr(draft, parts[0]) != value:
+                setattr(draft, parts[0], value)
+                changed.add(parts[0])
+        elif len(parts) == 3 and parts[0] in ("picks", "bans") and parts[1] in ("blue", "red") and parts[2].isdigit():
+            field, side, slot = parts[0], parts[1], int(parts[2])
+            if slot >= SLOTS_PER_SIDE:
+                raise ValueError(f"Slot index out of range: {op['path']}")
+            slots = list(getattr(draft, field).get(side) or [])
+            slots += [None] * (SLOTS_PER_SIDE - len(slots))
+            if slots[slot] != value:
+                slots[slot] = value
+                getattr(draft, field)[side] = slots
+                changed.add(field)
+        else:
+            raise ValueError(f"Unsupported path: {op.get('path')}")
+    return changed
@@ -0,0 +1,14 @@
+"""
+WSGI config for the draft project.
+
+It exposes the WSGI callable as a module-level variable named ``application``.
+gunicorn.conf.py serves it with the model preloaded in the master process.
+"""
+
+import os
+
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "draft.settings")
+
+application = get_wsgi_application()
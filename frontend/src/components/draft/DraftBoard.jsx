@@ -158,11 +158,12 @@ export default function DraftBoard({ draft, setDraft, startNewDraft, copyToNewSe
         [side]: !isPick ? newList : draft.bans[side]
       };
 
-      // Persist to backend
+      // Persist to backend; If-Match makes the save fail instead of overwriting someone else's changes
       fetch(`/api/drafts/${draft.id}/update/`, {
         method: "PATCH",
         headers: {
           "Content-Type": "application/json",
+          ...(draft.version ? { "If-Match": String(draft.version) } : {}),
         },
         body: JSON.stringify({
           picks: newPicks,
@@ -170,7 +171,19 @@ export default function DraftBoard({ draft, setDraft, startNewDraft, copyToNewSe
           status: isLastPick ? "COMPLETED" : draft.status
         }),
       })
-        .then(res => res.json())
+        .then(res => {
+          if (res.status === 412) {
+            toast({
+              title: "Draft Updated Elsewhere",
+              description: "Someone else changed this draft. Showing the latest version.",
+              status: "warning",
+              duration: 3000,
+              isClosable: true,
+            });
+            return fetch(`/api/drafts/${draft.id}/`).then(r => r.json());
+          }
+          return res.json();
+        })
         .then(updatedDraft => {
           setDraft(updatedDraft);
           setIsSelecting(false);
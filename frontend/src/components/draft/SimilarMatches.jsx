@@ -8,19 +8,32 @@
   Spinner,
   Flex,
   Image,
-  Spacer
+  Spacer,
+  Button
 } from "@chakra-ui/react";
 import { useEffect, useState } from "react";
 import Logo from "../Logo";
 import { getChampionImageUrl } from "../../utils/champion";
 
+// Matches per list and page; the API pages all three lists with the same limit/offset
+const PAGE_SIZE = 20;
+
 export default function SimilarMatches({ draft }) {
   const [exactMatches, setExactMatches] = useState([]);
   const [similarDrafts, setSimilarDrafts] = useState([]);
   const [teamHistory, setTeamHistory] = useState([]);
+  const [totals, setTotals] = useState({});
+  const [offset, setOffset] = useState(0);
   const [loading, setLoading] = useState(true);
 
+  // A new draft starts again at the first page
+  useEffect(() => {
+    setOffset(0);
+  }, [draft.picks, draft.bans, draft.blue_team, draft.red_team]);
+
   useEffect(() => {
+    // Responses for a draft or page that is no longer shown are dropped
+    let cancelled = false;
     const allPicks = [
       ...draft.picks.blue,
       ...draft.picks.red
@@ -36,24 +49,33 @@ export default function SimilarMatches({ draft }) {
         body: JSON.stringify({
           blue_team: draft.blue_team,
           red_team: draft.red_team,
-          picks: draft.picks
+          picks: draft.picks,
+          bans: draft.bans,
+          limit: PAGE_SIZE,
+          offset
         }),
       })
         .then((r) => r.json())
         .then((data) => {
+          if (cancelled) return;
           setExactMatches(data.exact_matches || []);
           setSimilarDrafts(data.similar_drafts || []);
           setTeamHistory(data.team_history || []);
+          setTotals(data.totals || {});
           setLoading(false);
         })
         .catch((err) => {
+          if (cancelled) return;
           console.error("Failed to fetch similar matches", err);
           setLoading(false);
         });
     } else {
       setLoading(false);
     }
-  }, [draft.picks, draft.blue_team, draft.red_team]);
+    return () => {
+      cancelled = true;
+    };
+  }, [draft.picks, draft.bans, draft.blue_team, draft.red_team, offset]);
 
   const allPicksCount = [
     ...draft.picks.blue,
@@ -62,6 +84,9 @@ export default function SimilarMatches({ draft }) {
 
   if (allPicksCount < 10) return null;
 
+  const pageCount = Math.ceil(Math.max(0, ...Object.values(totals)) / PAGE_SIZE);
+  const page = Math.floor(offset / PAGE_SIZE) + 1;
+
   const renderMatchList = (matches, type = "exact") => (
     <VStack spacing={4} align="stretch">
       {matches.map((m, i) => {
@@ -257,19 +282,25 @@ export default function SimilarMatches({ draft }) {
         ) : (
           <Box py={10} textAlign="center" border="2px dashed" borderColor="gray.700" borderRadius="xl">
             <Text fontSize="sm" color="gray.500" fontStyle="italic">
-              No professional matches found with this exact combination of 10 champions.
+              {totals.exact_matches > 0
+                ? "No more exact matches on this page."
+                : "No professional matches found with this exact combination of 10 champions."}
             </Text>
           </Box>
         )}
       </Box>
 
       {/* Team Composition History Section */}
-      {teamHistory.length > 0 && (
+      {totals.team_history > 0 && (
         <Box p={{ base: 3, md: 6 }} bg="gray.800" borderRadius="xl" border="1px solid" borderColor="gray.700" boxShadow="2xl">
           <Heading size="sm" mb={{ base: 3, md: 6 }} color="cyan.300" textTransform="uppercase" letterSpacing="widest">
             Team Composition History (4+ Team Picks)
           </Heading>
-          {renderMatchList(teamHistory, "team")}
+          {teamHistory.length > 0 ? renderMatchList(teamHistory, "team") : (
+            <Text fontSize="sm" color="gray.500" fontStyle="italic" textAlign="center" py={4}>
+              No more team composition matches on this page.
+            </Text>
+          )}
         </Box>
       )}
 
@@ -289,11 +320,38 @@ export default function SimilarMatches({ draft }) {
         ) : (
           <Box py={10} textAlign="center" border="2px dashed" borderColor="gray.700" borderRadius="xl">
             <Text fontSize="sm" color="gray.500" fontStyle="italic">
-              No similar professional drafts found with 8 or 9 matching champions.
+              {totals.similar_drafts > 0
+                ? "No more similar drafts on this page."
+                : "No similar professional drafts found with 8 or 9 matching champions."}
             </Text>
           </Box>
         )}
       </Box>
+
+      {/* Paging over all three lists */}
+      {pageCount > 1 && (
+        <HStack justify="center" spacing={4}>
+          <Button
+            colorScheme="gray"
+            size="sm"
+            onClick={() => setOffset(offset - PAGE_SIZE)}
+            isDisabled={loading || offset === 0}
+          >
+            Previous
+          </Button>
+          <Text fontSize="sm" color="gray.400">
+            Page {page} of {pageCount}
+          </Text>
+          <Button
+            colorScheme="gray"
+            size="sm"
+            onClick={() => setOffset(offset + PAGE_SIZE)}
+            isDisabled={loading || page >= pageCount}
+          >
+            Next
+          </Button>
+        </HStack>
+      )}
     </VStack>
   );
 }
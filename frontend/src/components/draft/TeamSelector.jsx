@@ -65,12 +65,14 @@ export default function TeamSelector({ side, draft, setDraft }) {
       method: "PATCH",
       headers: {
         "Content-Type": "application/json",
+        ...(draft.version ? { "If-Match": String(draft.version) } : {}),
       },
       body: JSON.stringify({
         [field]: team.external_id
       }),
     })
-      .then(res => res.json())
+      // On a version conflict, reload the draft rather than overwrite the other editor's changes
+      .then(res => res.status === 412 ? fetch(`/api/drafts/${draft.id}/`).then(r => r.json()) : res.json())
       .then(updatedDraft => {
         setDraft(updatedDraft);
         setSearch("");
@@ -1,26 +1,71 @@
-﻿import { useEffect } from "react";
+﻿import { useEffect, useRef } from "react";
 import debounce from "lodash.debounce";
 
-export default function useDraftAutosave(draft) {
+const AUTOSAVE_FIELDS = ["blue_team", "red_team", "status"];
+const SLOT_GROUPS = ["picks", "bans"];
+const SIDES = ["blue", "red"];
+
+const slotId = (slot) => (slot && typeof slot === "object" ? slot.id : slot) ?? null;
+
+// JSON-patch style "replace" operations for everything that differs from the last saved draft
+function diffDraft(saved, draft) {
+  const ops = [];
+  AUTOSAVE_FIELDS.forEach((field) => {
+    if ((saved[field] ?? null) !== (draft[field] ?? null)) {
+      ops.push({ op: "replace", path: `/${field}`, value: draft[field] ?? null });
+    }
+  });
+  SLOT_GROUPS.forEach((group) => {
+    SIDES.forEach((side) => {
+      const previous = saved[group]?.[side] || [];
+      (draft[group]?.[side] || []).forEach((slot, i) => {
+        if (slotId(slot) !== slotId(previous[i])) {
+          ops.push({ op: "replace", path: `/${group}/${side}/${i}`, value: slot ?? null });
+        }
+      });
+    });
+  });
+  return ops;
+}
+
+export default function useDraftAutosave(draft, setDraft) {
+  const saved = useRef(null);
+
   useEffect(() => {
     if (!draft?.id) return;
 
+    // The first state seen for a draft comes from the server, so there is nothing to save yet
+    if (saved.current?.id !== draft.id) {
+      saved.current = draft;
+      return;
+    }
+
     const save = debounce(() => {
-      fetch(`/api/drafts/${draft.id}/update/`, {
+      const ops = diffDraft(saved.current, draft);
+      if (!ops.length) return;
+      saved.current = draft;
+
+      fetch(`/api/drafts/${draft.id}/autosave/`, {
         method: "PATCH",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({
-          blue_team: draft.blue_team,
-          red_team: draft.red_team,
-          picks: draft.picks,
-          bans: draft.bans,
-          status: draft.status,
-        }),
-      });
+        body: JSON.stringify({ ops }),
+      })
+        .then((r) => r.json())
+        .then((data) => {
+          if (!setDraft) return;
+          // Keep the version current so later If-Match updates don't look stale
+          setDraft((d) => (d.id === draft.id ? { ...d, version: data.version } : d));
+          // Stats only change when the teams or the picked/banned champions do
+          if (!data.stats_changed) return;
+          return fetch(`/api/drafts/${draft.id}/stats/`)
+            .then((r) => r.json())
+            .then((stats) => setDraft((d) => (d.id === draft.id ? { ...d, ...stats } : d)));
+        })
+        .catch((err) => console.error("Failed to autosave draft", err));
     }, 400);
 
     save();
 
     return () => save.cancel();
-  }, [draft]);
+  }, [draft, setDraft]);
 }
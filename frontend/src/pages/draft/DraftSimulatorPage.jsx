@@ -9,7 +9,7 @@ export default function DraftSimulatorPage({ draft, setDraft }) {
   const navigate = useNavigate();
 
   // 🔥 THIS is where autosave is activated
-  useDraftAutosave(draft);
+  useDraftAutosave(draft, setDraft);
 
   function startNewDraft() {
     fetch("/api/drafts/", { method: "POST" })
@@ -0,0 +1,41 @@
+"""
+Gunicorn settings for serving the draft project:
+
+    gunicorn -c gunicorn.conf.py
+
+The app is loaded once in the master (preload_app) and warmed up there before the workers
+are forked, so every worker starts with the model, its lookup tables and the similar matches
+index already in memory, shared copy-on-write, instead of loading its own copy on its first
+request.
+"""
+import gc
+import multiprocessing
+import os
+
+wsgi_app = "draft.wsgi:application"
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+# More than one thread per worker lets concurrent recommendation requests share forward
+# passes when DRAFT_MICROBATCH_MAX_SIZE is set
+threads = int(os.environ.get("GUNICORN_THREADS", 1))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+preload_app = True
+
+
+def when_ready(server):
+    import torch
+    from draft.api import warm_up
+
+    # Warm up single-threaded: an intra-op thread pool started in the master would not
+    # survive the fork, each worker starts its own on first use
+    num_threads = torch.get_num_threads()
+    torch.set_num_threads(1)
+    try:
+        warm_up()
+    finally:
+        torch.set_num_threads(num_threads)
+
+    # Move everything loaded so far out of the collector's reach, so collections in the
+    # workers do not write to (and thereby copy) the shared pages
+    gc.freeze()
+    server.log.info("Draft model warmed up, %d objects frozen", gc.get_freeze_count())